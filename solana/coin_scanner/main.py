@@ -1,7 +1,6 @@
 import os
 import time
 import json
-import requests
 from bs4 import BeautifulSoup
 from selenium import webdriver
 from selenium.webdriver.chrome.options import Options
@@ -15,6 +14,10 @@ from rich.panel import Panel
 from rich.text import Text
 from rich.box import SQUARE
 import datetime
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "trading"))
+from rate_limit import get_scheduler
 
 rich_console = Console()
 
@@ -76,7 +79,7 @@ class CoinData:
         url = "https://api.jup.ag/tokens/v1/new"
         params = {'limit':limit}
         headers = {'Accept': 'application/json'}
-        response = requests.request("GET", url, headers=headers, params=params)
+        response = get_scheduler().get(url, headers=headers, params=params)
         raw = response.json()
         tokens = {}
         #UNUSED DATA
@@ -120,7 +123,7 @@ class CoinData:
     def _scan_single_token(self, token_address):
         url = f"https://api.jup.ag/tokens/v1/token/{token_address}"
         headers = {'Accept': 'application/json'}
-        response = requests.request("GET", url, headers=headers)
+        response = get_scheduler().get(url, headers=headers)
         raw = response.json()
         elements = self._webscrape(token_address)
         token = {
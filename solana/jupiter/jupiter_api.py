@@ -3,8 +3,12 @@ import subprocess
 import asyncio
 import time
 import os
+import sys
 from rich import print
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "trading"))
+from rate_limit import get_scheduler
+
 os.chdir(os.path.dirname(os.path.abspath(__file__)))
     
 class token: #store CAs for easy access
@@ -46,14 +50,14 @@ class JupiterAPI:
         return request
 
     def get_wallet(self, wallet_address):
-        response = requests.get(f"https://api.jup.ag/ultra/v1/balances/{wallet_address}")
+        response = get_scheduler().get(f"https://api.jup.ag/ultra/v1/balances/{wallet_address}")
         return response.json()
     
     def get_price(self, contract_address):
         if isinstance(contract_address, list):
             contract_address = ",".join(contract_address)
         try:
-            response = requests.get(f"https://api.jup.ag/price/v2?ids={contract_address}").json() #price for ca in usdc
+            response = get_scheduler().get(f"https://api.jup.ag/price/v2?ids={contract_address}").json() #price for ca in usdc
             output_dict = {}
             for key in response["data"]:
                 if response["data"][key] is None:
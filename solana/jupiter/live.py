@@ -11,7 +11,8 @@ from jupiter_api import JupiterAPI, token
 import sys
 sys.path.append(rf"C:\Users\{os.getlogin()}\Documents\GitHub\fintech\trading")
 from single_pytorch_model import load_model
-from model_tools import fetch_data
+from model_tools import fetch_data, interval_to_timedelta
+from online_features import OnlineFeatureService
 
 class LiveTrader:
     def __init__(
@@ -28,7 +29,7 @@ class LiveTrader:
         max_drawdown: float = 0.1,
     ):
         self.jupiter = JupiterAPI(wallet_address, private_key)
-        self.model = load_model(model_path)
+        self.model = self.load_model(model_path)
         self.current_position = 0  # 0: no position, 1: long position
         self.data = None
         self.initial_value = self.jupiter.get_wallet_value(self.jupiter.wallet_address)
@@ -37,6 +38,9 @@ class LiveTrader:
         self.position_size = position_size
         self.max_drawdown = max_drawdown
 
+    def load_model(self, model_path):
+        return load_model(model_path)
+
     def fetch_latest_data(self, ticker, chunks, interval, age_days):
         """Fetch the latest market data"""
         return fetch_data(ticker, chunks, interval, age_days, kucoin=True)
@@ -116,6 +120,76 @@ class LiveTrader:
 
             time.sleep(30)
 
+class ClassifierLiveTrader(LiveTrader):
+    """
+    LiveTrader for ClassifierModel checkpoints (0=sell, 1=hold, 2=buy).
+
+    The full history is fetched and the features computed once; after that each poll only fetches the
+    latest chunk and feeds the new closed bars to an OnlineFeatureService, so a new bar costs one
+    incremental feature update and a single-row forward pass.
+    """
+    def __init__(self, *args, lagged_length: int = 5, **kwargs):
+        self.lagged_length = lagged_length
+        self.features = None
+        super().__init__(*args, **kwargs)
+
+    def load_model(self, model_path):
+        from brains.time_series.single_predictors.classifier_model import load_model as load_classifier_model
+        model = load_classifier_model(model_path)
+        model.to(model.DEVICE)
+        model.eval()
+        return model
+
+    def get_action(self, row) -> int:
+        import torch
+        x = torch.from_numpy(row).to(self.model.DEVICE).view(1, 1, -1)
+        with torch.inference_mode():
+            return int(torch.argmax(self.model(x), dim=2).item())
+
+    def closed_bars(self, data, interval):
+        """Drop any bar that has not closed yet; fetch_data already stops at the forming bar, this is a guard."""
+        now = pd.Timestamp.now(tz='UTC').tz_localize(None)
+        return data[data['Datetime'] + interval_to_timedelta(interval) <= now]
+
+    def seed_features(self, ticker, chunks, interval):
+        self.data = self.closed_bars(self.fetch_latest_data(ticker, chunks, interval, 0), interval)
+        self.features = OnlineFeatureService(self.model.selected_features, lagged_length=self.lagged_length)
+        return self.features.seed(self.data)
+
+    def run(self, ticker, chunks, interval):
+        print("[bold]Starting live trading (online features)...[/bold]")
+        self.seed_features(ticker, chunks, interval)
+
+        while True:
+            recent = self.closed_bars(self.fetch_latest_data(ticker, 1, interval, 0), interval)
+            new_bars = recent[recent['Datetime'] > self.data['Datetime'].iloc[-1]]
+            if len(recent) and len(new_bars) == len(recent):
+                # No overlap with what we have, bars were missed: start over from a full fetch
+                print("[yellow]Gap in live data, reseeding features[/yellow]")
+                row = self.seed_features(ticker, chunks, interval)
+            elif len(new_bars):
+                for _, bar in new_bars.iterrows():
+                    row = self.features.update(bar)
+                self.data = pd.concat([self.data, new_bars]).iloc[-self.features.ring.capacity:]
+            else:
+                time.sleep(30)
+                continue
+
+            print(new_bars['Close'].iloc[-1], self.jupiter.get_price(token.SOL))
+            self.check_safety_limits()
+            print("-"*50)
+            action = self.get_action(row)
+            print(f"Action: {['Sell', 'Hold', 'Buy'][action]}")
+            # Hold (1) is the reference: buy above it, sell below it
+            self.execute_trade(action, 1)
+
+            print(f"[cyan]Current Position: {'Long' if self.current_position == 1 else 'No Position'}[/cyan]")
+            print(f"[cyan]Wallet Value: ${self.jupiter.get_wallet_value(self.jupiter.wallet_address):.2f}[/cyan]")
+            print("-"*50)
+
+            self.log_wallet_value()
+            time.sleep(30)
+
 if __name__ == "__main__":
     # WALLET_ADDRESS = input("Enter your wallet address: ")
     PRIVATE_KEY = input("Enter your private key: ")
@@ -1,5 +1,6 @@
 import itertools
 import json
+import os
 import pandas as pd
 from typing import Dict, List, Any, Callable
 from rich import print
@@ -7,9 +8,13 @@ from rich.table import Table
 from rich.console import Console
 from tqdm import tqdm
 import numpy as np
+import plotly.graph_objects as go
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import shared_memory
 import sys
 sys.path.append("trading")
 from vectorized_backtesting import VectorizedBacktesting
+import vb_metrics as metrics
 import optuna
 
 class AlgorithmGridSearch:
@@ -251,6 +256,253 @@ class AlgorithmAssignmentOptimizer:
         self.engine.run_strategy(self.strategy_func, **self.params)
         return self.engine.plot_performance(show_graph=show_graph, advanced=advanced)
 
+WALK_FORWARD_COLUMNS = ['Open', 'High', 'Low', 'Close', 'Volume']
+
+# Per-worker handles to the shared OHLCV block, set once by _walk_forward_init
+_shared_ohlcv = {}
+
+def _walk_forward_init(ohlcv_name: str, datetime_name: str, n_rows: int):
+    ohlcv_shm = shared_memory.SharedMemory(name=ohlcv_name)
+    datetime_shm = shared_memory.SharedMemory(name=datetime_name)
+    _shared_ohlcv['shm'] = (ohlcv_shm, datetime_shm)  # keep the mappings alive for the worker's lifetime
+    _shared_ohlcv['ohlcv'] = np.ndarray((n_rows, len(WALK_FORWARD_COLUMNS)), dtype=np.float64, buffer=ohlcv_shm.buf)
+    _shared_ohlcv['datetime'] = np.ndarray((n_rows,), dtype=np.int64, buffer=datetime_shm.buf)
+
+def _walk_forward_slice(start: int, end: int) -> pd.DataFrame:
+    ohlcv = _shared_ohlcv['ohlcv'][start:end]
+    data = pd.DataFrame({'Datetime': pd.to_datetime(_shared_ohlcv['datetime'][start:end])})
+    for j, column in enumerate(WALK_FORWARD_COLUMNS):
+        data[column] = ohlcv[:, j]
+    return data
+
+def _walk_forward_engine(data: pd.DataFrame, initial_capital: float, cost_model) -> VectorizedBacktesting:
+    engine = VectorizedBacktesting(initial_capital=initial_capital, cost_model=cost_model)
+    engine.data = data
+    engine.n_days = (data['Datetime'].iloc[-1] - data['Datetime'].iloc[0]).days
+    return engine
+
+def _walk_forward_fold(fold: Dict[str, int], strategy, param_combinations: List[Dict[str, Any]], metric: str, initial_capital: float, cost_model) -> Dict[str, Any]:
+    """Optimize on the fold's train window, then run the best params through the test window."""
+    train = _walk_forward_engine(_walk_forward_slice(fold['train_start'], fold['train_end']), initial_capital, cost_model)
+    strategy_func = getattr(train, strategy) if isinstance(strategy, str) else strategy
+
+    best_params, best_metrics, best_score = None, None, -np.inf
+    for params in param_combinations:
+        train.run_strategy(strategy_func, **params)
+        result = train.get_performance_metrics()
+        score = -np.inf if pd.isna(result[metric]) else result[metric]
+        if best_params is None or score > best_score:
+            best_params, best_metrics, best_score = params, result, score
+
+    # Run over train + test so indicators are warmed up, then keep only the out-of-sample bars
+    full = _walk_forward_engine(_walk_forward_slice(fold['train_start'], fold['test_end']), initial_capital, cost_model)
+    strategy_func = getattr(full, strategy) if isinstance(strategy, str) else strategy
+    full.run_strategy(strategy_func, **best_params)
+    oos_data = full.data.iloc[fold['train_end'] - fold['train_start']:].reset_index(drop=True)
+    oos = _walk_forward_engine(oos_data, initial_capital, cost_model)
+
+    return {
+        **fold,
+        'parameters': best_params,
+        'is_metrics': best_metrics,
+        'oos_metrics': oos.get_performance_metrics(),
+        'oos_datetime': oos_data['Datetime'].values,
+        'oos_returns': oos_data['Strategy_Returns'].fillna(0).values,
+        'oos_benchmark': oos_data['Return'].fillna(0).values,
+    }
+
+class WalkForwardOptimizer:
+    """
+    Walk-forward / out-of-sample evaluation on top of VectorizedBacktesting.
+
+    The engine's data is split into rolling (or anchored) train/test folds. Each fold grid-searches the
+    parameters on its train window and is scored on the following test window. Folds run in a process
+    pool; the OHLCV arrays are placed in shared memory once instead of being pickled to every worker.
+    """
+    def __init__(
+        self,
+        engine: VectorizedBacktesting,
+        strategy_func: Callable,
+        param_grid: Dict[str, List[Any]],
+        train_size: int,
+        test_size: int,
+        step: int = None,
+        anchored: bool = False,
+        metric: str = "Total_Return",
+        max_workers: int = None,
+    ):
+        """
+        Args:
+            engine: VectorizedBacktesting instance with data already fetched
+            strategy_func: Strategy to optimize. Bound VectorizedBacktesting strategies are resolved by name in the workers;
+                other callables must be picklable (module-level functions)
+            param_grid: Dictionary of parameters to search
+            train_size: Bars in each train window (initial window when anchored)
+            test_size: Bars in each out-of-sample window
+            step: Bars to advance between folds (default: test_size, so test windows don't overlap)
+            anchored: Keep the train window anchored at the first bar instead of rolling it
+            metric: Performance metric to optimize on each train window
+            max_workers: Process pool size (default: os.cpu_count())
+        """
+        self.engine = engine
+        self.strategy_func = strategy_func
+        self.param_grid = param_grid
+        self.train_size = train_size
+        self.test_size = test_size
+        self.step = step or test_size
+        self.anchored = anchored
+        self.metric = metric
+        self.max_workers = max_workers or os.cpu_count()
+        self.folds: List[Dict[str, Any]] = []
+        self.oos_returns: pd.Series = None
+        self.oos_benchmark: pd.Series = None
+        self.console = Console()
+
+    def _generate_folds(self, n_rows: int) -> List[Dict[str, int]]:
+        folds = []
+        train_end = self.train_size
+        while train_end + self.test_size <= n_rows:
+            folds.append({
+                'fold': len(folds),
+                'train_start': 0 if self.anchored else train_end - self.train_size,
+                'train_end': train_end,
+                'test_end': train_end + self.test_size,
+            })
+            train_end += self.step
+        return folds
+
+    def _strategy_reference(self):
+        owner = getattr(self.strategy_func, '__self__', None)
+        if isinstance(owner, VectorizedBacktesting):
+            return self.strategy_func.__name__
+        return self.strategy_func
+
+    def run(self) -> pd.DataFrame:
+        """Run every fold and return a per-fold summary of chosen parameters, in-sample and out-of-sample metrics."""
+        data = self.engine.data
+        if data is None or data.empty:
+            raise ValueError("No data available. Call fetch_data() on the engine first.")
+
+        fold_bounds = self._generate_folds(len(data))
+        if not fold_bounds:
+            raise ValueError(f"Not enough data for one fold: {len(data)} bars < train_size + test_size ({self.train_size + self.test_size}).")
+
+        param_combinations = AlgorithmGridSearch(self.engine, self.strategy_func, self.param_grid)._generate_param_combinations()
+        ohlcv = np.ascontiguousarray(data[WALK_FORWARD_COLUMNS].to_numpy(dtype=np.float64))
+        datetimes = data['Datetime'].values.astype('datetime64[ns]').astype(np.int64)
+
+        ohlcv_shm = shared_memory.SharedMemory(create=True, size=ohlcv.nbytes)
+        datetime_shm = shared_memory.SharedMemory(create=True, size=datetimes.nbytes)
+        try:
+            np.ndarray(ohlcv.shape, dtype=ohlcv.dtype, buffer=ohlcv_shm.buf)[:] = ohlcv
+            np.ndarray(datetimes.shape, dtype=datetimes.dtype, buffer=datetime_shm.buf)[:] = datetimes
+
+            results = []
+            with ProcessPoolExecutor(
+                max_workers=min(self.max_workers, len(fold_bounds)),
+                initializer=_walk_forward_init,
+                initargs=(ohlcv_shm.name, datetime_shm.name, len(data)),
+            ) as executor:
+                futures = [
+                    executor.submit(_walk_forward_fold, fold, self._strategy_reference(), param_combinations, self.metric, self.engine.initial_capital, self.engine.cost_model)
+                    for fold in fold_bounds
+                ]
+                with tqdm(total=len(futures), desc="Walk-Forward Folds") as progress_bar:
+                    for future in as_completed(futures):
+                        results.append(future.result())
+                        progress_bar.update(1)
+        finally:
+            ohlcv_shm.close()
+            ohlcv_shm.unlink()
+            datetime_shm.close()
+            datetime_shm.unlink()
+
+        self.folds = sorted(results, key=lambda x: x['fold'])
+        index = pd.to_datetime(np.concatenate([fold['oos_datetime'] for fold in self.folds]))
+        self.oos_returns = pd.Series(np.concatenate([fold['oos_returns'] for fold in self.folds]), index=index)
+        self.oos_benchmark = pd.Series(np.concatenate([fold['oos_benchmark'] for fold in self.folds]), index=index)
+
+        table = Table(title="Walk-Forward Results")
+        table.add_column("Fold", style="cyan")
+        table.add_column("Parameters", style="cyan")
+        table.add_column(f"IS {self.metric}", style="blue")
+        table.add_column(f"OOS {self.metric}", style="green")
+        for fold in self.folds:
+            table.add_row(
+                str(fold['fold']),
+                str(fold['parameters']),
+                f"{fold['is_metrics'][self.metric]:.4f}",
+                f"{fold['oos_metrics'][self.metric]:.4f}"
+            )
+        self.console.print(table)
+
+        return pd.DataFrame([
+            {
+                'Fold': fold['fold'],
+                'Train_Start': data['Datetime'].iloc[fold['train_start']],
+                'Test_Start': data['Datetime'].iloc[fold['train_end']],
+                'Test_End': data['Datetime'].iloc[fold['test_end'] - 1],
+                **fold['parameters'],
+                f"IS_{self.metric}": fold['is_metrics'][self.metric],
+                **{f"OOS_{k}": v for k, v in fold['oos_metrics'].items()},
+            }
+            for fold in self.folds
+        ])
+
+    def get_oos_metrics(self) -> Dict[str, float]:
+        """Metrics of the stitched out-of-sample return series."""
+        if self.oos_returns is None:
+            raise ValueError("No results available. Run the walk-forward first.")
+        n_days = (self.oos_returns.index[-1] - self.oos_returns.index[0]).days
+        total_return = metrics.get_total_return_from_returns(self.oos_returns)
+        alpha, beta = metrics.get_alpha_beta_from_returns(self.oos_returns, self.oos_benchmark, n_days=n_days)
+        return {
+            'Total_Return': total_return,
+            'Alpha': alpha,
+            'Beta': beta,
+            'Active_Returns': total_return - metrics.get_total_return_from_returns(self.oos_benchmark),
+            'Max_Drawdown': metrics.get_max_drawdown_from_returns(self.oos_returns),
+            'Sharpe_Ratio': metrics.get_sharpe_ratio_from_returns(self.oos_returns),
+            'Sortino_Ratio': metrics.get_sortino_ratio_from_returns(self.oos_returns),
+            'Profit_Factor': metrics.get_profit_factor_from_returns(self.oos_returns),
+            'Total_Trades': sum(fold['oos_metrics']['Total_Trades'] for fold in self.folds),
+            'Folds': len(self.folds),
+        }
+
+    def get_oos_equity(self) -> pd.Series:
+        """Stitched out-of-sample equity curve."""
+        if self.oos_returns is None:
+            raise ValueError("No results available. Run the walk-forward first.")
+        return self.engine.initial_capital * (1 + self.oos_returns).cumprod()
+
+    def plot_performance(self, show_graph: bool = True):
+        equity = self.get_oos_equity()
+        summary = self.get_oos_metrics()
+
+        fig = go.Figure()
+        fig.add_trace(go.Scattergl(x=equity.index, y=equity.values, mode='lines', name='OOS Portfolio'))
+        fig.add_trace(go.Scattergl(
+            x=equity.index,
+            y=self.engine.initial_capital * (1 + self.oos_benchmark).cumprod().values,
+            mode='lines',
+            name='Asset Value',
+            line=dict(dash='dash')
+        ))
+        for fold in self.folds[1:]:
+            fig.add_vline(x=pd.Timestamp(fold['oos_datetime'][0]), line=dict(color='gray', dash='dot', width=1))
+
+        fig.update_layout(
+            title=f'{self.engine.symbol} Walk-Forward {self.strategy_func.__name__} | {len(self.folds)} folds | OOS TR: {summary["Total_Return"]*100:.3f}% | Max DD: {summary["Max_Drawdown"]*100:.3f}% | Sharpe: {summary["Sharpe_Ratio"]:.3f}',
+            xaxis_title='Date',
+            yaxis_title='Value',
+            template="plotly_dark"
+        )
+
+        if show_graph:
+            fig.show()
+
+        return fig
+
 
 if __name__ == "__main__":
     vb = VectorizedBacktesting(
@@ -8,9 +8,12 @@ from typing import List, Dict, Optional
 from rich import print
 from tqdm import tqdm
 import plotly.graph_objects as go
-import requests
 from sklearn.preprocessing import MinMaxScaler, QuantileTransformer, StandardScaler
 
+import sys
+sys.path.append("trading")
+from rate_limit import get_scheduler
+
 def fetch_data(ticker, chunks, interval, age_days, kucoin: bool = True):
     print("[green]DOWNLOADING DATA[/green]")
     if not kucoin:
@@ -56,7 +59,7 @@ def fetch_data(ticker, chunks, interval, age_days, kucoin: bool = True):
                 "endAt": str(int(end_time.timestamp()))
             }
             
-            request = requests.get("https://api.kucoin.com/api/v1/market/candles", params=params).json()
+            request = get_scheduler().get("https://api.kucoin.com/api/v1/market/candles", params=params).json()
             try:
                 request_data = request["data"]  # list of lists
             except:
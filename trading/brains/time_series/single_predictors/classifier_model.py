@@ -16,6 +16,7 @@ from typing import List, Optional
 import sys
 sys.path.append(r"trading")
 import model_tools as mt
+from feature_store import FeatureSpec, get_feature_store
 from brains.gbm.feature_selector import AdvancedFeatureSelector
 
 class NormalizationBlock(nn.Module):
@@ -78,7 +79,8 @@ class ClassifierModel(nn.Module):
 
         if train:
             self.data = mt.fetch_data(ticker, chunks, interval, age_days, kucoin=True)
-            X, y = mt.prepare_data_classifier(self.data, lagged_length=lagged_length)
+            X = get_feature_store().get(self.data, FeatureSpec(lagged_length=lagged_length))
+            y = mt.classifier_targets(self.data, X.index)
             feature_names = X.columns.tolist()
             
             if use_feature_selection:
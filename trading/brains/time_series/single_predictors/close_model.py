@@ -16,18 +16,20 @@ sys.path.append(r"trading")
 from model_tools import *
 
 class CloseModel(nn.Module):
-    def __init__(self, ticker, chunks, interval, age_days, epochs=10, train: bool = True):
+    def __init__(self, ticker, chunks, interval, age_days, epochs=10, train: bool = True, streaming: bool = False):
         super().__init__()
 
         self.DEVICE = torch.device("cuda" if torch.cuda.is_available() else "cpu")
         self.SCALE_ENABLED = True
+        self.streaming = streaming  # fit streaming scalers and save them next to the checkpoint
+        self.scalers = None
 
         self.lagged_length = 15
 
         if train:
             self.epochs = epochs
             self.data = fetch_data(ticker, chunks, interval, age_days, kucoin=True)
-            X, y, scalers = prepare_data(self.data, train_split=True, scale_y=self.SCALE_ENABLED, lagged_length=self.lagged_length)
+            X, y, scalers = prepare_data(self.data, train_split=True, scale_y=self.SCALE_ENABLED, lagged_length=self.lagged_length, streaming=streaming)
             print(y)
 
             input_dim = X.shape[1]
@@ -57,7 +59,9 @@ class CloseModel(nn.Module):
         return x
 
     def train_model(self, model, prompt_save=False, show_loss=False):
-        X, y, scalers = prepare_data(self.data, train_split=True, scale_y=True, lagged_length=self.lagged_length)
+        X, y, scalers = prepare_data(self.data, train_split=True, scale_y=True, lagged_length=self.lagged_length, streaming=self.streaming)
+        if self.streaming:
+            self.scalers = scalers
 
         model.to(self.DEVICE)
 
@@ -116,10 +120,13 @@ class CloseModel(nn.Module):
             fig.show()
 
         if ((input("Save? y/n ").lower() == 'y') if prompt_save else False):
-            torch.save(model.state_dict(), input("Enter save path: "))
+            save_path = input("Enter save path: ")
+            torch.save(model.state_dict(), save_path)
+            if self.scalers is not None:
+                streaming_scalers.save_scalers(streaming_scalers.scaler_path(save_path), self.scalers)
     
     def predict(self, model, data):
-        X, y, scalers = prepare_data(data, scale_y=self.SCALE_ENABLED, lagged_length=self.lagged_length)
+        X, y, scalers = prepare_data(data, scale_y=self.SCALE_ENABLED, lagged_length=self.lagged_length, scalers=self.scalers)
         
         X = torch.tensor(X.values, dtype=torch.float32)
         X = X.contiguous()
@@ -151,6 +158,8 @@ def load_model(model_path: str):
     model = CloseModel(train=False)
     model.load_state_dict(torch.load(model_path, map_location=torch.device('cuda'),weights_only=True))
     model.eval()
+    if os.path.exists(streaming_scalers.scaler_path(model_path)):
+        model.scalers, _ = streaming_scalers.load_scalers(streaming_scalers.scaler_path(model_path))
     
     return model
 
@@ -0,0 +1,174 @@
+import os
+import time
+import atexit
+import sqlite3
+import hashlib
+import tempfile
+import threading
+import pandas as pd
+from rich import print
+
+def file_checksum(path: str = None, payload: bytes = None) -> str:
+    if payload is None:
+        with open(path, "rb") as f:
+            payload = f.read()
+    return hashlib.sha256(payload).hexdigest()
+
+class CacheIndex:
+    """
+    SQLite index of cached market data files.
+
+    Each entry records key, path, kind, row count, time range, checksum, size and creation/last access
+    time. Listing and size accounting read only the index, never the cached files. Cache hits don't write:
+    access times are buffered in memory and flushed on the next write (record/evict) or at exit.
+    evict() removes least-recently-used files until the cache fits in max_bytes.
+    """
+    def __init__(self, db_path: str = None, max_bytes: int = 2 * 1024**3):
+        self.db_path = db_path or os.path.join(tempfile.gettempdir(), "market_data_index.sqlite")
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._pending_access = {}
+        self._evict_handlers = {}
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS entries (
+                key TEXT PRIMARY KEY,
+                path TEXT NOT NULL,
+                kind TEXT,
+                rows INTEGER,
+                start_time TEXT,
+                end_time TEXT,
+                checksum TEXT,
+                size INTEGER,
+                created REAL,
+                last_access REAL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS entries_last_access ON entries (last_access)")
+        self._conn.commit()
+        atexit.register(self.flush)
+
+    def on_evict(self, kind: str, handler):
+        """Register handler(entry), called after an entry of this kind is evicted, so owners can update their own bookkeeping."""
+        self._evict_handlers[kind] = handler
+
+    def _row_to_dict(self, row) -> dict:
+        if row is None:
+            return None
+        names = ['key', 'path', 'kind', 'rows', 'start_time', 'end_time', 'checksum', 'size', 'created', 'last_access']
+        return dict(zip(names, row))
+
+    def record(self, key: str, path: str, rows: int = None, start=None, end=None, kind: str = None, payload: bytes = None):
+        """Add or replace an entry for a file that has just been written."""
+        size = len(payload) if payload is not None else os.path.getsize(path)
+        checksum = file_checksum(path, payload)
+        now = time.time()
+        with self._lock:
+            self._pending_access.pop(key, None)
+            self._conn.execute(
+                "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, path, kind, rows, str(start) if start is not None else None, str(end) if end is not None else None, checksum, size, now, now)
+            )
+            self._flush_locked()
+
+    def lookup(self, key: str) -> dict:
+        """Entry for key, or None. Only the in-memory access buffer is updated."""
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                self._pending_access[key] = time.time()
+        return self._row_to_dict(row)
+
+    def touch(self, key: str):
+        with self._lock:
+            self._pending_access[key] = time.time()
+
+    def _flush_locked(self):
+        if self._pending_access:
+            self._conn.executemany("UPDATE entries SET last_access = ? WHERE key = ?", [(t, k) for k, t in self._pending_access.items()])
+            self._pending_access.clear()
+        self._conn.commit()
+
+    def flush(self):
+        """Write buffered access times."""
+        with self._lock:
+            self._flush_locked()
+
+    def verify(self, entry: dict, payload: bytes = None) -> bool:
+        """Check a cached file against its recorded size and checksum. payload avoids reading the file twice."""
+        path = entry['path']
+        if payload is None and not os.path.exists(path):
+            return False
+        size = len(payload) if payload is not None else os.path.getsize(path)
+        if size != entry['size']:
+            return False
+        return file_checksum(path, payload) == entry['checksum']
+
+    def remove(self, key: str, delete_file: bool = True):
+        with self._lock:
+            row = self._conn.execute("SELECT path FROM entries WHERE key = ?", (key,)).fetchone()
+            self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+            self._pending_access.pop(key, None)
+            self._conn.commit()
+        if row is not None and delete_file and os.path.exists(row[0]):
+            os.remove(row[0])
+
+    def entries(self, kind: str = None) -> pd.DataFrame:
+        """Everything in the cache, most recently used first, straight from the index."""
+        self.flush()
+        query = "SELECT * FROM entries" + (" WHERE kind = ?" if kind else "") + " ORDER BY last_access DESC"
+        with self._lock:
+            rows = self._conn.execute(query, (kind,) if kind else ()).fetchall()
+        frame = pd.DataFrame([self._row_to_dict(row) for row in rows])
+        for column in ['created', 'last_access']:
+            if column in frame.columns:
+                frame[column] = pd.to_datetime(frame[column], unit='s')
+        return frame
+
+    def total_size(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+
+    def evict(self, max_bytes: int = None) -> list:
+        """Delete least-recently-used files until the cache is within max_bytes."""
+        max_bytes = self.max_bytes if max_bytes is None else max_bytes
+        evicted = []
+        with self._lock:
+            self._flush_locked()
+            total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+            if total <= max_bytes:
+                return evicted
+            for row in self._conn.execute("SELECT * FROM entries ORDER BY last_access ASC").fetchall():
+                if total <= max_bytes:
+                    break
+                entry = self._row_to_dict(row)
+                evicted.append(entry)
+                total -= entry['size']
+            self._conn.executemany("DELETE FROM entries WHERE key = ?", [(entry['key'],) for entry in evicted])
+            self._conn.commit()
+
+        for entry in evicted:
+            if os.path.exists(entry['path']):
+                os.remove(entry['path'])
+            handler = self._evict_handlers.get(entry['kind'])
+            if handler is not None:
+                handler(entry)
+        if evicted:
+            print(f"[yellow]Evicted {len(evicted)} cached files ({sum(e['size'] for e in evicted)/(1024**2):.2f} MB)[/yellow]")
+        return evicted
+
+_index = None
+
+def get_index() -> CacheIndex:
+    """Process-wide index in the default location."""
+    global _index
+    if _index is None:
+        _index = CacheIndex()
+    return _index
+
+if __name__ == "__main__":
+    index = get_index()
+    start = time.time()
+    entries = index.entries()
+    print(entries.to_string() if not entries.empty else "Cache is empty")
+    print(f"{len(entries)} entries, {index.total_size()/(1024**2):.2f} MB ({time.time() - start:.3f} seconds)")
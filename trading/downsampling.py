@@ -0,0 +1,80 @@
+import numpy as np
+
+def _as_numeric(x) -> np.ndarray:
+    x = np.asarray(x)
+    if np.issubdtype(x.dtype, np.datetime64):
+        return x.astype('datetime64[ns]').astype(np.int64).astype(float)
+    if not np.issubdtype(x.dtype, np.number):
+        return np.arange(len(x), dtype=float)
+    return x.astype(float)
+
+def min_max_indices(y, n_out: int) -> np.ndarray:
+    """
+    Indices of the min and max of each bucket, plus the first and last point.
+
+    Fully vectorized: pads y into (n_buckets x bucket_size) and takes nanargmin/nanargmax per row.
+    Keeps every spike, so drawdowns and equity extremes survive the reduction.
+    """
+    y = np.asarray(y, dtype=float)
+    n = len(y)
+    if n_out >= n or n <= 2:
+        return np.arange(n)
+
+    n_buckets = max(1, (n_out - 2) // 2)
+    bucket_size = int(np.ceil(n / n_buckets))
+    padded = np.full(n_buckets * bucket_size, np.nan)
+    padded[:n] = y
+    padded = padded.reshape(n_buckets, bucket_size)
+
+    valid = ~np.all(np.isnan(padded), axis=1)
+    offsets = np.arange(n_buckets)[valid] * bucket_size
+    mins = np.nanargmin(padded[valid], axis=1) + offsets
+    maxs = np.nanargmax(padded[valid], axis=1) + offsets
+    return np.unique(np.concatenate(([0, n - 1], mins, maxs)))
+
+def lttb_indices(x, y, n_out: int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets downsampling. Returns the indices of the selected points.
+
+    Each bucket picks the point forming the largest triangle with the previously selected point and the
+    average of the next bucket. The loop is over buckets only; the per-bucket search is vectorized.
+    """
+    x = _as_numeric(x)
+    y = np.asarray(y, dtype=float)
+    n = len(y)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    y = np.where(np.isnan(y), np.nanmean(y) if np.any(~np.isnan(y)) else 0.0, y)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(int)
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+
+    previous = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+        next_start, next_end = edges[i + 1], edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = x[next_start:next_end].mean()
+        avg_y = y[next_start:next_end].mean()
+
+        bucket_x = x[start:end]
+        bucket_y = y[start:end]
+        area = np.abs(
+            (x[previous] - avg_x) * (bucket_y - y[previous]) -
+            (x[previous] - bucket_x) * (avg_y - y[previous])
+        )
+        previous = start + int(np.argmax(area))
+        selected[i + 1] = previous
+
+    return selected
+
+def downsample_indices(x, y, n_out: int, method: str = "minmax") -> np.ndarray:
+    """Dispatch to a downsampling method. method=None keeps every point."""
+    if method is None or n_out is None:
+        return np.arange(len(y))
+    if method == "minmax":
+        return min_max_indices(y, n_out)
+    if method == "lttb":
+        return lttb_indices(x, y, n_out)
+    raise ValueError(f"Unknown downsampling method: {method}")
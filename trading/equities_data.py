@@ -0,0 +1,126 @@
+import numpy as np
+import pandas as pd
+import yfinance as yf
+from rich import print
+
+from ohlcv_store import OHLCV_COLUMNS, OHLCVStore, get_store
+from rate_limit import get_scheduler
+
+YF_HOST = "query1.finance.yahoo.com"
+# Longest range Yahoo serves per request for intraday intervals
+YF_MAX_SPAN = {
+    "1m": pd.Timedelta(days=7),
+    "2m": pd.Timedelta(days=60), "5m": pd.Timedelta(days=60), "15m": pd.Timedelta(days=60),
+    "30m": pd.Timedelta(days=60), "90m": pd.Timedelta(days=60),
+    "60m": pd.Timedelta(days=730), "1h": pd.Timedelta(days=730),
+}
+# Intervals stored in the OHLCV store; weekly/monthly bars are always downloaded
+CACHEABLE_INTERVALS = set(YF_MAX_SPAN) | {"1d"}
+
+def _normalize(frame: pd.DataFrame) -> pd.DataFrame:
+    """One ticker's yfinance frame in store column order with a naive (UTC for intraday) Datetime column."""
+    frame = frame.dropna(how='all')
+    index = pd.DatetimeIndex(frame.index)
+    if index.tz is not None:
+        index = index.tz_convert('UTC').tz_localize(None)
+    data = {'Datetime': index}
+    for column in OHLCV_COLUMNS[1:]:
+        data[column] = frame[column].to_numpy(dtype=np.float64) if column in frame.columns else np.nan
+    return pd.DataFrame(data)
+
+def _split_download(raw: pd.DataFrame, tickers: list) -> dict:
+    if not isinstance(raw.columns, pd.MultiIndex):
+        return {tickers[0]: _normalize(raw)} if len(tickers) == 1 and not raw.empty else {}
+    available = set(raw.columns.get_level_values(0))
+    return {ticker: _normalize(raw[ticker]) for ticker in tickers if ticker in available}
+
+def download_batch(tickers: list, start, end, interval: str = "1d") -> dict:
+    """
+    {ticker: bars in [start, end)} from as few yf.download calls as possible.
+
+    All tickers go into the same request; the range is only split where Yahoo limits intraday spans.
+    Requests share the rate_limit budget for the Yahoo host. Tickers Yahoo returns nothing for are missing.
+    """
+    tickers = list(tickers)
+    start, end = pd.Timestamp(start), pd.Timestamp(end)
+    span = YF_MAX_SPAN.get(interval, end - start)
+    parts = {ticker: [] for ticker in tickers}
+    window_start = start
+    while window_start < end:
+        window_end = min(end, window_start + span)
+        get_scheduler().bucket(YF_HOST).acquire()
+        raw = yf.download(tickers, start=window_start.to_pydatetime(), end=window_end.to_pydatetime(), interval=interval,
+                          group_by='ticker', threads=True, progress=False)
+        for ticker, frame in _split_download(raw, tickers).items():
+            parts[ticker].append(frame)
+        window_start = window_end
+
+    result = {}
+    for ticker, frames in parts.items():
+        frames = [frame for frame in frames if not frame.empty]
+        if frames:
+            data = pd.concat(frames, ignore_index=True).drop_duplicates('Datetime', keep='last')
+            result[ticker] = data[(data['Datetime'] >= start) & (data['Datetime'] < end)].sort_values('Datetime').reset_index(drop=True)
+    return result
+
+def _bar_length(interval: str) -> pd.Timedelta:
+    return pd.Timedelta(f"{interval[:-1]}min" if interval.endswith("m") else interval)
+
+def _closed_until(interval: str) -> pd.Timestamp:
+    """Bars starting before this are final; later ones (today's daily bar, the current intraday bar) are refetched."""
+    if interval in YF_MAX_SPAN:
+        return pd.Timestamp.now(tz='UTC').tz_localize(None).floor(_bar_length(interval))
+    return pd.Timestamp.now().normalize()
+
+def fetch_bars(tickers: list, start, end, interval: str = "1d", use_cache: bool = True, store: OHLCVStore = None) -> dict:
+    """
+    {ticker: OHLCV bars with start <= Datetime < end}, cached in the same OHLCV store as the crypto candles.
+
+    Only ranges no earlier call covered are downloaded, and tickers missing the same range are fetched
+    together in one batch. Bars that can still change aren't marked as covered, so they are refreshed
+    next time. Tickers Yahoo has no data for come back empty and are retried on the next call.
+    """
+    tickers = list(dict.fromkeys(tickers))
+    start, end = pd.Timestamp(start), pd.Timestamp(end)
+    if not use_cache or interval not in CACHEABLE_INTERVALS:
+        downloaded = download_batch(tickers, start, end, interval)
+        return {ticker: downloaded.get(ticker, pd.DataFrame(columns=OHLCV_COLUMNS)) for ticker in tickers}
+
+    store = store or get_store()
+    batches = {}
+    for ticker in tickers:
+        store.check_partitions(ticker, interval, start, end)
+        missing = store.missing_ranges(ticker, interval, start, end)
+        if missing:
+            batches.setdefault((missing[0][0], missing[-1][1]), []).append(ticker)
+
+    closed_until = _closed_until(interval)
+    for (range_start, range_end), group in batches.items():
+        print(f"[green]Downloading {len(group)} tickers {range_start.date()} -> {range_end.date()} ({interval})[/green]")
+        downloaded = download_batch(group, range_start, range_end, interval)
+        for ticker in group:
+            if ticker not in downloaded:
+                print(f"[yellow]No data for {ticker}[/yellow]")
+                continue
+            store.write(ticker, interval, downloaded[ticker], range_start, min(range_end, closed_until))
+    if not batches:
+        print(f"[blue]USING STORED DATA for {len(tickers)} tickers ({interval})[/blue]")
+
+    bars = {ticker: store.read(ticker, interval, start, end) for ticker in tickers}
+    if batches:
+        store.index.evict()  # after reading, see OHLCVStore.get
+    return bars
+
+def close_prices(tickers: list, start, end, interval: str = "1d", use_cache: bool = True) -> pd.DataFrame:
+    """Wide frame of Close prices (one column per ticker, indexed by Datetime), like yf.download(...)['Close']."""
+    bars = fetch_bars(tickers, start, end, interval, use_cache)
+    columns = {ticker: data.set_index('Datetime')['Close'] for ticker, data in bars.items()}
+    prices = pd.concat(columns, axis=1).sort_index() if columns else pd.DataFrame()
+    prices.index.name = 'Datetime'
+    return prices
+
+def latest_closes(tickers: list, lookback_days: int = 7) -> pd.Series:
+    """Most recent daily Close per ticker (including today's bar during the session), from one batch."""
+    end = pd.Timestamp.now().normalize() + pd.Timedelta(days=1)
+    prices = close_prices(tickers, end - pd.Timedelta(days=lookback_days), end)
+    return prices.ffill().iloc[-1] if not prices.empty else pd.Series(dtype=float)
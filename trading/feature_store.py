@@ -0,0 +1,302 @@
+import os
+import json
+import glob
+import time
+import shutil
+import hashlib
+import tempfile
+import dataclasses
+from dataclasses import dataclass
+import numpy as np
+import pandas as pd
+from rich import print
+
+import model_tools as mt
+import technical_analysis as ta
+from result_cache import data_fingerprint
+
+FEATURE_VERSION = 1  # bump when feature definitions in model_tools change
+ANCHOR_ROWS = 64
+MAX_PARTS = 8
+
+@dataclass(frozen=True)
+class IndicatorSpec:
+    """
+    One extra technical_analysis indicator: ta.<function>(*inputs, **params).
+
+    inputs are OHLCV column names passed positionally. outputs names the returned series (one name per
+    element if the function returns a tuple). lags adds Prev{i}_{output} columns for i in 1..lags.
+    """
+    function: str
+    params: tuple = ()  # (("timeperiod", 14),) so the spec stays hashable
+    inputs: tuple = ("Close",)
+    outputs: tuple = None
+    lags: int = 0
+
+    def compute(self, data: pd.DataFrame) -> dict:
+        result = getattr(ta, self.function)(*[data[column] for column in self.inputs], **dict(self.params))
+        results = result if isinstance(result, tuple) else (result,)
+        names = self.outputs or tuple(f"{self.function.upper()}_{i}" if len(results) > 1 else self.function.upper() for i in range(len(results)))
+        columns = {}
+        for name, values in zip(names, results):
+            values = pd.Series(np.asarray(values, dtype=float), index=data.index)
+            columns[name] = values
+            for i in range(1, self.lags + 1):
+                columns[f"Prev{i}_{name}"] = values.shift(i)
+        return columns
+
+@dataclass(frozen=True)
+class FeatureSpec:
+    """
+    Declarative definition of a feature matrix: the prepare_data_classifier feature set plus extra indicators.
+
+    kind="regression" stores the unscaled mt.regression_features frame instead (prepare_data's columns before
+    scaling), which prepare_data(streaming=True) fits its scalers from.
+    features restricts the classifier columns (e.g. a model's selected_features). warmup is how many bars
+    before the stored end are recomputed when new bars are appended, and overlap how many of those are
+    compared against the stored values before the extension is accepted.
+    """
+    lagged_length: int = 5
+    extra_features: bool = False
+    features: tuple = None
+    indicators: tuple = ()
+    warmup: int = 1000
+    overlap: int = 200
+    kind: str = "classifier"
+
+    def key(self) -> str:
+        payload = {
+            'version': FEATURE_VERSION,
+            'lagged_length': self.lagged_length,
+            'extra_features': self.extra_features,
+            'features': list(self.features) if self.features is not None else None,
+            'indicators': [dataclasses.asdict(indicator) for indicator in self.indicators],
+        }
+        if self.kind != "classifier":
+            payload['kind'] = self.kind  # classifier keys stay as they were before kinds existed
+        return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()[:32]
+
+    def build(self, data: pd.DataFrame) -> pd.DataFrame:
+        """Compute the matrix from raw OHLCV as float32. Rows with missing values are dropped."""
+        ohlcv = data[['Open', 'High', 'Low', 'Close', 'Volume']]
+        if self.kind == "regression":
+            X, _ = mt.regression_features(ohlcv, lagged_length=self.lagged_length)
+            return X.astype(np.float32)
+        if self.kind != "classifier":
+            raise ValueError(f"Unknown feature kind {self.kind}, expected 'classifier' or 'regression'")
+        X, _ = mt.prepare_data_classifier(
+            ohlcv, lagged_length=self.lagged_length, extra_features=self.extra_features,
+            features=list(self.features) if self.features is not None else None, create_target=False
+        )
+        if self.indicators:
+            extra = {}
+            for indicator in self.indicators:
+                extra.update(indicator.compute(ohlcv))
+            X = pd.concat([X, pd.DataFrame(extra, index=ohlcv.index).loc[X.index]], axis=1).dropna()
+        return X.astype(np.float32)
+
+class FeatureStore:
+    """
+    On-disk cache of computed feature matrices.
+
+    Entries live in {root}/{spec key}/{anchor}/ where the anchor hashes the first bars of the input, so
+    a longer download of the same series finds the entry. Matrices are stored as float32 .npy parts
+    with the input row position of every output row:
+
+    - full hit: the input matches the stored fingerprint, the parts are loaded and returned.
+    - extension: the stored input is a prefix of the new data. Only the tail (plus warmup) is computed;
+      overlapping rows must match the stored values, columns that differ by a constant (cumulative sums
+      such as OBV/PVT started later) are shifted back, otherwise it falls back to a full recompute.
+    - miss: full compute.
+    """
+    def __init__(self, root: str = None, rtol: float = 1e-3, atol: float = 1e-5):
+        self.root = root or os.path.join(tempfile.gettempdir(), "feature_store")
+        self.rtol = rtol
+        self.atol = atol
+        os.makedirs(self.root, exist_ok=True)
+
+    def _entry_dir(self, spec: FeatureSpec, data: pd.DataFrame) -> str:
+        anchor = data_fingerprint(data.iloc[:ANCHOR_ROWS])[:16]
+        return os.path.join(self.root, spec.key(), anchor)
+
+    def _load_meta(self, entry_dir: str) -> dict:
+        path = os.path.join(entry_dir, "meta.json")
+        if not os.path.exists(path):
+            return None
+        with open(path) as f:
+            return json.load(f)
+
+    @staticmethod
+    def _part_path(entry_dir: str, kind: str, generation: int, part: int) -> str:
+        """Compaction starts a new generation of file names, so the previous parts stay valid until meta moves on."""
+        prefix = f"{kind}_{generation}_" if generation else f"{kind}_"
+        return os.path.join(entry_dir, f"{prefix}{part:03d}.npy")
+
+    def _load(self, entry_dir: str, meta: dict) -> tuple:
+        generation = meta.get('generation', 0)
+        parts = [np.load(self._part_path(entry_dir, "part", generation, i)) for i in range(meta['parts'])]
+        positions = [np.load(self._part_path(entry_dir, "positions", generation, i)) for i in range(meta['parts'])]
+        values = parts[0] if len(parts) == 1 else np.concatenate(parts)
+        return values, np.concatenate(positions)
+
+    def _write_part(self, entry_dir: str, part: int, values: np.ndarray, positions: np.ndarray, generation: int = 0):
+        np.save(self._part_path(entry_dir, "part", generation, part), np.ascontiguousarray(values, dtype=np.float32))
+        np.save(self._part_path(entry_dir, "positions", generation, part), positions.astype(np.int64))
+
+    def _save_meta(self, entry_dir: str, meta: dict):
+        tmp_path = os.path.join(entry_dir, "meta.json.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(meta, f, indent=2)
+        os.replace(tmp_path, os.path.join(entry_dir, "meta.json"))
+
+    def _save_full(self, entry_dir: str, X: pd.DataFrame, data: pd.DataFrame):
+        tmp_dir = f"{entry_dir}.{os.getpid()}.tmp"
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+        self._write_part(tmp_dir, 0, X.to_numpy(dtype=np.float32), data.index.get_indexer(X.index))
+        self._save_meta(tmp_dir, {
+            'columns': list(X.columns),
+            'rows': len(data),
+            'fingerprint': data_fingerprint(data),
+            'parts': 1,
+        })
+        shutil.rmtree(entry_dir, ignore_errors=True)
+        os.makedirs(os.path.dirname(entry_dir), exist_ok=True)
+        os.replace(tmp_dir, entry_dir)
+
+    def _frame(self, values: np.ndarray, positions: np.ndarray, columns: list, data: pd.DataFrame) -> pd.DataFrame:
+        return pd.DataFrame(values, index=data.index[positions], columns=columns, copy=False)
+
+    def _extend(self, entry_dir: str, meta: dict, spec: FeatureSpec, data: pd.DataFrame) -> pd.DataFrame:
+        """Append features for new bars, or return None if the recomputed overlap doesn't match."""
+        values, positions = self._load(entry_dir, meta)
+        stored_rows = meta['rows']
+        tail_start = max(0, stored_rows - spec.warmup - spec.overlap)
+        tail = spec.build(data.iloc[tail_start:])
+        tail_positions = data.index.get_indexer(tail.index)
+
+        new_mask = tail_positions >= stored_rows
+        overlap_mask = (tail_positions >= stored_rows - spec.overlap) & ~new_mask
+        overlap_positions = tail_positions[overlap_mask]
+        overlap_rows = np.searchsorted(positions, overlap_positions)
+        if len(overlap_rows) == 0 or overlap_rows.max() >= len(positions) or not np.array_equal(positions[overlap_rows], overlap_positions):
+            return None
+
+        stored_overlap = values[overlap_rows].astype(np.float64)
+        tail_values = tail.to_numpy(dtype=np.float64)
+        tail_overlap = tail_values[overlap_mask]
+        offset = np.zeros(tail_values.shape[1])
+        for column in range(tail_values.shape[1]):
+            if np.allclose(tail_overlap[:, column], stored_overlap[:, column], rtol=self.rtol, atol=self.atol):
+                continue
+            difference = tail_overlap[:, column] - stored_overlap[:, column]
+            if np.allclose(difference, difference[-1], rtol=self.rtol, atol=self.atol * max(1.0, np.abs(stored_overlap[:, column]).max())):
+                offset[column] = difference[-1]  # cumulative column started later; shift back onto the stored level
+                continue
+            print(f"[yellow]Feature store: {tail.columns[column]} doesn't converge within the warmup, recomputing[/yellow]")
+            return None
+
+        new_values = (tail_values[new_mask] - offset).astype(np.float32)
+        new_positions = tail_positions[new_mask]
+        values = np.concatenate([values, new_values])
+        positions = np.concatenate([positions, new_positions])
+        generation = meta.get('generation', 0)
+        if meta['parts'] >= MAX_PARTS:
+            # Compact into a single part of the next generation; meta only points at it once it is written
+            self._write_part(entry_dir, 0, values, positions, generation + 1)
+            old_parts = meta['parts']
+            meta['generation'], meta['parts'] = generation + 1, 1
+        else:
+            self._write_part(entry_dir, meta['parts'], new_values, new_positions, generation)
+            old_parts = 0
+            meta['parts'] += 1
+        meta['rows'] = len(data)
+        meta['fingerprint'] = data_fingerprint(data)
+        self._save_meta(entry_dir, meta)
+        for i in range(old_parts):
+            for kind in ("part", "positions"):
+                os.remove(self._part_path(entry_dir, kind, generation, i))
+        return self._frame(values, positions, meta['columns'], data)
+
+    def get(self, data: pd.DataFrame, spec: FeatureSpec = None, verbose: bool = True) -> pd.DataFrame:
+        """Feature matrix for data under spec (float32, indexed like data), from disk when possible."""
+        spec = spec or FeatureSpec()
+        start_time = time.time()
+        entry_dir = self._entry_dir(spec, data)
+        meta = self._load_meta(entry_dir)
+
+        X, source = None, "computed"
+        if meta is not None and meta['rows'] == len(data) and meta['fingerprint'] == data_fingerprint(data):
+            values, positions = self._load(entry_dir, meta)
+            X, source = self._frame(values, positions, meta['columns'], data), "cached"
+        elif meta is not None and meta['rows'] < len(data) and meta['fingerprint'] == data_fingerprint(data.iloc[:meta['rows']]):
+            X = self._extend(entry_dir, meta, spec, data)
+            source = f"extended by {len(data) - meta['rows']} bars" if X is not None else source
+
+        if X is None:
+            X = spec.build(data)
+            self._save_full(entry_dir, X, data)
+
+        if verbose:
+            print(f"[blue]Features {source}: {X.shape[0]} rows x {X.shape[1]} columns in {time.time() - start_time:.3f} seconds[/blue]")
+        return X
+
+    def iter_blocks(self, data: pd.DataFrame, spec: FeatureSpec = None, block_rows: int = 100_000):
+        """Yield the matrix as float32 row blocks from memory-mapped parts, e.g. for StreamingScaler.fit_chunks()."""
+        spec = spec or FeatureSpec()
+        self.get(data, spec, verbose=False)
+        entry_dir = self._entry_dir(spec, data)
+        meta = self._load_meta(entry_dir)
+        for i in range(meta['parts']):
+            part = np.load(self._part_path(entry_dir, "part", meta.get('generation', 0), i), mmap_mode='r')
+            for start in range(0, len(part), block_rows):
+                yield part[start:start + block_rows]
+
+    def columns(self, data: pd.DataFrame, spec: FeatureSpec = None) -> list:
+        """Column names of the stored matrix, building it first if needed."""
+        spec = spec or FeatureSpec()
+        self.get(data, spec, verbose=False)
+        return self._load_meta(self._entry_dir(spec, data))['columns']
+
+    def fit_scalers(self, data: pd.DataFrame, spec: FeatureSpec, scalers: dict, columns: dict, block_rows: int = 100_000, fill_mean: tuple = ()) -> dict:
+        """
+        partial_fit each streaming scaler on its columns, one memory-mapped block at a time.
+
+        scalers and columns are keyed by the same names, e.g. {'technical': StreamingStandardScaler()} and
+        {'technical': [...column names...]}. For the names in fill_mean, inf/NaN are replaced by the column
+        mean of the finite values first (like fillna(mean()) in prepare_data), which takes one extra pass.
+        """
+        stored_columns = {column: i for i, column in enumerate(self.columns(data, spec))}
+        positions = {name: [stored_columns[column] for column in names] for name, names in columns.items()}
+        means = {}
+        if fill_mean:
+            sums = {name: np.zeros(len(positions[name])) for name in fill_mean}
+            counts = {name: np.zeros(len(positions[name])) for name in fill_mean}
+            for block in self.iter_blocks(data, spec, block_rows):
+                for name in fill_mean:
+                    values = block[:, positions[name]].astype(np.float64)
+                    finite = np.isfinite(values)
+                    sums[name] += np.where(finite, values, 0).sum(axis=0)
+                    counts[name] += finite.sum(axis=0)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                means = {name: sums[name] / counts[name] for name in fill_mean}
+        for block in self.iter_blocks(data, spec, block_rows):
+            for name, scaler in scalers.items():
+                values = block[:, positions[name]]
+                if name in means:
+                    values = np.where(np.isfinite(values), values, means[name].astype(np.float32))
+                scaler.partial_fit(values)
+        return scalers
+
+    def clear(self):
+        for path in glob.glob(os.path.join(self.root, "*")):
+            shutil.rmtree(path, ignore_errors=True)
+
+_feature_store = None
+
+def get_feature_store() -> FeatureStore:
+    """Process-wide store in the default location."""
+    global _feature_store
+    if _feature_store is None:
+        _feature_store = FeatureStore()
+    return _feature_store
@@ -1,4 +1,3 @@
-import yfinance as yf
 import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
@@ -6,14 +5,13 @@ from typing import List
 import datetime as dt
 import seaborn as sns
 
+import sys
+sys.path.append(r"trading")
+import equities_data
+
 def get_data(tickers: List[str], start_date: dt.date, end_date: dt.date):
-    data = yf.download(tickers, start=start_date, end=end_date, interval="1d", progress=False)
-    data.drop(columns=["Open", "High", "Low", "Volume"], inplace=True)
-    
-    # Remove MultiIndex by flattening column names
-    if isinstance(data.columns, pd.MultiIndex):
-        data.columns = [f"{col[1]}_{col[0]}" for col in data.columns]
-    
+    data = equities_data.close_prices(tickers, start_date, end_date)
+    data.columns = [f"{ticker}_Close" for ticker in data.columns]
     return data
 
 def plot_correlation_matrix(data):
@@ -0,0 +1,83 @@
+import numpy as np
+import pandas as pd
+
+import smc_analysis as smc
+
+# Classifier label codes shared by every scheme
+SELL, HOLD, BUY = 0, 1, 2
+
+def swing_point_labels(open, high, low, window: int = 10) -> np.ndarray:
+    """Swing lows -> BUY, swing highs -> SELL, everything else HOLD. Same labels as the pivot_points loop."""
+    swing_high, swing_low = smc.swing_point_masks(open, high, low, window)
+    labels = np.full(len(swing_high), HOLD, dtype=np.int8)
+    labels[swing_low] = BUY
+    labels[swing_high] = SELL
+    return labels
+
+def triple_barrier_labels(close, high=None, low=None, horizon: int = 20, take_profit: float = 0.01, stop_loss: float = 0.01, volatility_window: int = None) -> np.ndarray:
+    """
+    Triple-barrier labels: BUY if the upper barrier is touched first within horizon bars, SELL if the lower
+    barrier is, HOLD if neither is touched (vertical barrier).
+
+    Barriers are fractions of the entry close, or multiples of the rolling return volatility when
+    volatility_window is set. Uses bar highs/lows when given, closes otherwise. A bar that touches both
+    barriers counts as a stop-loss. The last `horizon` bars don't have a full window and are labelled HOLD.
+    """
+    close = np.asarray(close, dtype=float)
+    high = close if high is None else np.asarray(high, dtype=float)
+    low = close if low is None else np.asarray(low, dtype=float)
+    n = len(close)
+    labels = np.full(n, HOLD, dtype=np.int8)
+    if n <= horizon:
+        return labels
+
+    if volatility_window:
+        volatility = pd.Series(close).pct_change().rolling(volatility_window, min_periods=2).std().to_numpy()
+        upper_pct, lower_pct = take_profit * volatility, stop_loss * volatility
+    else:
+        upper_pct, lower_pct = np.full(n, take_profit), np.full(n, stop_loss)
+
+    m = n - horizon
+    entry = close[:m]
+    # Row t holds bars t+1 .. t+horizon
+    future_high = np.lib.stride_tricks.sliding_window_view(high[1:], horizon)[:m]
+    future_low = np.lib.stride_tricks.sliding_window_view(low[1:], horizon)[:m]
+    hit_upper = future_high >= (entry * (1 + upper_pct[:m]))[:, None]
+    hit_lower = future_low <= (entry * (1 - lower_pct[:m]))[:, None]
+
+    never = horizon
+    first_upper = np.where(hit_upper.any(axis=1), hit_upper.argmax(axis=1), never)
+    first_lower = np.where(hit_lower.any(axis=1), hit_lower.argmax(axis=1), never)
+    valid = ~np.isnan(upper_pct[:m]) & ~np.isnan(lower_pct[:m])
+
+    labels[:m][valid & (first_upper < first_lower)] = BUY
+    labels[:m][valid & (first_lower <= first_upper) & (first_lower < never)] = SELL
+    return labels
+
+def fixed_horizon_quantile_labels(close, horizon: int = 10, quantiles: tuple = (1/3, 2/3)) -> np.ndarray:
+    """
+    Label the forward return over horizon bars by quantile: below the lower quantile SELL, above the upper BUY,
+    in between HOLD. Thresholds are taken over the whole input, so compute them on the training split only.
+    The last `horizon` bars have no forward return and are labelled HOLD.
+    """
+    close = np.asarray(close, dtype=float)
+    labels = np.full(len(close), HOLD, dtype=np.int8)
+    if len(close) <= horizon:
+        return labels
+    forward_return = close[horizon:] / close[:-horizon] - 1
+    lower, upper = np.nanquantile(forward_return, quantiles)
+    labels[:-horizon][forward_return < lower] = SELL
+    labels[:-horizon][forward_return > upper] = BUY
+    return labels
+
+LABEL_SCHEMES = {
+    'swing': lambda data, **kwargs: swing_point_labels(data['Open'], data['High'], data['Low'], **kwargs),
+    'triple_barrier': lambda data, **kwargs: triple_barrier_labels(data['Close'], data['High'], data['Low'], **kwargs),
+    'quantile': lambda data, **kwargs: fixed_horizon_quantile_labels(data['Close'], **kwargs),
+}
+
+def make_labels(data: pd.DataFrame, scheme: str = 'swing', **kwargs) -> np.ndarray:
+    """int8 labels (0=sell, 1=hold, 2=buy) for every row of data."""
+    if scheme not in LABEL_SCHEMES:
+        raise ValueError(f"Unknown label scheme: {scheme}. Choose from {list(LABEL_SCHEMES)}")
+    return LABEL_SCHEMES[scheme](data, **kwargs)
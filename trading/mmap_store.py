@@ -0,0 +1,67 @@
+import os
+import json
+import shutil
+import tempfile
+import numpy as np
+import pandas as pd
+
+def default_array_dir(symbol: str, interval: str) -> str:
+    return os.path.join(tempfile.gettempdir(), "ohlcv_arrays", f"{symbol}_{interval}")
+
+def export_arrays(data: pd.DataFrame, path: str, columns: list = None, float_dtype=np.float64, **meta) -> str:
+    """
+    Write one .npy file per column plus meta.json, replacing any previous export at path.
+
+    Datetime is stored as int64 nanoseconds. Numeric columns are cast to float_dtype (np.float32 halves
+    the footprint). Extra keyword arguments (symbol, interval, ...) are saved in the metadata.
+    """
+    columns = columns or list(data.columns)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+
+    dtypes = {}
+    for column in columns:
+        values = data[column]
+        if pd.api.types.is_datetime64_any_dtype(values):
+            array = values.values.astype('datetime64[ns]').view(np.int64)
+            dtypes[column] = 'datetime64[ns]'
+        else:
+            array = values.to_numpy(dtype=float_dtype)
+            dtypes[column] = np.dtype(float_dtype).name
+        np.save(os.path.join(tmp_path, f"{column}.npy"), np.ascontiguousarray(array))
+
+    with open(os.path.join(tmp_path, "meta.json"), "w") as f:
+        json.dump({"rows": len(data), "columns": columns, "dtypes": dtypes, **meta}, f, indent=2, default=str)
+
+    shutil.rmtree(path, ignore_errors=True)
+    os.replace(tmp_path, path)
+    return path
+
+def read_meta(path: str) -> dict:
+    with open(os.path.join(path, "meta.json")) as f:
+        return json.load(f)
+
+def open_arrays(path: str, columns: list = None) -> dict:
+    """
+    Open an export as read-only memory-mapped arrays.
+
+    Nothing is read until a page is touched, and every process mapping the same files shares the
+    OS page cache instead of holding its own copy. Datetime comes back as a datetime64[ns] view.
+    """
+    meta = read_meta(path)
+    arrays = {}
+    for column in columns or meta["columns"]:
+        array = np.load(os.path.join(path, f"{column}.npy"), mmap_mode='r')
+        if meta["dtypes"].get(column) == 'datetime64[ns]':
+            array = array.view('datetime64[ns]')
+        arrays[column] = array
+    return arrays
+
+def open_frame(path: str, columns: list = None) -> pd.DataFrame:
+    """
+    DataFrame whose columns are the memory-mapped arrays themselves (no copy).
+
+    The columns are read-only: derived columns can be added, but OHLCV values can't be modified in place.
+    """
+    return pd.DataFrame(open_arrays(path, columns), copy=False)
@@ -2,14 +2,12 @@ import time
 from sklearn.preprocessing import MinMaxScaler, QuantileTransformer, StandardScaler
 from datetime import datetime, timedelta
 import requests
-import yfinance as yf
 from tqdm import tqdm
 import pandas as pd
 import numpy as np
-import hashlib
 import os
-import tempfile
 import json
+import re
 
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
@@ -17,150 +15,337 @@ from plotly.subplots import make_subplots
 from rich import print
 import technical_analysis as ta
 import smc_analysis as smc
+import labeling
+from rate_limit import ChunkQueue, RequestScheduler, get_scheduler
+from ohlcv_store import get_store
+import mmap_store
+import equities_data
+import streaming_scalers
 
-def fetch_data(ticker, chunks, interval, age_days, kucoin: bool = True, use_cache: bool = True, cache_expiry_hours: int = 24):
+KUCOIN_API_URL = "https://api.kucoin.com"
+KUCOIN_CANDLE_COLUMNS = ["Datetime", "Open", "Close", "High", "Low", "Volume"]
+KUCOIN_MAX_CANDLES = 1500  # candles returned per request
+
+def kucoin_chunk_windows(chunks, age_days):
+    """(start, end) of each 1440 minute request window, newest first."""
+    windows = []
+    for x in range(chunks):
+        chunksize = 1440  # 1d of 1m data
+        end_time = datetime.now() - timedelta(minutes=chunksize*x) - timedelta(days=age_days)
+        start_time = end_time - timedelta(minutes=chunksize) - timedelta(days=age_days)
+        windows.append((start_time, end_time))
+    return windows
+
+def parse_kucoin_candles(candles) -> np.ndarray:
+    """KuCoin candle rows [time, open, close, high, low, volume, turnover] -> float array in KUCOIN_CANDLE_COLUMNS order."""
+    if not candles:
+        return np.empty((0, len(KUCOIN_CANDLE_COLUMNS)))
+    raw = np.asarray(candles, dtype=float)
+    return raw[:, [0, 1, 2, 3, 4, 6]]
+
+def fetch_kucoin_chunk(scheduler: RequestScheduler, ticker, interval, start_time, end_time, base_url: str = KUCOIN_API_URL) -> np.ndarray:
+    params = {
+        "symbol": ticker,
+        "type": interval,
+        "startAt": str(int(start_time.timestamp())),
+        "endAt": str(int(end_time.timestamp()))
+    }
+    request = scheduler.get(f"{base_url}/api/v1/market/candles", params=params).json()
+    try:
+        request_data = request["data"]  # list of lists
+    except (KeyError, TypeError):
+        raise Exception(f"Error fetching {ticker} from Kucoin. Check request parameters. {request}")
+    return parse_kucoin_candles(request_data)
+
+def fetch_kucoin_candles(ticker, chunks, interval, age_days, max_in_flight: int = 8, base_url: str = KUCOIN_API_URL, scheduler: RequestScheduler = None) -> pd.DataFrame:
+    """
+    Download chunks of KuCoin candles concurrently.
+
+    Up to max_in_flight requests run at once through the shared rate-limit scheduler (per-host token bucket,
+    backoff on 429/5xx). Chunks that still fail are retried in further passes before giving up. Each response
+    is parsed straight into a float array and the chunks are concatenated once at the end. base_url can
+    point at a local stub server.
+    """
+    windows = kucoin_chunk_windows(chunks, age_days)
+    scheduler = scheduler or get_scheduler()
+    queue = ChunkQueue(windows, lambda window: fetch_kucoin_chunk(scheduler, ticker, interval, window[0], window[1], base_url))
+    results = queue.run_until_done(max_in_flight=max_in_flight, desc="KUCOIN PROGRESS")
+
+    data = _kucoin_frame(results)
+
+    times = [t for window in windows for t in window]
+    if times:
+        difference = max(times) - min(times)
+        print(f"{ticker} | {difference.days} days {difference.seconds//3600} hours {difference.seconds//60%60} minutes {difference.seconds%60} seconds | {data.shape[0]} bars")
+    return data
+
+def _kucoin_frame(results: list) -> pd.DataFrame:
+    """Concatenate parsed chunks once into a Datetime-sorted OHLCV frame."""
+    values = np.concatenate(results) if results else np.empty((0, len(KUCOIN_CANDLE_COLUMNS)))
+    data = pd.DataFrame(values[:, 1:], columns=KUCOIN_CANDLE_COLUMNS[1:])
+    data.insert(0, "Datetime", pd.to_datetime(values[:, 0].astype(np.int64), unit='s'))
+    data.sort_values('Datetime', inplace=True, kind='stable')
+    data.reset_index(drop=True, inplace=True)
+    return data
+
+def _floor_to_bar(timestamp: pd.Timestamp, bar: pd.Timedelta) -> pd.Timestamp:
+    return pd.Timestamp((timestamp.value // bar.value) * bar.value)
+
+def kucoin_request_range(chunks, interval, age_days):
+    """
+    UTC [start, end) spanned by the kucoin_chunk_windows of a fetch_data call, snapped to bar boundaries.
+    end is the open time of the bar still forming, so only closed bars are stored.
+    """
+    bar = interval_to_timedelta(interval)
+    end = pd.Timestamp.now(tz='UTC').tz_localize(None) - pd.Timedelta(days=age_days)
+    start = end - pd.Timedelta(minutes=1440 * chunks) - pd.Timedelta(days=age_days)
+    return _floor_to_bar(start, bar), _floor_to_bar(end, bar)
+
+def fetch_kucoin_range(ticker, interval, start, end, max_in_flight: int = 8, base_url: str = KUCOIN_API_URL, scheduler: RequestScheduler = None) -> pd.DataFrame:
+    """KuCoin candles for an arbitrary UTC [start, end), split into requests of at most KUCOIN_MAX_CANDLES bars."""
+    span = interval_to_timedelta(interval) * KUCOIN_MAX_CANDLES
+    windows = []
+    window_start = pd.Timestamp(start)
+    while window_start < end:
+        window_end = min(window_start + span, pd.Timestamp(end))
+        windows.append((window_start, window_end))
+        window_start = window_end
+
+    scheduler = scheduler or get_scheduler()
+    queue = ChunkQueue(windows, lambda window: fetch_kucoin_chunk(scheduler, ticker, interval, window[0], window[1], base_url))
+    results = queue.run_until_done(max_in_flight=max_in_flight, desc="KUCOIN PROGRESS" if len(windows) > 1 else None)
+    data = _kucoin_frame(results)
+    return data[(data['Datetime'] >= start) & (data['Datetime'] < end)].reset_index(drop=True)
+
+def fetch_data(ticker, chunks, interval, age_days, kucoin: bool = True, use_cache: bool = True, cache_expiry_hours: int = 24, max_in_flight: int = 8, backfill: bool = False, export_dir: str = None):
+    """
+    OHLCV bars for the last chunks days ending age_days ago.
+
+    KuCoin and yfinance (kucoin=False, whole days) data both go through the partitioned OHLCV store: only
+    time ranges that haven't been fetched before are downloaded, and closed bars never expire, so
+    cache_expiry_hours is no longer used. Bars are returned in the store's column order.
+    backfill=True also refetches gaps found inside already stored ranges.
+    export_dir writes the result as memory-mappable .npy columns (see mmap_store.open_arrays/open_frame),
+    so worker processes can share one copy. Pass "default" for mmap_store.default_array_dir.
+    """
+    data = _fetch_data(ticker, chunks, interval, age_days, kucoin, use_cache, cache_expiry_hours, max_in_flight, backfill)
+    if export_dir is not None:
+        if export_dir == "default":
+            export_dir = mmap_store.default_array_dir(ticker, interval)
+        mmap_store.export_arrays(data, export_dir, symbol=ticker, interval=interval, chunks=chunks, age_days=age_days)
+        print(f"[blue]Exported arrays to {export_dir}[/blue]")
+    return data
+
+def _fetch_data(ticker, chunks, interval, age_days, kucoin, use_cache, cache_expiry_hours, max_in_flight, backfill):
     print("[yellow]FETCHING DATA[/yellow]")
-    
-    cache_key = f"{ticker}_{chunks}_{interval}_{age_days}_{kucoin}"
-    cache_hash = hashlib.sha256(cache_key.encode()).hexdigest()
-    cache_file = os.path.join(tempfile.gettempdir(), f"market_data_{cache_hash}.parquet")
-    
-    if use_cache and os.path.exists(cache_file):
-        file_modified_time = datetime.fromtimestamp(os.path.getmtime(cache_file))
-        file_age_hours = (datetime.now() - file_modified_time).total_seconds() / 3600
-        
-        if file_age_hours < cache_expiry_hours:
-            try:
-                cached_data = pd.read_parquet(cache_file)
-                print(f"[blue]USING CACHED DATA FROM {file_modified_time}[/blue] ({os.path.getsize(cache_file)/(1024**2):.2f} MB)")
-                
-                with open(f"{cache_file}.json", "w") as f:
-                    json.dump({
-                        "ticker": ticker,
-                        "chunks": chunks,
-                        "interval": interval,
-                        "age_days": age_days,
-                        "kucoin": kucoin,
-                        "cached_time": str(file_modified_time),
-                        "rows": len(cached_data),
-                        "accessed_time": str(datetime.now())
-                    }, f, indent=2)
-                
-                return cached_data
-            except Exception as e:
-                print(f"[yellow]Cache read error: {e}. Fetching fresh data...[/yellow]")
-        else:
-            print(f"[yellow]Cache expired ({file_age_hours:.1f} hours old). Fetching fresh data...[/yellow]")
-    
-    print("[green]DOWNLOADING DATA[/green]")
-    if not kucoin:
-        data = pd.DataFrame()
-        times = []
-        for x in range(chunks):
-            chunksize = 1
-            start_date = datetime.now() - timedelta(days=chunksize) - timedelta(days=chunksize*x) - timedelta(days=age_days)
-            end_date = datetime.now() - timedelta(days=chunksize*x) - timedelta(days=age_days)
-            temp_data = yf.download(ticker, start=start_date.strftime('%Y-%m-%d'), end=end_date.strftime('%Y-%m-%d'), interval=interval, progress=False)
-            if data.empty:
-                data = temp_data
-            else:
-                data = pd.concat([data, temp_data])
-            times.append(start_date)
-            times.append(end_date)
-        
-        earliest = min(times)
-        latest = max(times)
-        difference = latest - earliest
-        print(f"\n{ticker} | {difference.days} days {difference.seconds//3600} hours {difference.seconds//60%60} minutes {difference.seconds%60} seconds")
-
-        data.sort_index(inplace=True)
-        data.columns = data.columns.droplevel(1)
-        data.reset_index(inplace=True)
-        data.rename(columns={'index': 'Datetime'}, inplace=True)
-        data.rename(columns={'Date': 'Datetime'}, inplace=True)
-        data = pd.DataFrame(data)  
-    elif kucoin:
-        data = pd.DataFrame(columns=["Datetime", "Open", "High", "Low", "Close", "Volume"])
-        times = []
-        
-        progress_bar = tqdm(total=chunks, desc="KUCOIN PROGRESS", ascii="#>")
-        for x in range(chunks):
-            chunksize = 1440  # 1d of 1m data
-            end_time = datetime.now() - timedelta(minutes=chunksize*x) - timedelta(days=age_days)
-            start_time = end_time - timedelta(minutes=chunksize) - timedelta(days=age_days)
-            
-            params = {
-                "symbol": ticker,
-                "type": interval,
-                "startAt": str(int(start_time.timestamp())),
-                "endAt": str(int(end_time.timestamp()))
-            }
-            
-            request = requests.get("https://api.kucoin.com/api/v1/market/candles", params=params).json()
-            try:
-                request_data = request["data"]  # list of lists
-            except:
-                raise Exception(f"Error fetching {ticker} from Kucoin. Check request parameters. {request}")
-            
-            records = []
-            for dochltv in request_data:
-                records.append({
-                    "Datetime": dochltv[0],
-                    "Open": float(dochltv[1]),
-                    "Close": float(dochltv[2]),
-                    "High": float(dochltv[3]),
-                    "Low": float(dochltv[4]),
-                    "Volume": float(dochltv[6])
-                })
-            
-            temp_data = pd.DataFrame(records)
-            if data.empty:
-                data = temp_data
-            else:
-                data = pd.concat([data, temp_data])
-            times.append(start_time)
-            times.append(end_time)
-
-            progress_bar.update(1)
-        progress_bar.close()
-        
-        earliest = min(times)
-        latest = max(times)
-        difference = latest - earliest
+
+    if kucoin:
+        if not use_cache:
+            print("[green]DOWNLOADING DATA[/green]")
+            return fetch_kucoin_candles(ticker, chunks, interval, age_days, max_in_flight=max_in_flight)
+
+        start, end = kucoin_request_range(chunks, interval, age_days)
+        data = get_store().get(
+            ticker, interval, start, end,
+            fetcher=lambda range_start, range_end: fetch_kucoin_range(ticker, interval, range_start, range_end, max_in_flight=max_in_flight),
+            backfill=backfill, bar=interval_to_timedelta(interval)
+        )
+        difference = end - start
         print(f"{ticker} | {difference.days} days {difference.seconds//3600} hours {difference.seconds//60%60} minutes {difference.seconds%60} seconds | {data.shape[0]} bars")
-        
-        data["Datetime"] = pd.to_datetime(pd.to_numeric(data['Datetime']), unit='s')
-        data.sort_values('Datetime', inplace=True)
-        data.reset_index(drop=True, inplace=True)
-    
-    if use_cache:
-        try:
-            data.to_parquet(cache_file)
-            print(f"[blue]Data cached to {cache_file}[/blue] ({os.path.getsize(cache_file)/(1024**2):.2f} MB)")
-            
-            with open(f"{cache_file}.json", "w") as f:
-                json.dump({
-                    "ticker": ticker,
-                    "chunks": chunks,
-                    "interval": interval,
-                    "age_days": age_days,
-                    "kucoin": kucoin,
-                    "cached_time": str(datetime.now()),
-                    "rows": len(data)
-                }, f, indent=2)
-                
-        except Exception as e:
-            print(f"[yellow]Failed to cache data: {e}[/yellow]")
-        
+        return data
+    
+    # yfinance: whole days, batched and cached in the same store through equities_data
+    now = datetime.now()
+    start = pd.Timestamp((now - timedelta(days=chunks + age_days)).strftime('%Y-%m-%d'))
+    end = pd.Timestamp((now - timedelta(days=age_days)).strftime('%Y-%m-%d'))
+    data = equities_data.fetch_bars([ticker], start, end, interval, use_cache=use_cache)[ticker]
+    difference = end - start
+    print(f"\n{ticker} | {difference.days} days {difference.seconds//3600} hours {difference.seconds//60%60} minutes {difference.seconds%60} seconds | {data.shape[0]} bars")
     return data
 
-def prepare_data(data, lagged_length=5, train_split=True, scale_y=True):
-    scalers = {
-        'price': MinMaxScaler(feature_range=(0, 1)),
-        'volume': QuantileTransformer(output_distribution='normal'),
-        'technical': StandardScaler()
-    }
+# KuCoin and yfinance interval names -> bar length
+INTERVAL_TIMEDELTAS = {
+    "1min": pd.Timedelta(minutes=1), "3min": pd.Timedelta(minutes=3), "5min": pd.Timedelta(minutes=5),
+    "15min": pd.Timedelta(minutes=15), "30min": pd.Timedelta(minutes=30),
+    "1hour": pd.Timedelta(hours=1), "2hour": pd.Timedelta(hours=2), "4hour": pd.Timedelta(hours=4),
+    "6hour": pd.Timedelta(hours=6), "8hour": pd.Timedelta(hours=8), "12hour": pd.Timedelta(hours=12),
+    "1day": pd.Timedelta(days=1), "1week": pd.Timedelta(weeks=1),
+    "1m": pd.Timedelta(minutes=1), "2m": pd.Timedelta(minutes=2), "5m": pd.Timedelta(minutes=5),
+    "15m": pd.Timedelta(minutes=15), "30m": pd.Timedelta(minutes=30), "60m": pd.Timedelta(hours=1),
+    "90m": pd.Timedelta(minutes=90), "1h": pd.Timedelta(hours=1), "1d": pd.Timedelta(days=1),
+    "5d": pd.Timedelta(days=5), "1wk": pd.Timedelta(weeks=1),
+}
+
+WEEK_ORIGIN = pd.Timestamp("1970-01-05") - pd.Timestamp(0)  # first Monday after the epoch
+
+def interval_to_timedelta(interval) -> pd.Timedelta:
+    """Bar length for a KuCoin/yfinance interval name, or any pandas offset alias ("45min", "2h")."""
+    if isinstance(interval, pd.Timedelta):
+        return interval
+    if interval in INTERVAL_TIMEDELTAS:
+        return INTERVAL_TIMEDELTAS[interval]
+    try:
+        return pd.to_timedelta(interval)
+    except ValueError:
+        raise ValueError(f"Unknown interval: {interval}")
+
+def infer_bar_timedelta(data: pd.DataFrame) -> pd.Timedelta:
+    """Base bar length from the median spacing of the Datetime column."""
+    if len(data) < 2:
+        raise ValueError("Need at least two bars to infer the bar interval.")
+    return pd.Timedelta(data['Datetime'].diff().median())
+
+def resample_ohlcv(data: pd.DataFrame, interval, drop_partial: bool = True) -> pd.DataFrame:
+    """
+    Aggregate OHLCV bars to a coarser interval (first/max/min/last/sum), aligned like exchange candles.
+
+    Expects bars sorted by Datetime (bar open time), as returned by fetch_data. Buckets are found with
+    integer division on the UTC timestamps and reduced with np.ufunc.reduceat, so there is no per-group Python.
+    Intraday and daily buckets are aligned to the epoch, weekly buckets start on Monday 00:00 UTC. A tz-aware
+    Datetime column keeps its timezone.
+    With drop_partial, a leading bucket that starts before the first base bar and a trailing bucket that
+    hasn't closed by the end of the data are dropped. Missing base bars inside a bucket don't make it partial.
+    """
+    interval = interval_to_timedelta(interval)
+    if data.empty:
+        return data.iloc[0:0][['Datetime', 'Open', 'High', 'Low', 'Close', 'Volume']].copy()
+    base = infer_bar_timedelta(data) if len(data) > 1 else interval
+    if interval < base:
+        raise ValueError(f"Cannot resample {base} bars to a finer interval {interval}.")
+
+    times = data['Datetime'].values.astype('datetime64[ns]').astype(np.int64)
+    step = interval.value
+    # The epoch is a Thursday; weekly candles open on Monday
+    origin = WEEK_ORIGIN.value if interval % pd.Timedelta(weeks=1) == pd.Timedelta(0) else 0
+    buckets = (times - origin) // step
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    ends = np.r_[starts[1:], len(times)] - 1
+
+    bucket_times = pd.to_datetime(buckets[starts] * step + origin)
+    tz = getattr(data['Datetime'].dtype, 'tz', None)
+    if tz is not None:
+        bucket_times = bucket_times.tz_localize('UTC').tz_convert(tz)
+    result = pd.DataFrame({
+        'Datetime': bucket_times,
+        'Open': data['Open'].values[starts],
+        'High': np.maximum.reduceat(data['High'].to_numpy(dtype=float), starts),
+        'Low': np.minimum.reduceat(data['Low'].to_numpy(dtype=float), starts),
+        'Close': data['Close'].values[ends],
+        'Volume': np.add.reduceat(data['Volume'].to_numpy(dtype=float), starts),
+    })
+
+    if drop_partial:
+        keep = np.ones(len(result), dtype=bool)
+        keep[0] = times[0] == buckets[0] * step + origin
+        keep[-1] = times[-1] + base.value >= (buckets[-1] + 1) * step + origin
+        result = result[keep].reset_index(drop=True)
+    return result
+
+def align_higher_timeframe(data: pd.DataFrame, interval, columns=None, prefix: str = None, transform=None) -> pd.DataFrame:
+    """
+    Resample data to a higher timeframe and align it back to the base bars without lookahead.
+
+    Each base bar only sees the last higher-timeframe bar that had closed by the time the base bar closed,
+    so a 1hour close only becomes visible on the 1min bar ending at the top of the hour.
+    transform(higher) may return a dict of extra columns computed on the higher-timeframe bars (e.g. an EMA),
+    which can then be listed in columns.
+    Returns a frame on data's index with columns named f"{prefix}_{column}" (prefix defaults to the interval).
+    """
+    columns = columns or ['Open', 'High', 'Low', 'Close', 'Volume']
+    prefix = prefix or str(interval)
+    higher = resample_ohlcv(data, interval, drop_partial=True)
+    if transform is not None:
+        higher = higher.assign(**transform(higher))
+    interval = interval_to_timedelta(interval)
+    base = infer_bar_timedelta(data)
+
+    higher_close = higher[columns].copy()
+    higher_close['Close_Time'] = higher['Datetime'] + interval
+    base_close = pd.DataFrame({'Close_Time': (data['Datetime'] + base).reset_index(drop=True), 'Row': np.arange(len(data))})
+
+    aligned = pd.merge_asof(base_close, higher_close, on='Close_Time', direction='backward')
+    aligned = aligned.set_index('Row')[columns]
+    aligned.index = data.index
+    aligned.columns = [f"{prefix}_{column}" for column in columns]
+    return aligned
+
+def fetch_multi_timeframe(ticker, chunks, intervals, age_days, kucoin: bool = True, **kwargs) -> dict:
+    """Fetch the finest of intervals once and derive the others locally with resample_ohlcv."""
+    intervals = list(intervals)
+    base_interval = min(intervals, key=interval_to_timedelta)
+    base = fetch_data(ticker, chunks, base_interval, age_days, kucoin=kucoin, **kwargs)
+    frames = {base_interval: base}
+    for interval in intervals:
+        if interval not in frames:
+            frames[interval] = resample_ohlcv(base, interval)
+    return frames
+
+LAG_COLUMN_PATTERN = re.compile(r'^Prev(\d+)_(.+)$')
+
+def lag_windows(values: np.ndarray, lagged_length: int) -> np.ndarray:
+    """
+    Strided (T - lagged_length + 1, lagged_length, cols) view over a (T, cols) array.
+
+    out[j, i, c] is values[j + lagged_length - 1 - i, c]: i=0 is the row itself and i=k is the value k
+    rows earlier (Prev{k}). No data is copied.
+    """
+    windows = np.lib.stride_tricks.sliding_window_view(values, lagged_length, axis=0)  # (T-L+1, cols, L)
+    return windows.transpose(0, 2, 1)[:, ::-1, :]
+
+class LaggedFeatures:
+    """
+    Lagged columns as a sliding-window view instead of Prev{i}_{col} columns.
+
+    All lags share one contiguous float32 buffer of the base columns (T x cols); windows is a
+    (rows x lagged_length x cols) view into it, aligned to index. windows[:, 0] is the current bar and
+    windows[:, i] equals the Prev{i}_{col} columns. Rows of a contiguous index range stay zero-copy;
+    a non-contiguous index falls back to a gathered copy.
+    """
+    def __init__(self, frame: pd.DataFrame, lagged_length: int, index=None):
+        self.columns = list(frame.columns)
+        self.lagged_length = lagged_length
+        self.buffer = np.ascontiguousarray(frame.to_numpy(dtype=np.float32))
+        self.index = frame.index[lagged_length - 1:] if index is None else index
+
+        full = lag_windows(self.buffer, lagged_length)
+        positions = frame.index.get_indexer(self.index) - (lagged_length - 1)
+        if (positions < 0).any():
+            raise ValueError("index contains rows without a full lag window")
+        if len(positions) and np.array_equal(positions, np.arange(positions[0], positions[0] + len(positions))):
+            self.windows = full[positions[0]:positions[0] + len(positions)]
+        else:
+            self.windows = full[positions]
+
+    def __len__(self) -> int:
+        return len(self.windows)
+
+    @property
+    def shape(self) -> tuple:
+        return self.windows.shape
+
+    @property
+    def nbytes(self) -> int:
+        """Memory actually held: the shared buffer (plus a gathered copy if the rows weren't contiguous)."""
+        return self.buffer.nbytes + (self.windows.nbytes if self.windows.base is None else 0)
+
+    def to_frame(self) -> pd.DataFrame:
+        """Materialize the Prev{i}_{col} columns in the order the column-based path creates them."""
+        columns = {}
+        for c, col in enumerate(self.columns):
+            for i in range(1, self.lagged_length):
+                columns[f'Prev{i}_{col}'] = self.windows[:, i, c]
+        return pd.DataFrame(columns, index=self.index)
+
+def _trim_to_full_windows(df: pd.DataFrame, positions: np.ndarray, lagged_length: int) -> pd.DataFrame:
+    """Drop rows that don't have lagged_length - 1 earlier bars, as the Prev column NaNs would have."""
+    return df[positions >= lagged_length - 1]
+
+def regression_features(data, lagged_length=5, lag_window=False) -> tuple:
+    """
+    Unscaled prepare_data frame: OHLCV, indicators and Prev{i}_{col} lags (none with lag_window), NaNs filled.
 
+    Returns (frame, lag_columns) where lag_columns are the columns a LaggedFeatures view is built over.
+    """
     df = data.copy()
 
     df['Log_Return'] = ta.log_return(df['Close'])
@@ -188,12 +373,14 @@ def prepare_data(data, lagged_length=5, train_split=True, scale_y=True):
     
     df['MFI'] = ta.mfi(df['High'], df['Low'], df['Close'], df['Volume'])
     
+    lag_columns = [col for col in df.columns if col != 'Datetime']
     lagged_features = []
-    for col in df.columns:
-        for i in range(1, lagged_length):
-            lagged_features.append(pd.DataFrame({
-                f'Prev{i}_{col}': df[col].shift(i)
-            }))
+    if not lag_window:
+        for col in lag_columns:
+            for i in range(1, lagged_length):
+                lagged_features.append(pd.DataFrame({
+                    f'Prev{i}_{col}': df[col].shift(i)
+                }))
     
     if lagged_features:
         df = pd.concat([df] + lagged_features, axis=1)
@@ -207,26 +394,67 @@ def prepare_data(data, lagged_length=5, train_split=True, scale_y=True):
     
     df = df.bfill().ffill()
     df.dropna(inplace=True)
+    return df, lag_columns
+
+def prepare_data(data, lagged_length=5, train_split=True, scale_y=True, lag_window=False, scalers=None, streaming=False):
+    """
+    Regression features with next-bar Close as target.
+
+    lag_window: Instead of Prev{i}_{col} columns for every column, return a LaggedFeatures view over the
+    (scaled) base columns as an extra last return value.
+    scalers: Already fitted scalers (e.g. loaded next to a checkpoint with streaming_scalers.load_scalers)
+    to transform with instead of fitting new ones.
+    streaming: Fit the streaming_scalers versions (t-digest quantiles, running moments) instead of the sklearn
+    scalers; they can be saved with the model. Without lag_window they are fitted block by block from the
+    feature store's memory-mapped copy of the unscaled frame (FeatureSpec(kind="regression")), so fitting
+    never holds more than one block of rows.
+    """
+    fit_scalers = scalers is None
+    if fit_scalers and streaming:
+        scalers = streaming_scalers.prepare_data_scalers()
+    elif fit_scalers:
+        scalers = {
+            'price': MinMaxScaler(feature_range=(0, 1)),
+            'volume': QuantileTransformer(output_distribution='normal'),
+            'technical': StandardScaler()
+        }
+
+    def scale(name, columns):
+        if name in prefitted:
+            return scalers[name].transform(df[columns].to_numpy(dtype=np.float32))
+        return scalers[name].fit_transform(df[columns]) if fit_scalers else scalers[name].transform(df[columns])
+
+    df, lag_columns = regression_features(data, lagged_length, lag_window)
+    lag_prefixes = range(1, lagged_length) if not lag_window else []
+    prefitted = set()
 
     if train_split:
-        price_features = ['Open', 'High', 'Low', 'Close'] + [f'Prev{i}_{col}' for i in range(1, lagged_length) for col in ['Open', 'High', 'Low', 'Close']]
-        volume_features = ['Volume', 'OBV'] + [f'Prev{i}_Volume' for i in range(1, lagged_length)]
+        price_features = ['Open', 'High', 'Low', 'Close'] + [f'Prev{i}_{col}' for i in lag_prefixes for col in ['Open', 'High', 'Low', 'Close']]
+        volume_features = ['Volume', 'OBV'] + [f'Prev{i}_Volume' for i in lag_prefixes]
         bounded_features = ['RSI', 'STOCH_K', 'STOCH_D', 'MFI', 'WillR']  # Features that are already bounded
         
         technical_features = [col for col in df.columns 
                             if col not in (price_features + volume_features + bounded_features + ['Datetime'])]
+
+        if fit_scalers and streaming and not lag_window:
+            columns = {'volume': volume_features}
+            if scale_y:
+                columns['price'] = price_features
+            if technical_features:
+                columns['technical'] = technical_features
+            prefitted = fit_streaming_scalers(data, scalers, columns, lagged_length)
         
         if scale_y:
-            df[price_features] = scalers['price'].fit_transform(df[price_features])
+            df[price_features] = scale('price', price_features)
         else:
             df[price_features] = df[price_features]
         
         df[volume_features] = df[volume_features].replace([np.inf, -np.inf], np.nan)
         df[volume_features] = df[volume_features].fillna(df[volume_features].mean())
-        df[volume_features] = scalers['volume'].fit_transform(df[volume_features])
+        df[volume_features] = scale('volume', volume_features)
         
         if technical_features:
-            df[technical_features] = scalers['technical'].fit_transform(df[technical_features])
+            df[technical_features] = scale('technical', technical_features)
 
         if 'Datetime' in df.columns:
             X = df.drop(['Datetime'], axis=1)
@@ -237,353 +465,385 @@ def prepare_data(data, lagged_length=5, train_split=True, scale_y=True):
         
         X = X[:-1]
         y = y[:-1]
+        if lag_window:
+            X = X.iloc[lagged_length - 1:]
+            y = y.iloc[lagged_length - 1:]
+            return X, y, scalers, LaggedFeatures(df[lag_columns], lagged_length, X.index)
         return X, y, scalers
     
+    if lag_window:
+        return df.iloc[lagged_length - 1:], scalers, LaggedFeatures(df[lag_columns], lagged_length)
     return df, scalers
 
-def prepare_data_classifier(data, lagged_length=5, extra_features=False, elapsed_time=False):
-    start_time = time.time()
-    df = data.copy()
-    section_times = {}
-    if 'Datetime' in df.columns:
-        df.drop(columns=['Datetime'], inplace=True)
-    indicators = {}
-    
+def fit_streaming_scalers(data, scalers: dict, columns: dict, lagged_length=5, block_rows=100_000) -> set:
+    """
+    Fit streaming scalers chunk by chunk from the feature store's copy of the regression_features frame.
+
+    Returns the names of the scalers that were fitted; none if any requested column is missing from the
+    stored matrix, in which case the caller fits in memory. The volume columns are mean-filled like
+    prepare_data does before transforming them.
+    """
+    from feature_store import FeatureSpec, get_feature_store  # feature_store imports model_tools
+    ohlcv = data[['Open', 'High', 'Low', 'Close', 'Volume']]
+    spec = FeatureSpec(lagged_length=lagged_length, kind="regression")
+    store = get_feature_store()
+    stored_columns = store.columns(ohlcv, spec)
+    if not all(column in stored_columns for names in columns.values() for column in names):
+        return set()
+    fill_mean = tuple(name for name in ('volume',) if name in columns)
+    store.fit_scalers(ohlcv, spec, {name: scalers[name] for name in columns}, columns, block_rows, fill_mean)
+    return set(columns)
+
+def _feature_groups(df, extra_features=False):
+    """
+    Indicator groups of the classifier/RL feature set, in output column order.
+
+    Each entry is (section, output columns, function returning {column: values}, optional). Columns that
+    are derived from each other (e.g. MACD_Hist from MACD) live in the same group so a group can be
+    computed or skipped as a unit. Optional groups are dropped silently if they fail.
+    """
+    open_, high, low, close = df['Open'], df['High'], df['Low'], df['Close']
+    groups = []
+
+    def add(section, outputs, optional=False):
+        def register(func):
+            groups.append((section, outputs, func, optional))
+            return func
+        return register
+
     # ===== PRICE ACTION INDICATORS =====
-    section_start = time.time()
-    # Basic price relationships
-    indicators['Log_Return'] = ta.log_return(df['Close'])
-    indicators['Price_Range'] = (df['High'] - df['Low']) / df['Close']
-    indicators['Close_Open_Range'] = (df['Close'] - df['Open']) / df['Open']
-    section_times['Price Action'] = time.time() - section_start
-    
+    @add('Price Action', ('Log_Return',))
+    def _():
+        return {'Log_Return': ta.log_return(close)}
+
+    @add('Price Action', ('Price_Range',))
+    def _():
+        return {'Price_Range': (high - low) / close}
+
+    @add('Price Action', ('Close_Open_Range',))
+    def _():
+        return {'Close_Open_Range': (close - open_) / open_}
+
     # ===== TREND INDICATORS =====
-    section_start = time.time()
-    # Simple Moving Averages
-    # indicators['SMA5'] = ta.sma(df['Close'], timeperiod=5) / df['Close']
-    # indicators['SMA10'] = ta.sma(df['Close'], timeperiod=10) / df['Close'] 
-    # indicators['SMA20'] = ta.sma(df['Close'], timeperiod=20) / df['Close']
-    # indicators['SMA50'] = ta.sma(df['Close'], timeperiod=50) / df['Close']
-    # indicators['SMA100'] = ta.sma(df['Close'], timeperiod=100) / df['Close']
-    
-    # # Exponential Moving Averages
-    # indicators['EMA5'] = ta.ema(df['Close'], timeperiod=5) / df['Close']
-    # indicators['EMA10'] = ta.ema(df['Close'], timeperiod=10) / df['Close']
-    # indicators['EMA20'] = ta.ema(df['Close'], timeperiod=20) / df['Close']
-    # indicators['EMA50'] = ta.ema(df['Close'], timeperiod=50) / df['Close']
-    
-    # # Advanced Moving Averages
-    # indicators['DEMA10'] = ta.dema(df['Close'], timeperiod=10) / df['Close']
-    # indicators['DEMA20'] = ta.dema(df['Close'], timeperiod=20) / df['Close']
-    # indicators['TEMA10'] = ta.tema(df['Close'], timeperiod=10) / df['Close']
-    # indicators['TEMA20'] = ta.tema(df['Close'], timeperiod=20) / df['Close']
-    # indicators['HMA10'] = ta.hma(df['Close'], timeperiod=10) / df['Close']
-    # indicators['WMA10'] = ta.wma(df['Close'], timeperiod=10) / df['Close']
-    # indicators['KAMA10'] = ta.kama(df['Close']) / df['Close']
-    
-    # # Moving Average Crossovers
-    # indicators['SMA5_SMA10'] = indicators['SMA5'] - indicators['SMA10']
-    # indicators['SMA10_SMA20'] = indicators['SMA10'] - indicators['SMA20']
-    # indicators['SMA20_SMA50'] = indicators['SMA20'] - indicators['SMA50']
-    # indicators['EMA10_EMA20'] = indicators['EMA10'] - indicators['EMA20']
-    section_times['Moving Averages'] = time.time() - section_start
-    
-    section_start = time.time()
-    indicators['MACD'], indicators['MACD_Signal'] = ta.macd(df['Close'])
-    indicators['MACD_Hist'] = indicators['MACD'] - indicators['MACD_Signal']
-    
-    indicators['PPO'], indicators['PPO_Signal'], indicators['PPO_Hist'] = ta.ppo(df['Close'])
-    
-    indicators['ADX'], indicators['PLUS_DI'], indicators['MINUS_DI'] = ta.adx(df['High'], df['Low'], df['Close'])
-    indicators['DI_Diff'] = indicators['PLUS_DI'] - indicators['MINUS_DI']
-    
-    indicators['AROON_UP'], indicators['AROON_DOWN'] = ta.aroon(df['High'], df['Low'])
-    indicators['AROON_OSC'] = indicators['AROON_UP'] - indicators['AROON_DOWN']
-    
-    indicators['AO'] = ta.awesome_oscillator(df['High'], df['Low'])
-    indicators['DPO'] = ta.dpo(df['Close'], timeperiod=20) / df['Close']
-    section_times['Trend Indicators'] = time.time() - section_start
-    
+    @add('Trend Indicators', ('MACD', 'MACD_Signal', 'MACD_Hist'))
+    def _():
+        macd, signal = ta.macd(close)
+        return {'MACD': macd, 'MACD_Signal': signal, 'MACD_Hist': macd - signal}
+
+    @add('Trend Indicators', ('PPO', 'PPO_Signal', 'PPO_Hist'))
+    def _():
+        ppo, signal, hist = ta.ppo(close)
+        return {'PPO': ppo, 'PPO_Signal': signal, 'PPO_Hist': hist}
+
+    @add('Trend Indicators', ('ADX', 'PLUS_DI', 'MINUS_DI', 'DI_Diff'))
+    def _():
+        adx, plus_di, minus_di = ta.adx(high, low, close)
+        return {'ADX': adx, 'PLUS_DI': plus_di, 'MINUS_DI': minus_di, 'DI_Diff': plus_di - minus_di}
+
+    @add('Trend Indicators', ('AROON_UP', 'AROON_DOWN', 'AROON_OSC'))
+    def _():
+        aroon_up, aroon_down = ta.aroon(high, low)
+        return {'AROON_UP': aroon_up, 'AROON_DOWN': aroon_down, 'AROON_OSC': aroon_up - aroon_down}
+
+    @add('Trend Indicators', ('AO',))
+    def _():
+        return {'AO': ta.awesome_oscillator(high, low)}
+
+    @add('Trend Indicators', ('DPO',))
+    def _():
+        return {'DPO': ta.dpo(close, timeperiod=20) / close}
+
     # ===== MOMENTUM INDICATORS =====
-    section_start = time.time()
-    indicators['MOM5'] = ta.mom(df['Close'], timeperiod=5) / df['Close']
-    indicators['MOM10'] = ta.mom(df['Close'], timeperiod=10) / df['Close']
-    
-    indicators['ROC5'] = ta.roc(df['Close'], timeperiod=5)
-    indicators['ROC10'] = ta.roc(df['Close'], timeperiod=10)
-    
-    indicators['RSI7'] = ta.rsi(df['Close'], timeperiod=7)
-    indicators['RSI14'] = ta.rsi(df['Close'], timeperiod=14)
-    indicators['RSI21'] = ta.rsi(df['Close'], timeperiod=21)
-    
-    indicators['STOCH_K'], indicators['STOCH_D'] = ta.stoch(df['High'], df['Low'], df['Close'])
-    indicators['STOCH_K_D'] = indicators['STOCH_K'] - indicators['STOCH_D']
-    
-    indicators['CCI'] = ta.cci(df['High'], df['Low'], df['Close'])
-    indicators['WillR'] = ta.willr(df['High'], df['Low'], df['Close'])
-    indicators['TSI'], indicators['TSI_Signal'] = ta.tsi(df['Close'])
-    indicators['RVI'] = ta.rvi(df['Open'], df['High'], df['Low'], df['Close'])
-    section_times['Momentum Indicators'] = time.time() - section_start
-    
+    for period in (5, 10):
+        @add('Momentum Indicators', (f'MOM{period}',))
+        def _(period=period):
+            return {f'MOM{period}': ta.mom(close, timeperiod=period) / close}
+
+    for period in (5, 10):
+        @add('Momentum Indicators', (f'ROC{period}',))
+        def _(period=period):
+            return {f'ROC{period}': ta.roc(close, timeperiod=period)}
+
+    for period in (7, 14, 21):
+        @add('Momentum Indicators', (f'RSI{period}',))
+        def _(period=period):
+            return {f'RSI{period}': ta.rsi(close, timeperiod=period)}
+
+    @add('Momentum Indicators', ('STOCH_K', 'STOCH_D', 'STOCH_K_D'))
+    def _():
+        stoch_k, stoch_d = ta.stoch(high, low, close)
+        return {'STOCH_K': stoch_k, 'STOCH_D': stoch_d, 'STOCH_K_D': stoch_k - stoch_d}
+
+    @add('Momentum Indicators', ('CCI',))
+    def _():
+        return {'CCI': ta.cci(high, low, close)}
+
+    @add('Momentum Indicators', ('WillR',))
+    def _():
+        return {'WillR': ta.willr(high, low, close)}
+
+    @add('Momentum Indicators', ('TSI', 'TSI_Signal'))
+    def _():
+        tsi, signal = ta.tsi(close)
+        return {'TSI': tsi, 'TSI_Signal': signal}
+
+    @add('Momentum Indicators', ('RVI',))
+    def _():
+        return {'RVI': ta.rvi(open_, high, low, close)}
+
     # ===== VOLATILITY INDICATORS =====
-    section_start = time.time()
-    indicators['ATR'] = ta.atr(df['High'], df['Low'], df['Close'])
-    indicators['ATR_Pct'] = indicators['ATR'] / df['Close'] * 100
-    
-    indicators['BB_Upper'], indicators['BB_Middle'], indicators['BB_Lower'] = ta.bbands(df['Close'])
-    indicators['BB_Width'] = (indicators['BB_Upper'] - indicators['BB_Lower']) / indicators['BB_Middle']
-    indicators['BB_Pos'] = (df['Close'] - indicators['BB_Lower']) / (indicators['BB_Upper'] - indicators['BB_Lower'])
-    
-    indicators['KC_Upper'], indicators['KC_Middle'], indicators['KC_Lower'] = ta.keltner_channels(df['High'], df['Low'], df['Close'])
-    indicators['KC_Width'] = (indicators['KC_Upper'] - indicators['KC_Lower']) / indicators['KC_Middle']
-    indicators['KC_Pos'] = (df['Close'] - indicators['KC_Lower']) / (indicators['KC_Upper'] - indicators['KC_Lower'])
-    
-    indicators['CHOP'] = ta.choppiness_index(df['High'], df['Low'], df['Close'])
-    indicators['HIST_VOL'] = ta.historical_volatility(df['Close'])
-    indicators['Volatility_Ratio'] = ta.volatility_ratio(df['High'], df['Low'], df['Close'])
-    section_times['Volatility Indicators'] = time.time() - section_start
-    
+    @add('Volatility Indicators', ('ATR', 'ATR_Pct'))
+    def _():
+        atr = ta.atr(high, low, close)
+        return {'ATR': atr, 'ATR_Pct': atr / close * 100}
+
+    @add('Volatility Indicators', ('BB_Upper', 'BB_Middle', 'BB_Lower', 'BB_Width', 'BB_Pos'))
+    def _():
+        upper, middle, lower = ta.bbands(close)
+        return {'BB_Upper': upper, 'BB_Middle': middle, 'BB_Lower': lower,
+                'BB_Width': (upper - lower) / middle, 'BB_Pos': (close - lower) / (upper - lower)}
+
+    @add('Volatility Indicators', ('KC_Upper', 'KC_Middle', 'KC_Lower', 'KC_Width', 'KC_Pos'))
+    def _():
+        upper, middle, lower = ta.keltner_channels(high, low, close)
+        return {'KC_Upper': upper, 'KC_Middle': middle, 'KC_Lower': lower,
+                'KC_Width': (upper - lower) / middle, 'KC_Pos': (close - lower) / (upper - lower)}
+
+    @add('Volatility Indicators', ('CHOP',))
+    def _():
+        return {'CHOP': ta.choppiness_index(high, low, close)}
+
+    @add('Volatility Indicators', ('HIST_VOL',))
+    def _():
+        return {'HIST_VOL': ta.historical_volatility(close)}
+
+    @add('Volatility Indicators', ('Volatility_Ratio',))
+    def _():
+        return {'Volatility_Ratio': ta.volatility_ratio(high, low, close)}
+
     # ===== VOLUME INDICATORS =====
-    section_start = time.time()
     if 'Volume' in df.columns:
-        indicators['OBV'] = ta.obv(df['Close'], df['Volume'])
-        # indicators['OBV_ROC'] = ta.roc(indicators['OBV'], timeperiod=10)
-        
-        indicators['MFI'] = ta.mfi(df['High'], df['Low'], df['Close'], df['Volume'])
-        indicators['CMF'] = ta.cmf(df['High'], df['Low'], df['Close'], df['Volume'])
-        indicators['PVT'] = ta.pvt(df['Close'], df['Volume'])
-        indicators['VZO'] = ta.volume_zone_oscillator(df['Close'], df['Volume'])
-        
-        indicators['VWAP'] = ta.vwap(df['High'], df['Low'], df['Close'], df['Volume']) / df['Close']
-        indicators['VWAP_Upper'], _, indicators['VWAP_Lower'] = ta.vwap_bands(df['High'], df['Low'], df['Close'], df['Volume'])
-        indicators['VWAP_Upper'] = indicators['VWAP_Upper'] / df['Close']
-        indicators['VWAP_Lower'] = indicators['VWAP_Lower'] / df['Close']
-    section_times['Volume Indicators'] = time.time() - section_start
-    
+        volume = df['Volume']
+
+        @add('Volume Indicators', ('OBV',))
+        def _():
+            return {'OBV': ta.obv(close, volume)}
+
+        @add('Volume Indicators', ('MFI',))
+        def _():
+            return {'MFI': ta.mfi(high, low, close, volume)}
+
+        @add('Volume Indicators', ('CMF',))
+        def _():
+            return {'CMF': ta.cmf(high, low, close, volume)}
+
+        @add('Volume Indicators', ('PVT',))
+        def _():
+            return {'PVT': ta.pvt(close, volume)}
+
+        @add('Volume Indicators', ('VZO',))
+        def _():
+            return {'VZO': ta.volume_zone_oscillator(close, volume)}
+
+        @add('Volume Indicators', ('VWAP',))
+        def _():
+            return {'VWAP': ta.vwap(high, low, close, volume) / close}
+
+        @add('Volume Indicators', ('VWAP_Upper', 'VWAP_Lower'))
+        def _():
+            upper, _middle, lower = ta.vwap_bands(high, low, close, volume)
+            return {'VWAP_Upper': upper / close, 'VWAP_Lower': lower / close}
+
     # ===== SUPPORT & RESISTANCE =====
-    section_start = time.time()
-    indicators['DC_Upper'], indicators['DC_Middle'], indicators['DC_Lower'] = ta.donchian_channel(df['High'], df['Low'])
-    indicators['DC_Width'] = (indicators['DC_Upper'] - indicators['DC_Lower']) / indicators['DC_Middle']
-    
-    indicators['SuperTrend'], indicators['SuperTrend_Line'] = ta.supertrend(df['High'], df['Low'], df['Close'])
-    indicators['SuperTrend_Diff'] = (df['Close'] - indicators['SuperTrend_Line']) / df['Close']
-    
-    try:
-        indicators['PSAR'] = ta.psar(df['High'].values, df['Low'].values)
-        indicators['PSAR_Diff'] = (df['Close'] - indicators['PSAR']) / df['Close']
-    except:
-        pass
-    section_times['Support & Resistance'] = time.time() - section_start
-    
+    @add('Support & Resistance', ('DC_Upper', 'DC_Middle', 'DC_Lower', 'DC_Width'))
+    def _():
+        upper, middle, lower = ta.donchian_channel(high, low)
+        return {'DC_Upper': upper, 'DC_Middle': middle, 'DC_Lower': lower, 'DC_Width': (upper - lower) / middle}
+
+    @add('Support & Resistance', ('SuperTrend', 'SuperTrend_Line', 'SuperTrend_Diff'))
+    def _():
+        supertrend, supertrend_line = ta.supertrend(high, low, close)
+        return {'SuperTrend': supertrend, 'SuperTrend_Line': supertrend_line,
+                'SuperTrend_Diff': (close - supertrend_line) / close}
+
+    @add('Support & Resistance', ('PSAR', 'PSAR_Diff'), optional=True)
+    def _():
+        psar = ta.psar(high.values, low.values)
+        return {'PSAR': psar, 'PSAR_Diff': (close - psar) / close}
+
     # ===== PRICE PATTERNS =====
-    section_start = time.time()
-    indicators['Ichimoku_Tenkan'], indicators['Ichimoku_Kijun'], indicators['Ichimoku_Senkou_A'], indicators['Ichimoku_Senkou_B'], _ = ta.ichimoku(df['High'], df['Low'], df['Close'])
-    indicators['Cloud_Diff'] = indicators['Ichimoku_Senkou_A'] - indicators['Ichimoku_Senkou_B']
-    
-    indicators['Bull_Power'], indicators['Bear_Power'] = ta.elder_ray(df['High'], df['Low'], df['Close'])
-    
+    @add('Price Patterns', ('Ichimoku_Tenkan', 'Ichimoku_Kijun', 'Ichimoku_Senkou_A', 'Ichimoku_Senkou_B', 'Cloud_Diff'))
+    def _():
+        tenkan, kijun, senkou_a, senkou_b, _chikou = ta.ichimoku(high, low, close)
+        return {'Ichimoku_Tenkan': tenkan, 'Ichimoku_Kijun': kijun, 'Ichimoku_Senkou_A': senkou_a,
+                'Ichimoku_Senkou_B': senkou_b, 'Cloud_Diff': senkou_a - senkou_b}
+
+    @add('Price Patterns', ('Bull_Power', 'Bear_Power'))
+    def _():
+        bull_power, bear_power = ta.elder_ray(high, low, close)
+        return {'Bull_Power': bull_power, 'Bear_Power': bear_power}
+
     if extra_features:
-        try:
-            indicators['Fractal_Up'], indicators['Fractal_Down'] = ta.fractal_indicator(df['High'], df['Low'])
-        except:
-            pass
-    section_times['Price Patterns'] = time.time() - section_start
-    
+        @add('Price Patterns', ('Fractal_Up', 'Fractal_Down'), optional=True)
+        def _():
+            fractal_up, fractal_down = ta.fractal_indicator(high, low)
+            return {'Fractal_Up': fractal_up, 'Fractal_Down': fractal_down}
+
     # ===== STATISTICAL INDICATORS =====
-    section_start = time.time()
-    indicators['Z_Score10'] = ta.z_score(df['Close'], timeperiod=10)
-    indicators['Z_Score20'] = ta.z_score(df['Close'], timeperiod=20)
-    
-    # Fisher Transform
-    indicators['Fisher10'] = ta.fisher_transform(df['Close'], timeperiod=10)
-    
+    for period in (10, 20):
+        @add('Statistical & Cycle', (f'Z_Score{period}',))
+        def _(period=period):
+            return {f'Z_Score{period}': ta.z_score(close, timeperiod=period)}
+
+    @add('Statistical & Cycle', ('Fisher10',))
+    def _():
+        return {'Fisher10': ta.fisher_transform(close, timeperiod=10)}
+
     # ===== CYCLE INDICATORS =====
-    try:
-        indicators['Price_Cycle20'] = ta.price_cycle(df['Close'], cycle_period=20)
-    except:
-        pass
-    
-    indicators['Mass_Index'] = ta.mass_index(df['High'], df['Low'])
+    @add('Statistical & Cycle', ('Price_Cycle20',), optional=True)
+    def _():
+        return {'Price_Cycle20': ta.price_cycle(close, cycle_period=20)}
+
+    @add('Statistical & Cycle', ('Mass_Index',))
+    def _():
+        return {'Mass_Index': ta.mass_index(high, low)}
 
     if extra_features:
+        @add('Statistical & Cycle', ('Hurst',), optional=True)
+        def _():
+            return {'Hurst': ta.hurst_exponent(close)}
+
+        @add('Statistical & Cycle', ('Percent_Rank',), optional=True)
+        def _():
+            return {'Percent_Rank': ta.percent_rank(close)}
+
+    return groups
+
+def resolve_features(features, base_columns, groups) -> tuple:
+    """
+    Work out what has to be computed for the requested columns.
+
+    Returns (group indices, lags) where lags maps each requested Prev{i}_{col} name to (col, i). A lag of
+    an indicator output pulls in that indicator's group even if the indicator itself wasn't requested.
+    Names that are neither raw columns, indicator outputs nor lags of either are ignored.
+    """
+    group_of = {output: i for i, (_section, outputs, _func, _optional) in enumerate(groups) for output in outputs}
+    needed_groups, lags = set(), {}
+    for name in features:
+        if name in group_of:
+            needed_groups.add(group_of[name])
+            continue
+        match = LAG_COLUMN_PATTERN.match(name)
+        if match is None:
+            continue
+        source, shift = match.group(2), int(match.group(1))
+        if source in group_of:
+            needed_groups.add(group_of[source])
+        elif source not in base_columns:
+            continue
+        lags[name] = (source, shift)
+    return needed_groups, lags
+
+def build_features(data, features=None, lagged_length=5, extra_features=False, keep_volume=False, lag_window=False) -> tuple:
+    """
+    Feature engine behind prepare_data_classifier and prepare_data_reinforcement.
+
+    Without features, every indicator group is computed and Prev{i}_{col} lags (i < lagged_length) are added
+    for the raw columns. With features, only the groups and lags those columns depend on are computed and
+    the frame comes back in the requested order; Prev{i}_{indicator} lags are resolved too.
+    keep_volume: Keep Volume (and its lags) as a feature; the volume indicators are computed either way.
+    lag_window: Skip the raw-column lags, the caller builds a LaggedFeatures view over the returned base.
+
+    Returns (features frame without NaN rows, base frame of raw columns).
+    """
+    df = data.drop(columns=['Datetime']) if 'Datetime' in data.columns else data
+    groups = _feature_groups(df, extra_features)
+    base = df if keep_volume else df.drop(columns=['Volume'], errors='ignore')
+
+    if features is None:
+        needed_groups = range(len(groups))
+        lags = {} if lag_window else {f'Prev{i}_{col}': (col, i) for col in base.columns for i in range(1, lagged_length)}
+    else:
+        needed_groups, lags = resolve_features(features, base.columns, groups)
+        if lag_window:
+            lags = {name: (source, shift) for name, (source, shift) in lags.items() if source not in base.columns}
+
+    indicators = {}
+    for i in sorted(needed_groups):
+        _section, _outputs, func, optional = groups[i]
         try:
-            indicators['Hurst'] = ta.hurst_exponent(df['Close'])
-        except:
-            pass
-        try:
-            indicators['Percent_Rank'] = ta.percent_rank(df['Close'])
-        except:
-            pass
-    section_times['Statistical & Cycle'] = time.time() - section_start
-    
-    section_start = time.time()
+            indicators.update(func())
+        except Exception:
+            if not optional:
+                raise
+    indicators = pd.DataFrame(indicators, index=df.index)
+
     lagged_features = {}
-    df.drop(columns=['Volume'], inplace=True)
-    for col in df.columns:
-        for i in range(1, lagged_length):
-            lagged_features[f'Prev{i}_{col}'] = df[col].shift(i)
-    section_times['Lagged Features'] = time.time() - section_start
-    
-    section_start = time.time()
-    df = pd.concat([df, pd.DataFrame(indicators), pd.DataFrame(lagged_features)], axis=1)
-    df.dropna(inplace=True)
-    section_times['Data Cleaning'] = time.time() - section_start
-
-    section_start = time.time()
-    pivots = smc.pivot_points(data['Open'], data['High'], data['Low'], data['Close'], window=10)
-    y = pd.Series(1, index=df.index)  # Default to hold
-    for idx, row in pivots.iterrows():
-        if row['Type'] == 'Swing_Low' and idx in y.index:
-            y.loc[idx] = 2  # Buy
-        elif row['Type'] == 'Swing_High' and idx in y.index:
-            y.loc[idx] = 0  # Sell
-    X = df
-    y = y.loc[X.index]  # Align y to X
-    section_times['Target Creation'] = time.time() - section_start
-    
-    end_time = time.time()
-    total_time = end_time - start_time
+    for name, (source, shift) in lags.items():
+        values = base[source] if source in base.columns else indicators.get(source)
+        if values is not None:
+            lagged_features[name] = values.shift(shift)
+
+    frame = pd.concat([base, indicators, pd.DataFrame(lagged_features, index=df.index)], axis=1)
+    if features is not None:
+        frame = frame[[f for f in features if f in frame.columns]]
+    frame = frame.dropna()
+    if lag_window:
+        frame = _trim_to_full_windows(frame, base.index.get_indexer(frame.index), lagged_length)
+    return frame, base
+
+def classifier_targets(data, index, label_scheme: str = 'swing', **label_kwargs):
+    """
+    int8 targets (0=sell, 1=hold, 2=buy) for the rows in index.
+
+    label_scheme: 'swing' (swing points, window=10 by default), 'triple_barrier' or 'quantile'; see labeling.py.
+    """
+    if label_scheme == 'swing':
+        label_kwargs.setdefault('window', 10)
+    labels = labeling.make_labels(data, label_scheme, **label_kwargs)
+    return pd.Series(labels[data.index.get_indexer(index)], index=index)
+
+def prepare_data_classifier(data, lagged_length=5, extra_features=False, elapsed_time=False, features=None, create_target=True, lag_window=False, label_scheme='swing', label_kwargs=None):
+    """
+    Build the classifier feature matrix and swing-point targets (0=sell, 1=hold, 2=buy).
+
+    features: Only compute these columns (e.g. a trained model's selected_features). Indicator groups
+    and lags that none of the requested columns need are skipped, and X is returned in the requested order.
+    create_target: Set to False at inference time to skip target creation; y is then None.
+    label_scheme: Target labelling, 'swing' (default), 'triple_barrier' or 'quantile' with label_kwargs.
+    lag_window: Don't create Prev{i}_{col} columns; return X, y, LaggedFeatures with the OHLC lags as a
+    (rows x lagged_length x 4) float32 view aligned to X.
+    """
+    start_time = time.time()
+    X, lag_base = build_features(data, features, lagged_length, extra_features, lag_window=lag_window)
+
+    y = None
+    if create_target:
+        y = classifier_targets(data, X.index, label_scheme, **(label_kwargs or {}))
+
     if elapsed_time:
-        print(f"Data preparation done. ({len(X)} rows, {X.shape[1]} features) {total_time:.2f} seconds")
-    
-    # Sort and print section times
-    # sorted_times = sorted(section_times.items(), key=lambda x: x[1], reverse=True)
-    # print("\nSection execution times (slowest to fastest):")
-    # for section, exec_time in sorted_times:
-    #     percentage = (exec_time / total_time) * 100
-    #     print(f"{section}: {exec_time:.4f} seconds ({percentage:.1f}%)")
-    
+        print(f"Data preparation done. ({len(X)} rows, {X.shape[1]} features) {time.time() - start_time:.2f} seconds")
+
+    if lag_window:
+        return X, y, LaggedFeatures(lag_base, lagged_length, X.index)
     return X, y
 
-def prepare_data_reinforcement(data, lagged_length=5, extra_features=False, elapsed_time=False):
-    df = data.copy()
-    start_time = time.time()
-    if 'Datetime' in df.columns:
-        df.drop(columns=['Datetime'], inplace=True)
-    
-    indicators = {}
-    
-    indicators['Log_Return'] = ta.log_return(df['Close'])
-    indicators['Price_Range'] = (df['High'] - df['Low']) / df['Close']
-    indicators['Close_Open_Range'] = (df['Close'] - df['Open']) / df['Open']
-    
-    indicators['MACD'], indicators['MACD_Signal'] = ta.macd(df['Close'])
-    indicators['MACD_Hist'] = indicators['MACD'] - indicators['MACD_Signal']
-    
-    indicators['PPO'], indicators['PPO_Signal'], indicators['PPO_Hist'] = ta.ppo(df['Close'])
-    
-    indicators['ADX'], indicators['PLUS_DI'], indicators['MINUS_DI'] = ta.adx(df['High'], df['Low'], df['Close'])
-    indicators['DI_Diff'] = indicators['PLUS_DI'] - indicators['MINUS_DI']
-    
-    indicators['AROON_UP'], indicators['AROON_DOWN'] = ta.aroon(df['High'], df['Low'])
-    indicators['AROON_OSC'] = indicators['AROON_UP'] - indicators['AROON_DOWN']
-    
-    indicators['AO'] = ta.awesome_oscillator(df['High'], df['Low'])
-    indicators['DPO'] = ta.dpo(df['Close'], timeperiod=20) / df['Close']
-    
-    indicators['MOM5'] = ta.mom(df['Close'], timeperiod=5) / df['Close']
-    indicators['MOM10'] = ta.mom(df['Close'], timeperiod=10) / df['Close']
-    
-    indicators['ROC5'] = ta.roc(df['Close'], timeperiod=5)
-    indicators['ROC10'] = ta.roc(df['Close'], timeperiod=10)
-    
-    indicators['RSI7'] = ta.rsi(df['Close'], timeperiod=7)
-    indicators['RSI14'] = ta.rsi(df['Close'], timeperiod=14)
-    indicators['RSI21'] = ta.rsi(df['Close'], timeperiod=21)
-    
-    indicators['STOCH_K'], indicators['STOCH_D'] = ta.stoch(df['High'], df['Low'], df['Close'])
-    indicators['STOCH_K_D'] = indicators['STOCH_K'] - indicators['STOCH_D']
-    
-    indicators['CCI'] = ta.cci(df['High'], df['Low'], df['Close'])
-    indicators['WillR'] = ta.willr(df['High'], df['Low'], df['Close'])
-    indicators['TSI'], indicators['TSI_Signal'] = ta.tsi(df['Close'])
-    indicators['RVI'] = ta.rvi(df['Open'], df['High'], df['Low'], df['Close'])
-    
-    indicators['ATR'] = ta.atr(df['High'], df['Low'], df['Close'])
-    indicators['ATR_Pct'] = indicators['ATR'] / df['Close'] * 100
-    
-    indicators['BB_Upper'], indicators['BB_Middle'], indicators['BB_Lower'] = ta.bbands(df['Close'])
-    indicators['BB_Width'] = (indicators['BB_Upper'] - indicators['BB_Lower']) / indicators['BB_Middle']
-    indicators['BB_Pos'] = (df['Close'] - indicators['BB_Lower']) / (indicators['BB_Upper'] - indicators['BB_Lower'])
-    
-    indicators['KC_Upper'], indicators['KC_Middle'], indicators['KC_Lower'] = ta.keltner_channels(df['High'], df['Low'], df['Close'])
-    indicators['KC_Width'] = (indicators['KC_Upper'] - indicators['KC_Lower']) / indicators['KC_Middle']
-    indicators['KC_Pos'] = (df['Close'] - indicators['KC_Lower']) / (indicators['KC_Upper'] - indicators['KC_Lower'])
-    
-    indicators['CHOP'] = ta.choppiness_index(df['High'], df['Low'], df['Close'])
-    indicators['HIST_VOL'] = ta.historical_volatility(df['Close'])
-    indicators['Volatility_Ratio'] = ta.volatility_ratio(df['High'], df['Low'], df['Close'])
-    
-    if 'Volume' in df.columns:
-        indicators['OBV'] = ta.obv(df['Close'], df['Volume'])
-        indicators['MFI'] = ta.mfi(df['High'], df['Low'], df['Close'], df['Volume'])
-        indicators['CMF'] = ta.cmf(df['High'], df['Low'], df['Close'], df['Volume'])
-        indicators['PVT'] = ta.pvt(df['Close'], df['Volume'])
-        indicators['VZO'] = ta.volume_zone_oscillator(df['Close'], df['Volume'])
-        
-        indicators['VWAP'] = ta.vwap(df['High'], df['Low'], df['Close'], df['Volume']) / df['Close']
-        indicators['VWAP_Upper'], _, indicators['VWAP_Lower'] = ta.vwap_bands(df['High'], df['Low'], df['Close'], df['Volume'])
-        indicators['VWAP_Upper'] = indicators['VWAP_Upper'] / df['Close']
-        indicators['VWAP_Lower'] = indicators['VWAP_Lower'] / df['Close']
-    
-    indicators['DC_Upper'], indicators['DC_Middle'], indicators['DC_Lower'] = ta.donchian_channel(df['High'], df['Low'])
-    indicators['DC_Width'] = (indicators['DC_Upper'] - indicators['DC_Lower']) / indicators['DC_Middle']
-    
-    indicators['SuperTrend'], indicators['SuperTrend_Line'] = ta.supertrend(df['High'], df['Low'], df['Close'])
-    indicators['SuperTrend_Diff'] = (df['Close'] - indicators['SuperTrend_Line']) / df['Close']
-    
-    try:
-        indicators['PSAR'] = ta.psar(df['High'].values, df['Low'].values)
-        indicators['PSAR_Diff'] = (df['Close'] - indicators['PSAR']) / df['Close']
-    except:
-        pass
-    
-    indicators['Ichimoku_Tenkan'], indicators['Ichimoku_Kijun'], indicators['Ichimoku_Senkou_A'], indicators['Ichimoku_Senkou_B'], _ = ta.ichimoku(df['High'], df['Low'], df['Close'])
-    indicators['Cloud_Diff'] = indicators['Ichimoku_Senkou_A'] - indicators['Ichimoku_Senkou_B']
-    
-    indicators['Bull_Power'], indicators['Bear_Power'] = ta.elder_ray(df['High'], df['Low'], df['Close'])
-    
-    if extra_features:
-        try:
-            indicators['Fractal_Up'], indicators['Fractal_Down'] = ta.fractal_indicator(df['High'], df['Low'])
-        except:
-            pass
-    
-    indicators['Z_Score10'] = ta.z_score(df['Close'], timeperiod=10)
-    indicators['Z_Score20'] = ta.z_score(df['Close'], timeperiod=20)
-    
-    indicators['Fisher10'] = ta.fisher_transform(df['Close'], timeperiod=10)
-    
-    try:
-        indicators['Price_Cycle20'] = ta.price_cycle(df['Close'], cycle_period=20)
-    except:
-        pass
-    
-    indicators['Mass_Index'] = ta.mass_index(df['High'], df['Low'])
+def prepare_data_reinforcement(data, lagged_length=5, extra_features=False, elapsed_time=False, lag_window=False, features=None):
+    """
+    Indicator state for the RL environments: the classifier feature set plus Volume and its lags.
 
-    if extra_features:
-        try:
-            indicators['Hurst'] = ta.hurst_exponent(df['Close'])
-        except:
-            pass
-        try:
-            indicators['Percent_Rank'] = ta.percent_rank(df['Close'])
-        except:
-            pass
-    
-    lagged_features = {}
-    for col in df.columns:
-        for i in range(1, lagged_length):
-            lagged_features[f'Prev{i}_{col}'] = df[col].shift(i)
-    
-    indicator_state = pd.concat([df, pd.DataFrame(indicators), pd.DataFrame(lagged_features)], axis=1)
-    indicator_state.dropna(inplace=True)
+    features: Only compute these columns, as in prepare_data_classifier.
+    lag_window: The Prev{i}_{col} columns are replaced by a LaggedFeatures view over the raw columns,
+    returned as (indicator_state, lags).
+    """
+    start_time = time.time()
+    indicator_state, lag_base = build_features(data, features, lagged_length, extra_features, keep_volume=True, lag_window=lag_window)
 
-    end_time = time.time()
-    total_time = end_time - start_time
     if elapsed_time:
-        print(f"Data preparation done. ({len(indicator_state)} rows, {indicator_state.shape[1]} features) {total_time:.2f} seconds")
+        print(f"Data preparation done. ({len(indicator_state)} rows, {indicator_state.shape[1]} features) {time.time() - start_time:.2f} seconds")
 
+    if lag_window:
+        return indicator_state, LaggedFeatures(lag_base, lagged_length, indicator_state.index)
     return indicator_state
 
 def bad_data_check(df):
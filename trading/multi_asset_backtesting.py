@@ -0,0 +1,290 @@
+import time
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+from rich import print
+from typing import Callable, Dict, List
+
+import model_tools as mt
+import technical_analysis as ta
+import vb_metrics as metrics
+from vb_costs import CostModel
+
+OHLCV_FIELDS = ['Open', 'High', 'Low', 'Close', 'Volume']
+
+# Lookup from stateful position code (0=hold, 1=short, 2=flat, 3=long) to multiplier
+POSITION_MULTIPLIERS = np.array([np.nan, -1.0, 0.0, 1.0])
+
+def per_asset(strategy_func: Callable) -> Callable:
+    """Wrap a single-asset strategy (data -> signals) so it produces a position panel."""
+    def panel_strategy(panels: Dict[str, pd.DataFrame], **kwargs) -> pd.DataFrame:
+        signals = {}
+        for symbol in panels['Close'].columns:
+            data = pd.DataFrame({field: panels[field][symbol] for field in OHLCV_FIELDS if field in panels})
+            signals[symbol] = strategy_func(data, **kwargs)
+        return pd.DataFrame(signals, index=panels['Close'].index)
+    panel_strategy.__name__ = getattr(strategy_func, '__name__', 'panel_strategy')
+    return panel_strategy
+
+class MultiAssetBacktesting:
+    """
+    Vectorized backtester over aligned (time x symbols) panels.
+
+    Strategies take the dict of OHLCV panels and return a signal panel using the same codes as
+    VectorizedBacktesting (0=hold, 1=short, 2=flat, 3=long). Capital is split across symbols by fixed
+    allocation weights, rebalanced every bar.
+    """
+    def __init__(
+        self,
+        instance_name: str = "default",
+        initial_capital: float = 10000.0,
+        cost_model: CostModel = None,
+    ):
+        self.instance_name = instance_name
+        self.initial_capital = initial_capital
+        self.cost_model = cost_model
+
+        self.symbols: List[str] = []
+        self.chunks = None
+        self.interval = None
+        self.age_days = None
+        self.n_days = None
+        self.panels: Dict[str, pd.DataFrame] = {}
+
+        self.weights: pd.Series = None
+        self.position: pd.DataFrame = None
+        self.exposure: pd.DataFrame = None
+        self.costs: pd.DataFrame = None
+        self.asset_returns: pd.DataFrame = None
+        self.portfolio: pd.DataFrame = pd.DataFrame()
+
+    def fetch_data(self, symbols: List[str], chunks: int, interval: str, age_days: int, kucoin: bool = True):
+        self.chunks = chunks
+        self.interval = interval
+        self.age_days = age_days
+        frames = {symbol: mt.fetch_data(symbol, chunks, interval, age_days, kucoin=kucoin) for symbol in symbols}
+        self.set_data(frames)
+
+    def set_data(self, frames: Dict[str, pd.DataFrame]):
+        """Align per-symbol OHLCV frames (with a Datetime column) into panels on the union of timestamps."""
+        panels = {}
+        for field in OHLCV_FIELDS:
+            panels[field] = pd.concat(
+                {symbol: frame.set_index('Datetime')[field] for symbol, frame in frames.items() if field in frame.columns},
+                axis=1
+            ).sort_index()
+        self.set_panels(panels)
+
+    def set_panels(self, panels: Dict[str, pd.DataFrame]):
+        """
+        Use pre-aligned panels directly. Missing bars are forward filled on Close (no return over the gap)
+        and get zero volume.
+        """
+        close = panels['Close'].ffill()
+        self.panels = {'Close': close}
+        for field in ['Open', 'High', 'Low']:
+            if field in panels:
+                self.panels[field] = panels[field].reindex_like(close).fillna(close)
+        if 'Volume' in panels:
+            self.panels['Volume'] = panels['Volume'].reindex_like(close).fillna(0)
+
+        self.symbols = list(close.columns)
+        index = close.index
+        if isinstance(index, pd.DatetimeIndex) and len(index) > 1:
+            self.n_days = (index[-1] - index[0]).days
+
+    def _normalize_weights(self, weights) -> pd.Series:
+        if weights is None:
+            weights = pd.Series(1.0, index=self.symbols)
+        elif isinstance(weights, dict):
+            weights = pd.Series(weights)
+        weights = weights.reindex(self.symbols).fillna(0).astype(float)
+        if weights.sum() <= 0:
+            raise ValueError("Allocation weights must sum to a positive value.")
+        return weights / weights.sum()
+
+    def run_strategy(self, strategy_func: Callable, weights=None, verbose: bool = False, **kwargs) -> pd.DataFrame:
+        """
+        Run a panel strategy and compute per-asset and portfolio returns in one pass.
+
+        Args:
+            strategy_func: panels -> signal panel (time x symbols). Use per_asset() for single-asset strategies.
+            weights: Capital allocation per symbol (dict or Series). Defaults to equal weight; normalized to sum to 1.
+        """
+        if not self.panels:
+            raise ValueError("No data available. Call fetch_data() or set_panels() first.")
+
+        start_time = time.time()
+
+        close = self.panels['Close']
+        raw_signals = strategy_func(self.panels, **kwargs).reindex_like(close)
+        position = raw_signals.mask(raw_signals == 0).ffill().fillna(2).astype(int)
+
+        exposure = pd.DataFrame(POSITION_MULTIPLIERS[position.values], index=close.index, columns=close.columns).ffill().fillna(0)
+        returns = close.pct_change()
+        asset_returns = exposure.shift(1) * returns
+
+        if self.cost_model is not None:
+            costs = {}
+            for symbol in self.symbols:
+                data = pd.DataFrame({field: panel[symbol] for field, panel in self.panels.items()})
+                costs[symbol] = self.cost_model.get_costs(data, exposure[symbol])
+            self.costs = pd.DataFrame(costs, index=close.index)
+            asset_returns = asset_returns.sub(self.costs, fill_value=0)
+        else:
+            self.costs = None
+
+        self.weights = self._normalize_weights(weights)
+        self.position = position
+        self.exposure = exposure
+        self.asset_returns = asset_returns
+
+        portfolio = pd.DataFrame(index=close.index)
+        portfolio['Return'] = returns.fillna(0).dot(self.weights)
+        portfolio['Strategy_Returns'] = asset_returns.fillna(0).dot(self.weights)
+        portfolio['Cumulative_Returns'] = (1 + portfolio['Strategy_Returns']).cumprod()
+        portfolio['Portfolio_Value'] = self.initial_capital * portfolio['Cumulative_Returns']
+        portfolio['Peak'] = portfolio['Portfolio_Value'].cummax()
+        portfolio['Drawdown'] = (portfolio['Portfolio_Value'] - portfolio['Peak']) / portfolio['Peak']
+        self.portfolio = portfolio
+
+        end_time = time.time()
+        if verbose:
+            print(f"[green]Strategy execution time ({len(self.symbols)} assets): {end_time - start_time:.2f} seconds[/green]")
+
+        return self.portfolio
+
+    def _check_results(self):
+        if self.portfolio is None or 'Strategy_Returns' not in self.portfolio.columns:
+            raise ValueError("No strategy results available. Run a strategy first.")
+
+    def get_trade_ledger(self, symbol: str) -> pd.DataFrame:
+        """Closed trades for one symbol, with costs deducted when a cost model is set."""
+        self._check_results()
+        close = self.panels['Close'][symbol]
+        cost_rate = None
+        if self.cost_model is not None:
+            data = pd.DataFrame({field: panel[symbol] for field, panel in self.panels.items()})
+            cost_rate = self.cost_model.get_side_cost_rate(data)
+        return metrics.get_trade_ledger(self.position[symbol], close, cost_rate=cost_rate)
+
+    def _summarize(self, returns: pd.Series, benchmark_returns: pd.Series, trade_pnls: List[float]) -> Dict[str, float]:
+        total_return = metrics.get_total_return_from_returns(returns)
+        alpha, beta = metrics.get_alpha_beta_from_returns(returns, benchmark_returns, n_days=self.n_days)
+        return {
+            'Total_Return': total_return,
+            'Alpha': alpha,
+            'Beta': beta,
+            'Active_Returns': total_return - metrics.get_total_return_from_returns(benchmark_returns),
+            'Max_Drawdown': metrics.get_max_drawdown_from_returns(returns),
+            'Sharpe_Ratio': metrics.get_sharpe_ratio_from_returns(returns),
+            'Sortino_Ratio': metrics.get_sortino_ratio_from_returns(returns),
+            'Win_Rate': len([pnl for pnl in trade_pnls if pnl > 0]) / len(trade_pnls) if trade_pnls else 0,
+            'Breakeven_Rate': metrics.get_breakeven_rate_from_pnls(trade_pnls),
+            'RR_Ratio': metrics.get_rr_ratio_from_pnls(trade_pnls),
+            'Profit_Factor': metrics.get_profit_factor_from_returns(returns),
+            'Total_Trades': len(trade_pnls)
+        }
+
+    def get_performance_metrics(self) -> Dict[str, float]:
+        """Portfolio-level metrics on the weighted, cost-adjusted returns."""
+        self._check_results()
+        trade_returns = []
+        for symbol in self.symbols:
+            ledger = self.get_trade_ledger(symbol)
+            # Per-asset PnL is in price units, so combine trades as returns on entry price
+            trade_returns.extend((ledger['PnL'] / ledger['Entry_Price']).tolist())
+        return self._summarize(self.portfolio['Strategy_Returns'], self.portfolio['Return'], trade_returns)
+
+    def get_asset_breakdown(self) -> pd.DataFrame:
+        """Per-asset metrics, allocation weight and contribution to portfolio return."""
+        self._check_results()
+        asset_benchmark = self.panels['Close'].pct_change()
+        rows = {}
+        for symbol in self.symbols:
+            summary = self._summarize(self.asset_returns[symbol], asset_benchmark[symbol], self.get_trade_ledger(symbol)['PnL'].tolist())
+            summary['Weight'] = self.weights[symbol]
+            summary['Contribution'] = (self.asset_returns[symbol].fillna(0) * self.weights[symbol]).sum()
+            rows[symbol] = summary
+        return pd.DataFrame.from_dict(rows, orient='index').sort_values('Total_Return', ascending=False)
+
+    def plot_performance(self, show_graph: bool = True):
+        self._check_results()
+        summary = self.get_performance_metrics()
+
+        fig = go.Figure()
+        fig.add_trace(go.Scatter(
+            x=self.portfolio.index,
+            y=self.portfolio['Portfolio_Value'],
+            mode='lines',
+            name='Portfolio',
+            line=dict(width=3)
+        ))
+        fig.add_trace(go.Scatter(
+            x=self.portfolio.index,
+            y=self.initial_capital * (1 + self.portfolio['Return']).cumprod(),
+            mode='lines',
+            name='Weighted Buy & Hold',
+            line=dict(dash='dash')
+        ))
+        asset_equity = self.initial_capital * (1 + self.asset_returns.fillna(0)).cumprod()
+        for symbol in self.symbols:
+            fig.add_trace(go.Scatter(
+                x=asset_equity.index,
+                y=asset_equity[symbol],
+                mode='lines',
+                name=symbol,
+                opacity=0.4,
+                visible='legendonly'
+            ))
+
+        fig.update_layout(
+            title=f'{len(self.symbols)} assets {self.interval} | TR: {summary["Total_Return"]*100:.3f}% | Max DD: {summary["Max_Drawdown"]*100:.3f}% | Sharpe: {summary["Sharpe_Ratio"]:.3f} | Sortino: {summary["Sortino_Ratio"]:.3f} | Trades: {summary["Total_Trades"]}',
+            xaxis_title='Date',
+            yaxis_title='Value',
+            showlegend=True,
+            template="plotly_dark"
+        )
+
+        if show_graph:
+            fig.show()
+
+        return fig
+
+    def cross_sectional_momentum_strategy(self, panels: Dict[str, pd.DataFrame], lookback: int = 60, top_n: int = 3, allow_short: bool = True) -> pd.DataFrame:
+        """
+        Long the top_n symbols by trailing return, short the top_n weakest, flat otherwise.
+
+        With shorts, top_n is capped at half the symbols ranked on each bar so no symbol is both long and short.
+        """
+        momentum = panels['Close'].pct_change(lookback)
+        rank = momentum.rank(axis=1, ascending=False)
+        n_ranked = momentum.notna().sum(axis=1)
+        n_side = np.minimum(top_n, n_ranked // 2) if allow_short else pd.Series(top_n, index=n_ranked.index)
+        signals = pd.DataFrame(2, index=momentum.index, columns=momentum.columns)
+        signals[rank.le(n_side, axis=0)] = 3
+        if allow_short:
+            signals[rank.gt(n_ranked - n_side, axis=0)] = 1
+        return signals
+
+    def ema_cross_strategy(self, panels: Dict[str, pd.DataFrame], fast_period: int = 9, slow_period: int = 26) -> pd.DataFrame:
+        close = panels['Close']
+        signals = pd.DataFrame(2, index=close.index, columns=close.columns)
+        ema_fast = ta.ema(close, fast_period)
+        ema_slow = ta.ema(close, slow_period)
+        signals[ema_fast > ema_slow] = 3
+        signals[ema_fast < ema_slow] = 1
+        return signals
+
+if __name__ == "__main__":
+    backtest = MultiAssetBacktesting(initial_capital=10000)
+    backtest.fetch_data(
+        symbols=["BTC-USDT", "ETH-USDT", "SOL-USDT", "XRP-USDT"],
+        chunks=10,
+        interval="5min",
+        age_days=0
+    )
+    backtest.run_strategy(backtest.ema_cross_strategy, verbose=True)
+    print(backtest.get_performance_metrics())
+    print(backtest.get_asset_breakdown())
+    backtest.plot_performance()
@@ -0,0 +1,328 @@
+import os
+import json
+import glob
+import tempfile
+import threading
+import numpy as np
+import pandas as pd
+from rich import print
+
+from cache_index import CacheIndex, get_index
+
+# Same column order fetch_data has always returned, since feature frames are built in column order
+OHLCV_COLUMNS = ['Datetime', 'Open', 'Close', 'High', 'Low', 'Volume']
+# Bars of a day or longer go into yearly partitions, a day partition would hold a single row
+YEARLY_INTERVALS = {"1day", "1week", "1d", "5d", "1wk", "1mo", "3mo"}
+
+def _partition_prefix(interval: str) -> str:
+    return "year" if interval in YEARLY_INTERVALS else "date"
+
+def _to_seconds(t) -> int:
+    return int(pd.Timestamp(t).value // 10**9)
+
+def _merge_ranges(ranges: list) -> list:
+    """Union of [start, end) second ranges, sorted and with touching ranges joined."""
+    merged = []
+    for start, end in sorted(ranges):
+        if end <= start:
+            continue
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return merged
+
+def _remove_range(covered: list, start: int, end: int) -> list:
+    """Covered ranges with [start, end) cut out."""
+    remaining = []
+    for covered_start, covered_end in covered:
+        if covered_start < start:
+            remaining.append([covered_start, min(covered_end, start)])
+        if covered_end > end:
+            remaining.append([max(covered_start, end), covered_end])
+    return _merge_ranges(remaining)
+
+def _subtract_ranges(start: int, end: int, covered: list) -> list:
+    """Parts of [start, end) not inside any covered range."""
+    missing = []
+    cursor = start
+    for covered_start, covered_end in covered:
+        if covered_end <= cursor:
+            continue
+        if covered_start >= end:
+            break
+        if covered_start > cursor:
+            missing.append([cursor, min(covered_start, end)])
+        cursor = max(cursor, covered_end)
+        if cursor >= end:
+            break
+    if cursor < end:
+        missing.append([cursor, end])
+    return missing
+
+class OHLCVStore:
+    """
+    Persistent OHLCV store partitioned by symbol, interval and day (year for daily and longer bars).
+
+    Layout: {root}/{symbol}/{interval}/date=YYYY-MM-DD.parquet (or year=YYYY.parquet) plus a manifest.json
+    recording which [start, end) time ranges have already been fetched. get() only downloads the parts of a
+    request that aren't covered yet, so overlapping or extended windows reuse what is on disk and repeated
+    runs don't touch the network. Reads prune partitions and push column projection and datetime filters
+    down to parquet.
+
+    Partitions are registered in a CacheIndex (size, checksum, last access). Evicting a partition to stay
+    within the index's byte budget removes its period from the coverage, so it is fetched again when needed.
+    """
+    def __init__(self, root: str = None, index: CacheIndex = None):
+        self.root = root or os.path.join(tempfile.gettempdir(), "ohlcv_store")
+        self.index = index or get_index()
+        self.index.on_evict("ohlcv", self._on_evict)
+        self._lock = threading.Lock()
+        os.makedirs(self.root, exist_ok=True)
+
+    @staticmethod
+    def _period_label(interval: str, period: pd.Timestamp) -> str:
+        return period.strftime('%Y') if _partition_prefix(interval) == "year" else period.strftime('%Y-%m-%d')
+
+    @staticmethod
+    def _period_end(interval: str, period: pd.Timestamp) -> pd.Timestamp:
+        return pd.Timestamp(year=period.year + 1, month=1, day=1) if _partition_prefix(interval) == "year" else period + pd.Timedelta(days=1)
+
+    def _partition_key(self, symbol: str, interval: str, period: pd.Timestamp) -> str:
+        return f"ohlcv|{symbol}|{interval}|{self._period_label(interval, period)}"
+
+    def _uncover_period(self, symbol: str, interval: str, period: pd.Timestamp):
+        with self._lock:
+            manifest = self._load_manifest(symbol, interval)
+            manifest["coverage"] = _remove_range(manifest["coverage"], _to_seconds(period), _to_seconds(self._period_end(interval, period)))
+            self._save_manifest(symbol, interval, manifest)
+
+    def _on_evict(self, entry: dict):
+        _, symbol, interval, label = entry['key'].split("|")
+        if os.path.exists(self._manifest_path(symbol, interval)):
+            self._uncover_period(symbol, interval, pd.Timestamp(label))
+
+    def _dir(self, symbol: str, interval: str) -> str:
+        return os.path.join(self.root, symbol, interval)
+
+    def _manifest_path(self, symbol: str, interval: str) -> str:
+        return os.path.join(self._dir(symbol, interval), "manifest.json")
+
+    def _load_manifest(self, symbol: str, interval: str) -> dict:
+        path = self._manifest_path(symbol, interval)
+        if not os.path.exists(path):
+            return {"coverage": [], "verified_gaps": []}
+        with open(path) as f:
+            return json.load(f)
+
+    def _save_manifest(self, symbol: str, interval: str, manifest: dict):
+        path = self._manifest_path(symbol, interval)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(tmp_path, path)
+
+    def coverage(self, symbol: str, interval: str) -> list:
+        """Fetched [start, end) ranges as Timestamps."""
+        return [(pd.Timestamp(s, unit='s'), pd.Timestamp(e, unit='s')) for s, e in self._load_manifest(symbol, interval)["coverage"]]
+
+    def missing_ranges(self, symbol: str, interval: str, start, end) -> list:
+        covered = self._load_manifest(symbol, interval)["coverage"]
+        missing = _subtract_ranges(_to_seconds(start), _to_seconds(end), covered)
+        return [(pd.Timestamp(s, unit='s'), pd.Timestamp(e, unit='s')) for s, e in missing]
+
+    def _partition_path(self, symbol: str, interval: str, period: pd.Timestamp) -> str:
+        return os.path.join(self._dir(symbol, interval), f"{_partition_prefix(interval)}={self._period_label(interval, period)}.parquet")
+
+    def write(self, symbol: str, interval: str, data: pd.DataFrame, start=None, end=None):
+        """
+        Merge bars into the partitions and mark [start, end) as covered.
+
+        The covered range is recorded even when data is empty, so periods without trades (or before a
+        listing) aren't requested again.
+        """
+        os.makedirs(self._dir(symbol, interval), exist_ok=True)
+        with self._lock:
+            if not data.empty:
+                data = data[OHLCV_COLUMNS]
+                if _partition_prefix(interval) == "year":
+                    periods = data['Datetime'].dt.to_period('Y').dt.start_time
+                else:
+                    periods = data['Datetime'].dt.floor('D')
+                for period, period_data in data.groupby(periods, sort=False):
+                    path = self._partition_path(symbol, interval, period)
+                    if os.path.exists(path):
+                        period_data = pd.concat([pd.read_parquet(path), period_data], ignore_index=True)
+                    period_data = period_data.drop_duplicates('Datetime', keep='last').sort_values('Datetime').reset_index(drop=True)
+                    tmp_path = f"{path}.tmp"
+                    period_data.to_parquet(tmp_path, index=False)
+                    os.replace(tmp_path, path)
+                    self.index.record(
+                        self._partition_key(symbol, interval, period), path, rows=len(period_data),
+                        start=period_data['Datetime'].iloc[0], end=period_data['Datetime'].iloc[-1], kind="ohlcv"
+                    )
+
+            if start is not None and end is not None:
+                manifest = self._load_manifest(symbol, interval)
+                manifest["coverage"] = _merge_ranges(manifest["coverage"] + [[_to_seconds(start), _to_seconds(end)]])
+                self._save_manifest(symbol, interval, manifest)
+
+    def _partitions(self, symbol: str, interval: str, start=None, end=None) -> list:
+        """(period start, path) of the partitions overlapping [start, end)."""
+        prefix = _partition_prefix(interval)
+        partitions = []
+        for path in sorted(glob.glob(os.path.join(self._dir(symbol, interval), f"{prefix}=*.parquet"))):
+            period = pd.Timestamp(os.path.basename(path)[len(prefix) + 1:-len(".parquet")])
+            if start is not None and self._period_end(interval, period) <= start:
+                continue
+            if end is not None and period >= end:
+                continue
+            partitions.append((period, path))
+        return partitions
+
+    def _migrate_day_partitions(self, symbol: str, interval: str):
+        """Merge day partitions of daily-or-longer bars written by older versions into the yearly layout."""
+        if _partition_prefix(interval) != "year":
+            return
+        paths = sorted(glob.glob(os.path.join(self._dir(symbol, interval), "date=*.parquet")))
+        if not paths:
+            return
+        self.write(symbol, interval, pd.concat([pd.read_parquet(path) for path in paths], ignore_index=True))
+        for path in paths:
+            self.index.remove(f"ohlcv|{symbol}|{interval}|{os.path.basename(path)[5:15]}")
+            os.remove(path)
+        print(f"[blue]Merged {len(paths)} day partitions of {symbol} {interval} into yearly partitions[/blue]")
+
+    def check_partitions(self, symbol: str, interval: str, start=None, end=None, checksum: bool = False) -> int:
+        """
+        Drop partitions whose size (or checksum, if requested) no longer matches the index, and uncover their
+        periods so the next get() refetches them. Files written before the index existed are registered.
+        """
+        self._migrate_day_partitions(symbol, interval)
+        dropped = 0
+        for period, path in self._partitions(symbol, interval, start, end):
+            key = self._partition_key(symbol, interval, period)
+            entry = self.index.lookup(key)
+            if entry is None:
+                self.index.record(key, path, kind="ohlcv")
+                continue
+            valid = self.index.verify(entry) if checksum else os.path.getsize(path) == entry['size']
+            if not valid:
+                print(f"[yellow]Corrupt partition {path}, refetching[/yellow]")
+                self.index.remove(key)
+                self._uncover_period(symbol, interval, period)
+                dropped += 1
+        return dropped
+
+    def read(self, symbol: str, interval: str, start=None, end=None, columns: list = None) -> pd.DataFrame:
+        """Bars with start <= Datetime < end. Only partitions overlapping the range are opened."""
+        columns = columns or OHLCV_COLUMNS
+        if 'Datetime' not in columns:
+            columns = ['Datetime'] + list(columns)
+        start = pd.Timestamp(start) if start is not None else None
+        end = pd.Timestamp(end) if end is not None else None
+
+        paths = []
+        for period, path in self._partitions(symbol, interval, start, end):
+            self.index.touch(self._partition_key(symbol, interval, period))
+            paths.append(path)
+
+        filters = []
+        if start is not None:
+            filters.append(('Datetime', '>=', start))
+        if end is not None:
+            filters.append(('Datetime', '<', end))
+
+        frames = [pd.read_parquet(path, columns=columns, filters=filters or None) for path in paths]
+        if not frames:
+            return pd.DataFrame({column: pd.Series(dtype='datetime64[ns]' if column == 'Datetime' else float) for column in columns})
+        return pd.concat(frames, ignore_index=True)
+
+    def find_gaps(self, symbol: str, interval: str, bar: pd.Timedelta, start=None, end=None) -> list:
+        """
+        Missing bars inside covered ranges: consecutive stored bars more than one bar apart.
+        Gaps already refetched by backfill() are not reported again.
+        """
+        manifest = self._load_manifest(symbol, interval)
+        datetimes = self.read(symbol, interval, start, end, columns=['Datetime'])['Datetime'].values
+        if len(datetimes) < 2:
+            return []
+        seconds = datetimes.astype('datetime64[s]').astype(np.int64)
+        step = int(bar.total_seconds())
+        jumps = np.flatnonzero(np.diff(seconds) > step)
+        gaps = [[int(seconds[i]) + step, int(seconds[i + 1])] for i in jumps]
+        verified = {tuple(gap) for gap in manifest["verified_gaps"]}
+        return [(pd.Timestamp(s, unit='s'), pd.Timestamp(e, unit='s')) for s, e in gaps if (s, e) not in verified]
+
+    def backfill(self, symbol: str, interval: str, bar: pd.Timedelta, fetcher, start=None, end=None) -> int:
+        """Refetch detected gaps once. Gaps the exchange has no bars for are remembered and skipped next time."""
+        gaps = self.find_gaps(symbol, interval, bar, start, end)
+        filled = 0
+        for gap_start, gap_end in gaps:
+            data = fetcher(gap_start, gap_end)
+            if not data.empty:
+                data = data[(data['Datetime'] >= gap_start) & (data['Datetime'] < gap_end)]
+            self.write(symbol, interval, data)
+            filled += len(data)
+        if gaps:
+            with self._lock:
+                manifest = self._load_manifest(symbol, interval)
+                manifest["verified_gaps"] += [[_to_seconds(s), _to_seconds(e)] for s, e in gaps]
+                self._save_manifest(symbol, interval, manifest)
+            print(f"[blue]Backfilled {len(gaps)} gaps in {symbol} {interval} ({filled} bars)[/blue]")
+        return filled
+
+    def get(self, symbol: str, interval: str, start, end, fetcher, columns: list = None, backfill: bool = False, bar: pd.Timedelta = None) -> pd.DataFrame:
+        """
+        Bars for [start, end), downloading only the uncovered ranges with fetcher(range_start, range_end).
+
+        With bar given, a range ending within two bars of now is only marked covered up to the last bar
+        received (nothing if the response is empty), since the exchange may not have published the last
+        closed candle yet; the rest is requested again next time.
+        """
+        self.check_partitions(symbol, interval, start, end)
+        missing = self.missing_ranges(symbol, interval, start, end)
+        recent_after = pd.Timestamp.now(tz='UTC').tz_localize(None) - 2 * bar if bar is not None else None
+        for range_start, range_end in missing:
+            data = fetcher(range_start, range_end)
+            if not data.empty:
+                data = data[(data['Datetime'] >= range_start) & (data['Datetime'] < range_end)]
+            covered_end = range_end
+            if recent_after is not None and range_end > recent_after:
+                covered_end = min(range_end, data['Datetime'].max() + bar) if not data.empty else None
+            self.write(symbol, interval, data, range_start if covered_end is not None else None, covered_end)
+        if missing:
+            print(f"[green]Fetched {len(missing)} missing ranges for {symbol} {interval}[/green]")
+        else:
+            print(f"[blue]USING STORED DATA for {symbol} {interval}[/blue]")
+
+        if backfill and bar is not None:
+            self.backfill(symbol, interval, bar, fetcher, start, end)
+        data = self.read(symbol, interval, start, end, columns=columns)
+        if missing:
+            # Only after reading, so a request larger than the budget can't evict the partitions it is served from
+            self.index.evict()
+        return data
+
+    def size(self) -> int:
+        """Bytes of stored partitions, from the cache index."""
+        entries = self.index.entries(kind="ohlcv")
+        return int(entries['size'].sum()) if not entries.empty else 0
+
+_store = None
+
+def get_store() -> OHLCVStore:
+    """Process-wide store in the default location."""
+    global _store
+    if _store is None:
+        _store = OHLCVStore()
+    return _store
+
+if __name__ == "__main__":
+    store = get_store()
+    for manifest in sorted(glob.glob(os.path.join(store.root, "*", "*", "manifest.json"))):
+        interval_dir = os.path.dirname(manifest)
+        symbol, interval = os.path.basename(os.path.dirname(interval_dir)), os.path.basename(interval_dir)
+        ranges = store.coverage(symbol, interval)
+        print(f"{symbol} {interval}: {len(ranges)} ranges, {ranges[0][0]} -> {ranges[-1][1]}" if ranges else f"{symbol} {interval}: empty")
+    print(f"{store.size()/(1024**2):.2f} MB in {store.root}")
@@ -0,0 +1,717 @@
+import time
+from collections import deque
+import numpy as np
+import pandas as pd
+from rich import print
+
+import model_tools as mt
+import technical_analysis as ta
+
+OHLCV = ['Open', 'High', 'Low', 'Close', 'Volume']
+# Outputs whose value depends on where the series starts: running totals from the first bar, and the
+# zero-phase price cycle filter. A recompute over the ring can't reproduce them, so the drift check skips them.
+START_DEPENDENT_OUTPUTS = {'OBV', 'PVT', 'VWAP', 'VWAP_Upper', 'VWAP_Lower', 'Price_Cycle20'}
+
+class BarRing:
+    """
+    Fixed-size OHLCV history for live updates.
+
+    Every bar is written twice (at i and i + capacity) so the last n bars are always a contiguous
+    view and reading a window never copies.
+    """
+    def __init__(self, capacity: int = 2000, columns: list = OHLCV):
+        self.capacity = capacity
+        self.columns = list(columns)
+        self._values = {column: np.full(2 * capacity, np.nan) for column in self.columns}
+        self._times = np.full(2 * capacity, np.datetime64('NaT'), dtype='datetime64[ns]')
+        self.count = 0  # bars appended in total
+
+    def __len__(self) -> int:
+        return min(self.count, self.capacity)
+
+    @property
+    def last_time(self):
+        return self._times[(self.count - 1) % self.capacity] if self.count else None
+
+    def load(self, data: pd.DataFrame):
+        """Replace the contents with the last capacity rows of data."""
+        data = data.iloc[-self.capacity:]
+        n = len(data)
+        for column in self.columns:
+            values = data[column].to_numpy(dtype=np.float64)
+            self._values[column][:n] = values
+            self._values[column][self.capacity:self.capacity + n] = values
+        times = _bar_times(data)
+        self._times[:n] = times
+        self._times[self.capacity:self.capacity + n] = times
+        self.count = n
+
+    def append(self, bar, timestamp=None):
+        i = self.count % self.capacity
+        for column in self.columns:
+            value = float(bar[column])
+            self._values[column][i] = value
+            self._values[column][i + self.capacity] = value
+        if timestamp is not None:
+            self._times[i] = self._times[i + self.capacity] = np.datetime64(pd.Timestamp(timestamp), 'ns')
+        self.count += 1
+
+    def tail(self, column: str, n: int) -> np.ndarray:
+        n = min(n, len(self))
+        end = (self.count - 1) % self.capacity + self.capacity + 1
+        return self._values[column][end - n:end]
+
+    def frame(self, n: int = None) -> pd.DataFrame:
+        n = len(self) if n is None else min(n, len(self))
+        end = (self.count - 1) % self.capacity + self.capacity + 1
+        return pd.DataFrame({column: self.tail(column, n) for column in self.columns}, index=pd.DatetimeIndex(self._times[end - n:end]))
+
+def _bar_times(data: pd.DataFrame) -> np.ndarray:
+    if 'Datetime' in data.columns:
+        return pd.DatetimeIndex(data['Datetime']).values.astype('datetime64[ns]')
+    if isinstance(data.index, pd.DatetimeIndex):
+        return data.index.values.astype('datetime64[ns]')
+    return np.full(len(data), np.datetime64('NaT'), dtype='datetime64[ns]')
+
+class _Ema:
+    """pandas ewm(span, adjust=False) one value at a time."""
+    def __init__(self, span: int):
+        self.alpha = 2 / (span + 1)
+        self.value = np.nan
+
+    def update(self, x: float) -> float:
+        self.value = x if np.isnan(self.value) else self.alpha * x + (1 - self.alpha) * self.value
+        return self.value
+
+class _AdjustedEwm:
+    """pandas ewm(alpha=..., adjust=True) one value at a time, as a ratio of decayed sums."""
+    def __init__(self, alpha: float):
+        self.decay = 1 - alpha
+        self.numerator = 0.0
+        self.denominator = 0.0
+
+    def seed(self, series: pd.Series):
+        values = series.to_numpy(dtype=np.float64)
+        valid = np.flatnonzero(~np.isnan(values))
+        # ignore_na=False: every weight decays with the bar's distance from the end, NaN bars included
+        self.denominator = float(np.sum(self.decay ** (len(values) - 1 - valid)))
+        mean = series.ewm(alpha=1 - self.decay).mean().iloc[-1] if len(valid) else 0.0
+        self.numerator = mean * self.denominator
+
+    def update(self, x: float) -> float:
+        self.numerator *= self.decay
+        self.denominator *= self.decay
+        if not np.isnan(x):
+            self.numerator += x
+            self.denominator += 1
+        return self.numerator / self.denominator if self.denominator else np.nan
+
+class _Updater:
+    """
+    Incremental version of one _feature_groups entry.
+
+    seed() restores recursive state from the full history, update() gets the last `window` bars of
+    each OHLCV column (newest last) and returns the outputs for the newest bar.
+    """
+    outputs = ()
+    window = 1
+
+    def seed(self, data: pd.DataFrame):
+        pass
+
+    def update(self, o, h, l, c, v) -> dict:
+        raise NotImplementedError
+
+class _Windowed(_Updater):
+    """Indicator that only depends on a fixed number of recent bars."""
+    def __init__(self, outputs: tuple, window: int, func):
+        self.outputs = outputs
+        self.window = window
+        self.func = func
+
+    def update(self, o, h, l, c, v) -> dict:
+        return self.func(o, h, l, c, v)
+
+class _Macd(_Updater):
+    outputs = ('MACD', 'MACD_Signal', 'MACD_Hist')
+
+    def __init__(self):
+        self.fast, self.slow, self.signal = _Ema(12), _Ema(26), _Ema(9)
+
+    def seed(self, data):
+        close = data['Close']
+        self.fast.value = ta.ema(close, 12).iloc[-1]
+        self.slow.value = ta.ema(close, 26).iloc[-1]
+        self.signal.value = ta.macd(close)[1].iloc[-1]
+
+    def update(self, o, h, l, c, v):
+        macd = self.fast.update(c[-1]) - self.slow.update(c[-1])
+        signal = self.signal.update(macd)
+        return {'MACD': macd, 'MACD_Signal': signal, 'MACD_Hist': macd - signal}
+
+class _Ppo(_Macd):
+    outputs = ('PPO', 'PPO_Signal', 'PPO_Hist')
+
+    def seed(self, data):
+        close = data['Close']
+        self.fast.value = ta.ema(close, 12).iloc[-1]
+        self.slow.value = ta.ema(close, 26).iloc[-1]
+        self.signal.value = ta.ppo(close)[1].iloc[-1]
+
+    def update(self, o, h, l, c, v):
+        fast, slow = self.fast.update(c[-1]), self.slow.update(c[-1])
+        ppo = (fast - slow) / slow * 100
+        signal = self.signal.update(ppo)
+        return {'PPO': ppo, 'PPO_Signal': signal, 'PPO_Hist': ppo - signal}
+
+class _Tsi(_Updater):
+    outputs = ('TSI', 'TSI_Signal')
+    window = 2
+
+    def __init__(self):
+        self.smooth1, self.smooth2 = _Ema(25), _Ema(13)
+        self.abs_smooth1, self.abs_smooth2 = _Ema(25), _Ema(13)
+        self.signal = _Ema(13)
+
+    def seed(self, data):
+        momentum = data['Close'].diff()
+        smooth1 = momentum.ewm(span=25, adjust=False).mean()
+        abs_smooth1 = momentum.abs().ewm(span=25, adjust=False).mean()
+        self.smooth1.value, self.abs_smooth1.value = smooth1.iloc[-1], abs_smooth1.iloc[-1]
+        self.smooth2.value = smooth1.ewm(span=13, adjust=False).mean().iloc[-1]
+        self.abs_smooth2.value = abs_smooth1.ewm(span=13, adjust=False).mean().iloc[-1]
+        self.signal.value = ta.tsi(data['Close'])[1].iloc[-1]
+
+    def update(self, o, h, l, c, v):
+        momentum = c[-1] - c[-2]
+        smooth2 = self.smooth2.update(self.smooth1.update(momentum))
+        abs_smooth2 = self.abs_smooth2.update(self.abs_smooth1.update(abs(momentum)))
+        tsi = 100 * (smooth2 / abs_smooth2)
+        return {'TSI': tsi, 'TSI_Signal': self.signal.update(tsi)}
+
+class _Keltner(_Updater):
+    outputs = ('KC_Upper', 'KC_Middle', 'KC_Lower', 'KC_Width', 'KC_Pos')
+    window = 21
+
+    def __init__(self):
+        self.middle = _Ema(20)
+
+    def seed(self, data):
+        self.middle.value = ta.ema(data['Close'], 20).iloc[-1]
+
+    def update(self, o, h, l, c, v):
+        middle = self.middle.update(c[-1])
+        atr = _true_range(h, l, c, 20).mean()
+        upper, lower = middle + 2 * atr, middle - 2 * atr
+        return {'KC_Upper': upper, 'KC_Middle': middle, 'KC_Lower': lower,
+                'KC_Width': (upper - lower) / middle, 'KC_Pos': (c[-1] - lower) / (upper - lower)}
+
+class _ElderRay(_Updater):
+    outputs = ('Bull_Power', 'Bear_Power')
+
+    def __init__(self):
+        self.ema = _Ema(13)
+
+    def seed(self, data):
+        self.ema.value = ta.ema(data['Close'], 13).iloc[-1]
+
+    def update(self, o, h, l, c, v):
+        ema = self.ema.update(c[-1])
+        return {'Bull_Power': h[-1] - ema, 'Bear_Power': l[-1] - ema}
+
+class _Obv(_Updater):
+    outputs = ('OBV',)
+    window = 2
+
+    def seed(self, data):
+        self.total = ta.obv(data['Close'], data['Volume']).iloc[-1]
+
+    def update(self, o, h, l, c, v):
+        self.total += np.sign(c[-1] - c[-2]) * v[-1]
+        return {'OBV': self.total}
+
+class _Pvt(_Updater):
+    outputs = ('PVT',)
+    window = 2
+
+    def seed(self, data):
+        self.total = ta.pvt(data['Close'], data['Volume']).iloc[-1]
+
+    def update(self, o, h, l, c, v):
+        self.total += (c[-1] / c[-2] - 1) * v[-1]
+        return {'PVT': self.total}
+
+class _Vwap(_Updater):
+    outputs = ('VWAP',)
+
+    def seed(self, data):
+        typical_price = (data['High'] + data['Low'] + data['Close']) / 3
+        self.price_volume = (typical_price * data['Volume']).sum()
+        self.volume = data['Volume'].sum()
+
+    def update(self, o, h, l, c, v):
+        self.price_volume += (h[-1] + l[-1] + c[-1]) / 3 * v[-1]
+        self.volume += v[-1]
+        return {'VWAP': self.price_volume / self.volume / c[-1]}
+
+class _VwapBands(_Updater):
+    outputs = ('VWAP_Upper', 'VWAP_Lower')
+
+    def seed(self, data):
+        typical_price = (data['High'] + data['Low'] + data['Close']) / 3
+        vwap = ta.vwap(data['High'], data['Low'], data['Close'], data['Volume'])
+        self.price_volume = (typical_price * data['Volume']).sum()
+        self.volume = data['Volume'].sum()
+        self.squared_deviations = deque(((typical_price - vwap) ** 2).iloc[-20:].to_numpy(), maxlen=20)
+
+    def update(self, o, h, l, c, v):
+        typical_price = (h[-1] + l[-1] + c[-1]) / 3
+        self.price_volume += typical_price * v[-1]
+        self.volume += v[-1]
+        vwap = self.price_volume / self.volume
+        self.squared_deviations.append((typical_price - vwap) ** 2)
+        deviation = np.sqrt(np.mean(self.squared_deviations)) if len(self.squared_deviations) == 20 else np.nan
+        return {'VWAP_Upper': (vwap + 2 * deviation) / c[-1], 'VWAP_Lower': (vwap - 2 * deviation) / c[-1]}
+
+class _Adx(_Updater):
+    outputs = ('ADX', 'PLUS_DI', 'MINUS_DI', 'DI_Diff')
+    window = 2
+
+    def __init__(self):
+        self.plus_dm, self.minus_dm, self.tr, self.dx = (_AdjustedEwm(1 / 14) for _ in range(4))
+
+    def seed(self, data):
+        high, low, close = data['High'], data['Low'], data['Close']
+        plus_dm, minus_dm = high.diff(), low.diff()
+        plus_dm[plus_dm < 0] = 0
+        minus_dm[minus_dm > 0] = 0
+        tr = pd.concat([high - low, (high - close.shift()).abs(), (low - close.shift()).abs()], axis=1).max(axis=1)
+        self.plus_dm.seed(plus_dm)
+        self.minus_dm.seed(minus_dm)
+        self.tr.seed(tr)
+        _adx, plus_di, minus_di = ta.adx(high, low, close)
+        self.dx.seed(100 * (plus_di - minus_di).abs() / (plus_di + minus_di))
+
+    def update(self, o, h, l, c, v):
+        plus_dm, minus_dm = h[-1] - h[-2], l[-1] - l[-2]
+        plus_dm = 0.0 if plus_dm < 0 else plus_dm
+        minus_dm = 0.0 if minus_dm > 0 else minus_dm
+        tr = self.tr.update(_true_range(h, l, c, 1)[0])
+        plus_di = 100 * self.plus_dm.update(plus_dm) / tr
+        minus_di = 100 * self.minus_dm.update(minus_dm) / tr
+        adx = self.dx.update(100 * abs(plus_di - minus_di) / (plus_di + minus_di))
+        return {'ADX': adx, 'PLUS_DI': plus_di, 'MINUS_DI': minus_di, 'DI_Diff': plus_di - minus_di}
+
+class _Rvi(_Updater):
+    outputs = ('RVI',)
+    window = 10
+
+    def seed(self, data):
+        self.value = ta.rvi(data['Open'], data['High'], data['Low'], data['Close']).iloc[-1]
+
+    def update(self, o, h, l, c, v):
+        denominator = (h[-10:] - l[-10:]).sum()
+        if denominator != 0:
+            self.value = (c[-10:] - o[-10:]).sum() / denominator  # ta.rvi forward-fills zero ranges
+        return {'RVI': self.value}
+
+class _Vzo(_Updater):
+    outputs = ('VZO',)
+    window = 2
+
+    def __init__(self):
+        self.positive_short, self.negative_short = _Ema(14), _Ema(14)
+        self.positive_long, self.negative_long = _Ema(28), _Ema(28)
+
+    def seed(self, data):
+        change, volume = data['Close'].diff(), data['Volume']
+        positive, negative = volume.copy(), volume.copy()
+        positive[change <= 0] = 0
+        negative[change >= 0] = 0
+        self.positive_short.value, self.negative_short.value = ta.ema(positive, 14).iloc[-1], ta.ema(negative, 14).iloc[-1]
+        self.positive_long.value, self.negative_long.value = ta.ema(positive, 28).iloc[-1], ta.ema(negative, 28).iloc[-1]
+
+    def update(self, o, h, l, c, v):
+        change = c[-1] - c[-2]
+        positive = 0.0 if change <= 0 else v[-1]
+        negative = 0.0 if change >= 0 else v[-1]
+        positive_short, negative_short = self.positive_short.update(positive), self.negative_short.update(negative)
+        positive_long, negative_long = self.positive_long.update(positive), self.negative_long.update(negative)
+        short_ratio = positive_short / (positive_short + negative_short)
+        long_ratio = positive_long / (positive_long + negative_long)
+        short_ratio = 0.5 if np.isnan(short_ratio) else short_ratio
+        long_ratio = 0.5 if np.isnan(long_ratio) else long_ratio
+        return {'VZO': 100 * (short_ratio - long_ratio)}
+
+class _SuperTrend(_Updater):
+    """Same band recursion as ta.supertrend, replayed over the history once on seed()."""
+    outputs = ('SuperTrend', 'SuperTrend_Line', 'SuperTrend_Diff')
+    window = 15
+
+    def seed(self, data):
+        high, low, close = (data[column].to_numpy(dtype=np.float64) for column in ('High', 'Low', 'Close'))
+        tr = np.maximum(np.maximum(high - low, np.abs(high - np.roll(close, 1))), np.abs(low - np.roll(close, 1)))
+        atr = pd.Series(tr).rolling(window=14).mean().values
+        basic_upper = (high + low) / 2 + 3 * atr
+        basic_lower = (high + low) / 2 - 3 * atr
+        self.upper, self.lower, self.trend, self.prev_close = basic_upper[0], basic_lower[0], 1, close[0]
+        for i in range(1, len(close)):
+            self._step(basic_upper[i], basic_lower[i], close[i])
+
+    def _step(self, basic_upper, basic_lower, close):
+        self.upper = basic_upper if self.prev_close > self.upper else min(basic_upper, self.upper)
+        self.lower = basic_lower if self.prev_close < self.lower else max(basic_lower, self.lower)
+        if close > self.upper:
+            self.trend = 1
+        elif close < self.lower:
+            self.trend = -1
+        self.prev_close = close
+
+    def update(self, o, h, l, c, v):
+        atr = _true_range(h, l, c, 14).mean()
+        middle = (h[-1] + l[-1]) / 2
+        self._step(middle + 3 * atr, middle - 3 * atr, c[-1])
+        line = self.lower if self.trend == 1 else self.upper
+        return {'SuperTrend': float(self.trend), 'SuperTrend_Line': line, 'SuperTrend_Diff': (c[-1] - line) / c[-1]}
+
+class _Psar(_Updater):
+    """Same recursion as ta.psar (acceleration 0.02 / 0.02 / 0.2), replayed over the history once on seed()."""
+    outputs = ('PSAR', 'PSAR_Diff')
+
+    def seed(self, data):
+        high, low = data['High'].to_numpy(dtype=np.float64), data['Low'].to_numpy(dtype=np.float64)
+        self.psar, self.ep, self.trend, self.af = low[0], high[0], 1, 0.02
+        for i in range(1, len(high)):
+            self._step(high[i], low[i])
+
+    def _step(self, high, low):
+        if self.trend == 1:
+            psar = self.psar + self.af * (self.ep - self.psar)
+            if low < psar:
+                self.trend, psar, self.ep = -1, self.ep, low
+            elif high > self.ep:
+                self.ep, self.af = high, min(self.af + 0.02, 0.2)
+        else:
+            psar = self.psar - self.af * (self.psar - self.ep)
+            if high > psar:
+                self.trend, psar, self.ep = 1, self.ep, high
+            elif low < self.ep:
+                self.ep, self.af = low, min(self.af + 0.02, 0.2)
+        self.psar = psar
+
+    def update(self, o, h, l, c, v):
+        self._step(h[-1], l[-1])
+        return {'PSAR': self.psar, 'PSAR_Diff': (c[-1] - self.psar) / c[-1]}
+
+class _Fisher(_Updater):
+    outputs = ('Fisher10',)
+    window = 10
+
+    def seed(self, data):
+        self.value = ta.fisher_transform(data['Close'], timeperiod=10).iloc[-1]
+
+    def update(self, o, h, l, c, v):
+        highest, lowest = c[-10:].max(), c[-10:].min()
+        price_range = highest - lowest if highest != lowest else 1e-10
+        normalized = min(max(2 * ((c[-1] - lowest) / price_range - 0.5), -0.999), 0.999)
+        fisher = np.log((1 + normalized) / (1 - normalized))
+        if np.isfinite(fisher):
+            self.value = fisher  # ta.fisher_transform forward-fills non-finite values
+        return {'Fisher10': self.value}
+
+class _MassIndex(_Updater):
+    outputs = ('Mass_Index',)
+
+    def __init__(self):
+        self.ema1, self.ema2 = _Ema(9), _Ema(9)
+
+    def seed(self, data):
+        ema1 = ta.ema(data['High'] - data['Low'], 9)
+        ema2 = ta.ema(ema1, 9)
+        self.ema1.value, self.ema2.value = ema1.iloc[-1], ema2.iloc[-1]
+        self.ratios = deque((ema1 / ema2).iloc[-25:].to_numpy(), maxlen=25)
+
+    def update(self, o, h, l, c, v):
+        ema1 = self.ema1.update(h[-1] - l[-1])
+        self.ratios.append(ema1 / self.ema2.update(ema1))
+        return {'Mass_Index': sum(self.ratios) if len(self.ratios) == 25 else np.nan}
+
+def _true_range(h, l, c, n):
+    """True range of the last n bars (needs n + 1 bars)."""
+    prev_close = c[-n - 1:-1]
+    high, low = h[-n:], l[-n:]
+    return np.maximum(np.maximum(high - low, np.abs(high - prev_close)), np.abs(low - prev_close))
+
+def _rsi(c, period):
+    delta = np.diff(c[-period - 1:])
+    gain = np.where(delta > 0, delta, 0).mean()
+    loss = np.where(delta < 0, -delta, 0).mean()
+    return 100 - (100 / (1 + gain / loss))
+
+def _atr(o, h, l, c, v):
+    atr = _true_range(h, l, c, 14).mean()
+    return {'ATR': atr, 'ATR_Pct': atr / c[-1] * 100}
+
+def _stoch(o, h, l, c, v):
+    k = np.empty(3)
+    for j, end in enumerate(range(len(c) - 2, len(c) + 1)):
+        lowest, highest = l[end - 14:end].min(), h[end - 14:end].max()
+        k[j] = 100 * ((c[end - 1] - lowest) / (highest - lowest))
+    return {'STOCH_K': k[-1], 'STOCH_D': k.mean(), 'STOCH_K_D': k[-1] - k.mean()}
+
+def _cci(o, h, l, c, v):
+    tp = (h[-20:] + l[-20:] + c[-20:]) / 3
+    mean = tp.mean()
+    return {'CCI': (tp[-1] - mean) / (0.015 * np.abs(tp - mean).mean())}
+
+def _bbands(o, h, l, c, v):
+    window = c[-20:]
+    middle, std = window.mean(), window.std(ddof=1)
+    upper, lower = middle + 2 * std, middle - 2 * std
+    return {'BB_Upper': upper, 'BB_Middle': middle, 'BB_Lower': lower,
+            'BB_Width': (upper - lower) / middle, 'BB_Pos': (c[-1] - lower) / (upper - lower)}
+
+def _donchian(o, h, l, c, v):
+    upper, lower = h[-20:].max(), l[-20:].min()
+    middle = (upper + lower) / 2
+    return {'DC_Upper': upper, 'DC_Middle': middle, 'DC_Lower': lower, 'DC_Width': (upper - lower) / middle}
+
+def _aroon(o, h, l, c, v):
+    up = 100 * (13 - np.argmax(h[-14:])) / 13
+    down = 100 * (13 - np.argmin(l[-14:])) / 13
+    return {'AROON_UP': up, 'AROON_DOWN': down, 'AROON_OSC': up - down}
+
+def _chop(o, h, l, c, v):
+    atr_sum = _true_range(h, l, c, 14).sum()
+    return {'CHOP': 100 * np.log10(atr_sum / (h[-14:].max() - l[-14:].min())) / np.log10(14)}
+
+def _volatility_ratio(o, h, l, c, v):
+    roc = (c[-1] / c[-15] - 1) * 100
+    ratio = np.abs(roc) / (_true_range(h, l, c, 14).mean() / c[-1] * 100)
+    return {'Volatility_Ratio': ratio if np.isfinite(ratio) else 1.0}
+
+def _mfi(o, h, l, c, v):
+    tp = (h[-15:] + l[-15:] + c[-15:]) / 3
+    money_flow = tp[1:] * v[-14:]
+    positive = money_flow[tp[1:] > tp[:-1]].sum()
+    negative = money_flow[tp[1:] < tp[:-1]].sum()
+    return {'MFI': 100 - (100 / (1 + positive / negative))}
+
+def _cmf(o, h, l, c, v):
+    high, low, close, volume = h[-20:], l[-20:], c[-20:], v[-20:]
+    mfv = volume * ((close - low) - (high - close)) / (high - low)
+    return {'CMF': mfv.sum() / volume.sum()}
+
+def _ichimoku(o, h, l, c, v):
+    def midpoint(period, bars_ago):
+        stop = len(h) - bars_ago
+        return (h[stop - period:stop].max() + l[stop - period:stop].min()) / 2
+    senkou_a = (midpoint(9, 26) + midpoint(26, 26)) / 2
+    senkou_b = midpoint(52, 26)
+    return {'Ichimoku_Tenkan': midpoint(9, 0), 'Ichimoku_Kijun': midpoint(26, 0), 'Ichimoku_Senkou_A': senkou_a,
+            'Ichimoku_Senkou_B': senkou_b, 'Cloud_Diff': senkou_a - senkou_b}
+
+def _updater_factories() -> dict:
+    """Incremental updaters keyed by the output tuple of the matching _feature_groups entry."""
+    factories = {
+        ('Log_Return',): lambda: _Windowed(('Log_Return',), 2, lambda o, h, l, c, v: {'Log_Return': np.log(c[-1] / c[-2])}),
+        ('Price_Range',): lambda: _Windowed(('Price_Range',), 1, lambda o, h, l, c, v: {'Price_Range': (h[-1] - l[-1]) / c[-1]}),
+        ('Close_Open_Range',): lambda: _Windowed(('Close_Open_Range',), 1, lambda o, h, l, c, v: {'Close_Open_Range': (c[-1] - o[-1]) / o[-1]}),
+        ('MACD', 'MACD_Signal', 'MACD_Hist'): _Macd,
+        ('PPO', 'PPO_Signal', 'PPO_Hist'): _Ppo,
+        ('AROON_UP', 'AROON_DOWN', 'AROON_OSC'): lambda: _Windowed(('AROON_UP', 'AROON_DOWN', 'AROON_OSC'), 14, _aroon),
+        ('AO',): lambda: _Windowed(('AO',), 34, lambda o, h, l, c, v: {'AO': ((h[-5:] + l[-5:]) / 2).mean() - ((h[-34:] + l[-34:]) / 2).mean()}),
+        ('DPO',): lambda: _Windowed(('DPO',), 31, lambda o, h, l, c, v: {'DPO': (c[-1] - c[-31:-11].mean()) / c[-1]}),
+        ('STOCH_K', 'STOCH_D', 'STOCH_K_D'): lambda: _Windowed(('STOCH_K', 'STOCH_D', 'STOCH_K_D'), 16, _stoch),
+        ('CCI',): lambda: _Windowed(('CCI',), 20, _cci),
+        ('WillR',): lambda: _Windowed(('WillR',), 14, lambda o, h, l, c, v: {'WillR': -100 * (h[-14:].max() - c[-1]) / (h[-14:].max() - l[-14:].min())}),
+        ('TSI', 'TSI_Signal'): _Tsi,
+        ('ATR', 'ATR_Pct'): lambda: _Windowed(('ATR', 'ATR_Pct'), 15, _atr),
+        ('BB_Upper', 'BB_Middle', 'BB_Lower', 'BB_Width', 'BB_Pos'): lambda: _Windowed(('BB_Upper', 'BB_Middle', 'BB_Lower', 'BB_Width', 'BB_Pos'), 20, _bbands),
+        ('KC_Upper', 'KC_Middle', 'KC_Lower', 'KC_Width', 'KC_Pos'): _Keltner,
+        ('CHOP',): lambda: _Windowed(('CHOP',), 15, _chop),
+        ('HIST_VOL',): lambda: _Windowed(('HIST_VOL',), 21, lambda o, h, l, c, v: {'HIST_VOL': np.log(c[-20:] / c[-21:-1]).std(ddof=1) * np.sqrt(252)}),
+        ('Volatility_Ratio',): lambda: _Windowed(('Volatility_Ratio',), 15, _volatility_ratio),
+        ('OBV',): _Obv,
+        ('MFI',): lambda: _Windowed(('MFI',), 15, _mfi),
+        ('CMF',): lambda: _Windowed(('CMF',), 20, _cmf),
+        ('PVT',): _Pvt,
+        ('VWAP',): _Vwap,
+        ('VWAP_Upper', 'VWAP_Lower'): _VwapBands,
+        ('ADX', 'PLUS_DI', 'MINUS_DI', 'DI_Diff'): _Adx,
+        ('RVI',): _Rvi,
+        ('VZO',): _Vzo,
+        ('SuperTrend', 'SuperTrend_Line', 'SuperTrend_Diff'): _SuperTrend,
+        ('PSAR', 'PSAR_Diff'): _Psar,
+        ('Fisher10',): _Fisher,
+        ('Mass_Index',): _MassIndex,
+        ('DC_Upper', 'DC_Middle', 'DC_Lower', 'DC_Width'): lambda: _Windowed(('DC_Upper', 'DC_Middle', 'DC_Lower', 'DC_Width'), 20, _donchian),
+        ('Ichimoku_Tenkan', 'Ichimoku_Kijun', 'Ichimoku_Senkou_A', 'Ichimoku_Senkou_B', 'Cloud_Diff'): lambda: _Windowed(('Ichimoku_Tenkan', 'Ichimoku_Kijun', 'Ichimoku_Senkou_A', 'Ichimoku_Senkou_B', 'Cloud_Diff'), 78, _ichimoku),
+        ('Bull_Power', 'Bear_Power'): _ElderRay,
+    }
+    for period in (5, 10):
+        factories[(f'MOM{period}',)] = lambda period=period: _Windowed((f'MOM{period}',), period + 1, lambda o, h, l, c, v: {f'MOM{period}': (c[-1] - c[-1 - period]) / c[-1]})
+        factories[(f'ROC{period}',)] = lambda period=period: _Windowed((f'ROC{period}',), period + 1, lambda o, h, l, c, v: {f'ROC{period}': (c[-1] / c[-1 - period] - 1) * 100})
+    for period in (7, 14, 21):
+        factories[(f'RSI{period}',)] = lambda period=period: _Windowed((f'RSI{period}',), period + 1, lambda o, h, l, c, v: {f'RSI{period}': _rsi(c, period)})
+    for period in (10, 20):
+        factories[(f'Z_Score{period}',)] = lambda period=period: _Windowed((f'Z_Score{period}',), period, lambda o, h, l, c, v: {f'Z_Score{period}': (c[-1] - c[-period:].mean()) / c[-period:].std(ddof=1)})
+    return factories
+
+class OnlineFeatureService:
+    """
+    Incremental prepare_data_classifier features for live inference.
+
+    seed() computes the batch features once and restores the rolling indicator state. Each update()
+    takes one new closed bar and returns the model-ready float32 row: every default indicator has an
+    incremental updater costing a few array operations on the last bars, and Prev{i}_{col} lags come from
+    a buffer of recent values. Groups that can't be updated causally (the zero-phase Price_Cycle20 filter
+    and the extra_features fractals/Hurst/percent rank) are recomputed over the last lookback bars, which
+    costs milliseconds per row. scaler (anything with transform()) is applied to the row if given.
+
+    Every check_every bars the full batch pipeline is rerun over the ring and compared with the
+    incremental row; drifting updaters are reseeded from the ring. START_DEPENDENT_OUTPUTS can't be
+    reproduced from the ring, so the check skips them; their updaters carry the full history instead.
+    """
+    def __init__(self, features: list = None, lagged_length: int = 5, extra_features: bool = False, history: int = 2000,
+                 lookback: int = 500, check_every: int = 500, scaler=None, rtol: float = 1e-4, atol: float = 1e-6, verbose: bool = True):
+        if lookback > history:
+            raise ValueError("lookback can't be longer than the history kept in memory")
+        self.features = list(features) if features is not None else None
+        self.lagged_length = lagged_length
+        self.extra_features = extra_features
+        self.lookback = lookback
+        self.check_every = check_every
+        self.scaler = scaler
+        self.rtol = rtol
+        self.atol = atol
+        self.verbose = verbose
+        self.ring = BarRing(history)
+        self.drift = []  # (bar count, drifting columns) of every failed check
+        self.last_row = None
+        self.last_update_seconds = None
+
+    def seed(self, data: pd.DataFrame) -> np.ndarray:
+        """Start from history (at least a few hundred bars); returns the row for its last bar."""
+        ohlcv = data[OHLCV]
+        batch, _ = mt.build_features(ohlcv, self.features, self.lagged_length, self.extra_features)
+        if len(batch) == 0 or batch.index[-1] != ohlcv.index[-1]:
+            raise ValueError("Not enough history to compute every feature for the last bar")
+        if self.features is None:
+            self.features = list(batch.columns)
+
+        groups = mt._feature_groups(ohlcv, self.extra_features)
+        base_columns = [column for column in OHLCV if column != 'Volume']
+        needed_groups, lags = mt.resolve_features(self.features, base_columns, groups)
+        factories = _updater_factories()
+        self.updaters, self.fallback_groups = [], []
+        for i in sorted(needed_groups):
+            outputs = groups[i][1]
+            if outputs in factories:
+                self.updaters.append(factories[outputs]())
+            else:
+                self.fallback_groups.append(outputs)
+        for updater in self.updaters:
+            updater.seed(ohlcv)
+        self.window = max([2] + [updater.window for updater in self.updaters])
+
+        # Each feature is (source column, bars back)
+        self.plan = [lags.get(name, (name, 0)) for name in self.features]
+        sources = list(dict.fromkeys(source for source, _shift in self.plan))
+        depth = max(shift for _source, shift in self.plan) + 1
+        source_values, _ = mt.build_features(ohlcv, sources, self.lagged_length, self.extra_features)
+        self.history = deque((row for row in source_values.iloc[-depth:].to_dict('records')), maxlen=depth)
+        if len(self.history) < depth or source_values.index[-1] != ohlcv.index[-1]:
+            raise ValueError("Not enough history to fill the lag buffer")
+
+        self.ring.load(data)
+        self.bars_since_check = 0
+        self.last_row = batch.iloc[-1][self.features].to_numpy(dtype=np.float32)
+        if self.verbose:
+            print(f"[blue]Online features: {len(self.features)} columns, {len(self.updaters)} incremental groups, {len(self.fallback_groups)} recomputed over {self.lookback} bars[/blue]")
+        return self._scale(self.last_row)
+
+    def _scale(self, row: np.ndarray) -> np.ndarray:
+        if self.scaler is None:
+            return row
+        return np.asarray(self.scaler.transform(row[None, :]), dtype=np.float32)[0]
+
+    def _compute(self) -> dict:
+        tails = [self.ring.tail(column, self.window) for column in OHLCV]
+        values = {column: tails[i][-1] for i, column in enumerate(OHLCV)}
+        with np.errstate(divide='ignore', invalid='ignore'):
+            for updater in self.updaters:
+                values.update(updater.update(*tails))
+        if self.fallback_groups:
+            wanted = set(output for outputs in self.fallback_groups for output in outputs)
+            frame = self.ring.frame(self.lookback)
+            for _section, outputs, func, optional in mt._feature_groups(frame, self.extra_features):
+                if outputs not in self.fallback_groups:
+                    continue
+                try:
+                    result = func()
+                except Exception:
+                    if not optional:
+                        raise
+                    continue
+                values.update({name: np.asarray(column, dtype=np.float64)[-1] for name, column in result.items() if name in wanted})
+        return values
+
+    def update(self, bar, timestamp=None) -> np.ndarray:
+        """
+        Add one closed bar (a dict/Series with OHLCV) and return the feature row for it.
+
+        Bars at or before the last one seen are rejected with ValueError.
+        """
+        start_time = time.perf_counter()
+        if timestamp is None and hasattr(bar, 'get'):
+            timestamp = bar.get('Datetime')
+        if timestamp is not None and self.ring.last_time is not None and not pd.isna(self.ring.last_time):
+            if np.datetime64(pd.Timestamp(timestamp), 'ns') <= self.ring.last_time:
+                raise ValueError(f"Bar at {timestamp} is not newer than the last bar ({self.ring.last_time})")
+
+        self.ring.append(bar, timestamp)
+        self.history.append(self._compute())
+        row = np.empty(len(self.plan), dtype=np.float32)
+        for i, (source, shift) in enumerate(self.plan):
+            row[i] = self.history[-1 - shift].get(source, np.nan)
+        self.last_row = row
+
+        self.bars_since_check += 1
+        if self.check_every and self.bars_since_check >= self.check_every:
+            self.check_drift()
+        self.last_update_seconds = time.perf_counter() - start_time
+        return self._scale(row)
+
+    def check_drift(self) -> list:
+        """Compare the last incremental row with a batch recompute over the ring; returns the drifting columns."""
+        self.bars_since_check = 0
+        frame = self.ring.frame().reset_index(drop=True)
+        batch, _ = mt.build_features(frame, self.features, self.lagged_length, self.extra_features)
+        if len(batch) == 0 or batch.index[-1] != frame.index[-1]:
+            return []
+        expected = batch.iloc[-1][self.features].to_numpy(dtype=np.float64)
+        drifting = []
+        for i, (source, _shift) in enumerate(self.plan):
+            if source in START_DEPENDENT_OUTPUTS:
+                continue
+            if not np.isclose(self.last_row[i], expected[i], rtol=self.rtol, atol=self.atol, equal_nan=True):
+                drifting.append(self.features[i])
+        if drifting:
+            self.drift.append((self.ring.count, drifting))
+            print(f"[yellow]Online features drifted from batch values in {len(drifting)} columns: {drifting[:5]}[/yellow]")
+            sources = {self.plan[self.features.index(name)][0] for name in drifting}
+            for updater in self.updaters:
+                if sources.intersection(updater.outputs):
+                    updater.seed(frame)
+        return drifting
+
+if __name__ == "__main__":
+    data = mt.fetch_data("BTC-USDT", 3, "1min", 0, kucoin=True)
+    service = OnlineFeatureService(lagged_length=5, check_every=100)
+    service.seed(data.iloc[:-500])
+    update_times = []
+    for _, bar in data.iloc[-500:].iterrows():
+        service.update(bar)
+        update_times.append(service.last_update_seconds)
+    print(f"Mean update: {np.mean(update_times) * 1e6:.0f} us, drift checks failed: {len(service.drift)}")
@@ -17,6 +17,10 @@ from tqdm import tqdm
 from dataclasses import dataclass
 from typing import Dict
 
+import sys
+sys.path.append(r"trading")
+import equities_data
+
 # long expiration short put positions can have arbitrage opportunity is if 
 # strike - premium - price < 0
 # additionally, money market funds, can pay or yield yearly on the collateral.
@@ -61,6 +65,7 @@ class Arbitrage:
         self.symbols = symbols
         self.option_expiries = {}
         self.best_options = {}
+        self.market_prices = pd.Series(dtype=float)
     
     def load(self):
         print("[yellow]Loading Expiries...[/yellow]")
@@ -76,7 +81,17 @@ class Arbitrage:
                 print(f"\nFAILED TO LOAD {symbol}")
             progress_bar.update(1)
         progress_bar.close()
+
+        print("[yellow]Loading Prices...[/yellow]")
+        self.market_prices = equities_data.latest_closes([ticker.ticker for ticker in self.option_expiries])
         return self.option_expiries
+
+    def _market_price(self, symbol: yf.Ticker) -> float:
+        """Last close from the batched price fetch; single-ticker history only for symbols it missed."""
+        price = self.market_prices.get(symbol.ticker)
+        if price is None or pd.isna(price):
+            price = symbol.history(period="1d").iloc[-1]['Close']
+        return price
     
     def _find_best_arbitrage(self, ITM=True, collateral_yield=True):
         output = {}
@@ -86,7 +101,7 @@ class Arbitrage:
             best_option = None
 
             try:
-                market_price = symbol.history(period="1d").iloc[-1]['Close']
+                market_price = self._market_price(symbol)
 
                 for expiry in self.option_expiries[symbol]:
                     options = symbol.option_chain(str(expiry))
@@ -149,7 +164,7 @@ class Arbitrage:
         for symbol, data in best_options.items():
             option = data["best_option"]
             if option:
-                last_price = symbol.history(period='1d')['Close'].iloc[-1]
+                last_price = self._market_price(symbol)
                 table.add_row(
                     symbol.ticker,
                     f"{last_price:.2f}",
@@ -170,7 +185,7 @@ class Arbitrage:
         for symbol, data_info in self.best_options.items():
             option = data_info["best_option"]
             if option:
-                last_price = symbol.history(period='1d')['Close'].iloc[-1]
+                last_price = self._market_price(symbol)
                 
                 if option.type == 'call':
                     intrinsic_value = max(0, last_price - option.strike) 
@@ -1,7 +1,6 @@
 import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
-import yfinance as yf
 from scipy.optimize import minimize
 from typing import List, Dict, Tuple
 from rich.console import Console
@@ -10,36 +9,56 @@ from rich.progress import Progress, SpinnerColumn, TextColumn, BarColumn, TaskPr
 from rich.panel import Panel
 from datetime import datetime, timedelta
 
+import sys
+sys.path.append(r"trading")
+import equities_data
+
 
 class PortfolioOptimizer:
     """
     Optimizes a stock-based portfolio based on a specified objective.
     """
     @staticmethod
-    def fetch_data(tickers: List[str], start_date: datetime, end_date: datetime) -> pd.DataFrame:
-        console = Console()
-        tickers = [ticker.replace(".", "-") for ticker in tickers]
-        start_str = start_date.strftime('%Y-%m-%d')
-        end_str = end_date.strftime('%Y-%m-%d')
-        with console.status(f"[bold blue]Fetching data for {len(tickers)} assets...") as status:
-            data = yf.download(tickers, start=start_str, end=end_str, progress=False)
-            prices = data['Close']
-            prices = prices.dropna(axis=1)
-            
-            console.print(Panel(f"""
+    def _window(prices: pd.DataFrame, start_date: datetime, end_date: datetime) -> pd.DataFrame:
+        """Rows in [start_date, end_date) by calendar day, without assets that have gaps in that window."""
+        start, end = pd.Timestamp(start_date.strftime('%Y-%m-%d')), pd.Timestamp(end_date.strftime('%Y-%m-%d'))
+        prices = prices[(prices.index >= start) & (prices.index < end)].dropna(how='all')
+        prices = prices.dropna(axis=1)
+
+        Console().print(Panel(f"""
 [green]Data Loading Complete[/green]
 • Using [bold]{len(prices.columns)}[/bold] assets after filtering
 • Loaded [bold]{len(prices)}[/bold] rows
 • Date Range: [bold]{prices.index[0].strftime('%Y-%m-%d')}[/bold] to [bold]{prices.index[-1].strftime('%Y-%m-%d')}[/bold]
 """))
-            return prices
+        return prices
+
+    @staticmethod
+    def fetch_data(tickers: List[str], start_date: datetime, end_date: datetime, windows: List[Tuple[datetime, datetime]] = None):
+        """
+        Daily Close prices from the cached equities store.
+
+        With windows, one batch covering all of them is fetched and a frame is returned per window.
+        """
+        console = Console()
+        tickers = [ticker.replace(".", "-") for ticker in tickers]
+        windows = windows or [(start_date, end_date)]
+        span_start = min(start for start, _ in windows)
+        span_end = max(end for _, end in windows)
+        with console.status(f"[bold blue]Fetching data for {len(tickers)} assets...") as status:
+            prices = equities_data.close_prices(tickers, span_start.strftime('%Y-%m-%d'), span_end.strftime('%Y-%m-%d'))
+        frames = [PortfolioOptimizer._window(prices, start, end) for start, end in windows]
+        return frames if len(windows) > 1 else frames[0]
 
     def __init__(self, tickers: List[str] = None, 
                  start_date: datetime = None, end_date: datetime = None, backtest_start_date: datetime = None, backtest_end_date: datetime = None, rfr: float = 0.0):
         """Initialize optimizer with either price data or ticker information."""
         self.console = Console()
-        self.price_df = self.fetch_data(tickers, start_date, end_date)
-        self.backtest_price_df = self.fetch_data(tickers, backtest_start_date, backtest_end_date)
+        # Train and backtest windows usually overlap, so both come from one fetch
+        self.price_df, self.backtest_price_df = self.fetch_data(
+            tickers, start_date, backtest_end_date,
+            windows=[(start_date, end_date), (backtest_start_date, backtest_end_date)]
+        )
 
         # Keep only shared columns (tickers)
         shared_cols = list(set(self.price_df.columns) & set(self.backtest_price_df.columns))
@@ -0,0 +1,213 @@
+import time
+import random
+import threading
+from urllib.parse import urlparse
+from email.utils import parsedate_to_datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import requests
+from requests.adapters import HTTPAdapter
+from tqdm import tqdm
+from rich import print
+
+# Sustained requests/second and burst size per host. Hosts not listed use the scheduler default.
+HOST_LIMITS = {
+    "api.kucoin.com": (10.0, 20),
+    "api.jup.ag": (1.0, 5),
+    "query1.finance.yahoo.com": (2.0, 5),
+    "query2.finance.yahoo.com": (2.0, 5),
+}
+
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+class RateLimitError(Exception):
+    """A request still failed after every retry."""
+
+class TokenBucket:
+    """
+    Thread-safe token bucket with an adaptive rate.
+
+    acquire() blocks until a token is available. penalize() halves the rate after a 429 and recover()
+    adds it back slowly on success (AIMD), so the bucket settles at the highest rate the host accepts.
+    """
+    def __init__(self, rate: float, capacity: int, min_rate: float = None):
+        self.max_rate = rate
+        self.rate = rate
+        self.min_rate = min_rate or rate / 16
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self._refill(now)
+                wait = self.blocked_until - now
+                if wait <= 0 and self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                if wait <= 0:
+                    wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def block(self, seconds: float):
+        """Pause the whole host, e.g. for a Retry-After header."""
+        with self.lock:
+            self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+            self.tokens = 0
+
+    def penalize(self):
+        with self.lock:
+            self.rate = max(self.min_rate, self.rate / 2)
+
+    def recover(self):
+        with self.lock:
+            self.rate = min(self.max_rate, self.rate + self.max_rate / 20)
+
+def _retry_after_seconds(response) -> float:
+    value = response.headers.get("Retry-After") if response is not None else None
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
+
+class RequestScheduler:
+    """
+    Shared HTTP client with per-host token buckets and retries.
+
+    429 and 5xx responses (and connection errors) are retried with exponential backoff and full jitter,
+    honoring Retry-After when the server sends it. A 429 also lowers that host's request rate.
+    """
+    def __init__(self, host_limits: dict = None, default_rate: float = 5.0, default_capacity: int = 10,
+                 max_retries: int = 6, base_delay: float = 0.5, max_delay: float = 30.0, pool_size: int = 16, timeout: float = 30.0):
+        self.host_limits = dict(HOST_LIMITS if host_limits is None else host_limits)
+        self.default_rate = default_rate
+        self.default_capacity = default_capacity
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.timeout = timeout
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def bucket(self, host: str) -> TokenBucket:
+        with self._lock:
+            if host not in self._buckets:
+                rate, capacity = self.host_limits.get(host, (self.default_rate, self.default_capacity))
+                self._buckets[host] = TokenBucket(rate, capacity)
+            return self._buckets[host]
+
+    def _backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        bucket = self.bucket(urlparse(url).netloc)
+        kwargs.setdefault("timeout", self.timeout)
+        for attempt in range(self.max_retries + 1):
+            bucket.acquire()
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                response, error = None, e
+            else:
+                if response.status_code not in RETRY_STATUS:
+                    bucket.recover()
+                    return response
+                error = None
+
+            if attempt == self.max_retries:
+                break
+            delay = _retry_after_seconds(response)
+            if response is not None and response.status_code == 429:
+                bucket.penalize()
+            if delay is None:
+                delay = self._backoff(attempt)
+            bucket.block(delay)
+
+        if error is not None:
+            raise RateLimitError(f"{method} {url} failed after {self.max_retries} retries: {error}")
+        raise RateLimitError(f"{method} {url} failed after {self.max_retries} retries: HTTP {response.status_code}")
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        return self.request("POST", url, **kwargs)
+
+class ChunkQueue:
+    """
+    Resumable queue of independent download chunks.
+
+    run() works through the pending chunks with up to max_in_flight threads. Completed results are kept
+    and failed chunks stay pending, so calling run() again only retries what is missing.
+    """
+    def __init__(self, chunks: list, func):
+        self.func = func
+        self.pending = dict(enumerate(chunks))
+        self.results = {}
+        self.errors = {}
+
+    @property
+    def done(self) -> bool:
+        return not self.pending
+
+    def run(self, max_in_flight: int = 8, desc: str = None) -> bool:
+        progress_bar = tqdm(total=len(self.pending), desc=desc, ascii="#>") if desc else None
+        with ThreadPoolExecutor(max_workers=max(1, max_in_flight)) as executor:
+            futures = {executor.submit(self.func, chunk): i for i, chunk in self.pending.items()}
+            for future in as_completed(futures):
+                i = futures[future]
+                try:
+                    self.results[i] = future.result()
+                    self.pending.pop(i)
+                    self.errors.pop(i, None)
+                except Exception as e:
+                    self.errors[i] = e
+                if progress_bar is not None:
+                    progress_bar.update(1)
+        if progress_bar is not None:
+            progress_bar.close()
+        return self.done
+
+    def run_until_done(self, max_in_flight: int = 8, max_rounds: int = 3, desc: str = None) -> list:
+        """Run up to max_rounds passes and return results in chunk order. Raises if chunks are still missing."""
+        for round_number in range(max_rounds):
+            if self.run(max_in_flight, desc):
+                break
+            if round_number + 1 < max_rounds:
+                print(f"[yellow]{len(self.pending)} chunks failed, resuming (round {round_number + 2}/{max_rounds})[/yellow]")
+            else:
+                print(f"[red]{len(self.pending)} chunks still failing after {max_rounds} rounds, giving up[/red]")
+        if not self.done:
+            first_error = next(iter(self.errors.values()))
+            raise RateLimitError(f"{len(self.pending)} of {len(self.pending) + len(self.results)} chunks failed: {first_error}")
+        return [self.results[i] for i in sorted(self.results)]
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+def get_scheduler() -> RequestScheduler:
+    """Process-wide scheduler, so every caller shares the same per-host budgets."""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = RequestScheduler()
+        return _scheduler
@@ -0,0 +1,140 @@
+import os
+import json
+import time
+import shutil
+import hashlib
+import inspect
+import tempfile
+import numpy as np
+import pandas as pd
+from rich import print
+
+OHLCV_COLUMNS = ['Open', 'High', 'Low', 'Close', 'Volume']
+
+def data_fingerprint(data: pd.DataFrame) -> str:
+    """Hash of the timestamps and OHLCV values, independent of any result columns added by a backtest."""
+    digest = hashlib.sha256()
+    digest.update(str(len(data)).encode())
+    if 'Datetime' in data.columns:
+        digest.update(np.ascontiguousarray(data['Datetime'].values.astype('datetime64[ns]').astype(np.int64)).tobytes())
+    for column in OHLCV_COLUMNS:
+        if column in data.columns:
+            digest.update(column.encode())
+            digest.update(np.ascontiguousarray(data[column].to_numpy(dtype=np.float64)).tobytes())
+    return digest.hexdigest()
+
+def function_fingerprint(func) -> str:
+    """Qualified name plus source, so editing a strategy invalidates its cached results."""
+    if func is None:
+        return "none"
+    target = getattr(func, '__func__', func)
+    try:
+        source = inspect.getsource(target)
+    except (OSError, TypeError):
+        source = repr(target)
+    name = f"{getattr(target, '__module__', '')}.{getattr(target, '__qualname__', repr(target))}"
+    return hashlib.sha256(f"{name}\n{source}".encode()).hexdigest()
+
+class BacktestResultCache:
+    """
+    Persistent, content-addressed store of backtest results.
+
+    Entries are keyed by hash(data fingerprint, strategy source, params, engine config) and hold the stateful
+    positions as compressed int8, the metrics dict and the trade ledger as parquet. The store is bounded
+    to max_bytes and evicts least-recently-used entries.
+    """
+    def __init__(self, cache_dir: str = None, max_bytes: int = 1024**3):
+        self.cache_dir = cache_dir or os.path.join(tempfile.gettempdir(), "backtest_results")
+        self.max_bytes = max_bytes
+        self._total = None  # running size estimate, rescanned only when it crosses max_bytes
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def make_key(self, data_hash: str, strategy_func, params: dict, config: dict = None) -> str:
+        payload = json.dumps({
+            'data': data_hash,
+            'strategy': function_fingerprint(strategy_func),
+            'params': params,
+            'config': config or {},
+        }, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def _entry_dir(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key)
+
+    def get(self, key: str) -> dict:
+        """Return {'position', 'metrics', 'ledger'} for a key, or None on a miss."""
+        entry_dir = self._entry_dir(key)
+        if not os.path.isdir(entry_dir):
+            return None
+        try:
+            with np.load(os.path.join(entry_dir, "position.npz")) as f:
+                position = f['position']
+            metrics = pd.read_parquet(os.path.join(entry_dir, "metrics.parquet")).iloc[0].to_dict()
+            ledger = pd.read_parquet(os.path.join(entry_dir, "ledger.parquet"))
+        except Exception as e:
+            print(f"[yellow]Result cache read error: {e}. Dropping entry.[/yellow]")
+            shutil.rmtree(entry_dir, ignore_errors=True)
+            return None
+        os.utime(entry_dir)  # LRU bookkeeping
+        return {'position': position, 'metrics': metrics, 'ledger': ledger}
+
+    def put(self, key: str, position: pd.Series, metrics: dict, ledger: pd.DataFrame):
+        entry_dir = self._entry_dir(key)
+        tmp_dir = f"{entry_dir}.{os.getpid()}.tmp"
+        os.makedirs(tmp_dir, exist_ok=True)
+        try:
+            np.savez_compressed(os.path.join(tmp_dir, "position.npz"), position=np.asarray(position, dtype=np.int8))
+            pd.DataFrame([metrics]).to_parquet(os.path.join(tmp_dir, "metrics.parquet"))
+            ledger.reset_index(drop=True).to_parquet(os.path.join(tmp_dir, "ledger.parquet"))
+            added = self._dir_size(tmp_dir)
+            if os.path.isdir(entry_dir):
+                added -= self._dir_size(entry_dir)
+                shutil.rmtree(entry_dir, ignore_errors=True)
+            os.replace(tmp_dir, entry_dir)
+        except Exception as e:
+            print(f"[yellow]Failed to cache backtest result: {e}[/yellow]")
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            return
+        if self._total is None:
+            self._total = self.size()
+        else:
+            self._total += added
+        if self._total > self.max_bytes:
+            self.evict()
+
+    @staticmethod
+    def _dir_size(path: str) -> int:
+        return sum(f.stat().st_size for f in os.scandir(path) if f.is_file())
+
+    def _entries(self) -> list:
+        entries = []
+        for entry in os.scandir(self.cache_dir):
+            if not entry.is_dir() or entry.name.endswith(".tmp"):
+                continue
+            entries.append((entry.stat().st_mtime, self._dir_size(entry.path), entry.path))
+        return entries
+
+    def size(self) -> int:
+        return sum(size for _, size, _ in self._entries())
+
+    def evict(self):
+        """Remove least-recently-used entries until the store fits in max_bytes. put() only calls this once the running total exceeds it."""
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
+        self._total = total
+
+    def clear(self):
+        for _, _, path in self._entries():
+            shutil.rmtree(path, ignore_errors=True)
+        self._total = 0
+
+if __name__ == "__main__":
+    cache = BacktestResultCache()
+    start = time.time()
+    entries = cache._entries()
+    print(f"{len(entries)} cached results, {sum(size for _, size, _ in entries)/(1024**2):.2f} MB ({time.time() - start:.3f} seconds)")
@@ -1,31 +1,73 @@
+import heapq
+import bisect
 import pandas as pd
 import numpy as np
 import plotly.graph_objects as go
 import model_tools as mt
 
-def pivot_points(open: pd.Series, high: pd.Series, low: pd.Series, close: pd.Series, window: int = 10) -> np.ndarray:
+SWING_HIGH = 1
+SWING_LOW = -1
+
+def pivot_arrays(open: pd.Series, high: pd.Series, low: pd.Series, window: int = 10) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Swing points as compact arrays.
+
+    Returns:
+        indices: int64 bar positions of the pivots, ascending
+        types: int8, SWING_HIGH (1) or SWING_LOW (-1)
+        prices: float64, the high of a swing high or the low of a swing low
+    """
+    swing_high, swing_low = swing_point_masks(open, high, low, window)
+    indices = np.flatnonzero(swing_high | swing_low)
+    types = np.where(swing_high[indices], SWING_HIGH, SWING_LOW).astype(np.int8)
+    prices = np.where(swing_high[indices], np.asarray(high, dtype=float)[indices], np.asarray(low, dtype=float)[indices])
+    return indices, types, prices
+
+def pivot_points(open: pd.Series, high: pd.Series, low: pd.Series, close: pd.Series, window: int = 10) -> pd.DataFrame:
     """
     Calculate pivot points from high and low prices.
+
+    One row per pivot, indexed by bar position, with Type ('Swing_High'/'Swing_Low'), Price_Index and Price.
+    """
+    indices, types, prices = pivot_arrays(open, high, low, window)
+    return pd.DataFrame({
+        "Type": np.where(types == SWING_HIGH, 'Swing_High', 'Swing_Low'),
+        "Price_Index": indices,
+        "Price": prices,
+    }, index=indices)
+
+def swing_point_masks(open: pd.Series, high: pd.Series, low: pd.Series, window: int = 10) -> tuple[np.ndarray, np.ndarray]:
     """
-    pivot_points = pd.DataFrame(columns=["Type", "Price_Index", "Price"])
+    Vectorized swing detection with the same rule as pivot_points.
 
-    open = open.values
-    high = high.values
-    low = low.values
-    close = close.values
-    for i in range(window, len(open) - window):
-        _high = high[i]
-        _low = low[i]
+    Bar i is a swing high if its high is >= every open in the `window` bars before and after it, otherwise a
+    swing low if its low is <= all of them. The max/min of each window of opens comes from one O(n) rolling
+    pass, compared against the bars on both sides of i. The first and last `window` bars are never swings.
 
-        is_swing_high = all(_high >= open[i - j] and _high >= open[i + j] for j in range(1, window + 1))
-        is_swing_low = all(_low <= open[i - j] and _low <= open[i + j] for j in range(1, window + 1))
+    Returns:
+        swing_high, swing_low: bool arrays aligned to the input
+    """
+    open = np.asarray(open, dtype=float)
+    high = np.asarray(high, dtype=float)
+    low = np.asarray(low, dtype=float)
+    n = len(open)
+    swing_high = np.zeros(n, dtype=bool)
+    swing_low = np.zeros(n, dtype=bool)
+    if n < 2 * window + 1:
+        return swing_high, swing_low
 
-        if is_swing_high:
-            pivot_points.loc[i] = ('Swing_High', i, _high)
-        elif is_swing_low:
-            pivot_points.loc[i] = ('Swing_Low', i, _low)
+    # window_max[k] = max(open[k:k + window])
+    rolling = pd.Series(open).rolling(window)
+    window_max = rolling.max().to_numpy()[window - 1:]
+    window_min = rolling.min().to_numpy()[window - 1:]
 
-    return pivot_points
+    i = np.arange(window, n - window)
+    before, after = i - window, i + 1
+    is_high = (high[i] >= window_max[before]) & (high[i] >= window_max[after])
+    is_low = (low[i] <= window_min[before]) & (low[i] <= window_min[after]) & ~is_high
+    swing_high[i] = is_high
+    swing_low[i] = is_low
+    return swing_high, swing_low
 
 def support_resistance_levels(open: pd.Series, high: pd.Series, low: pd.Series, close: pd.Series, window: int = 10) -> tuple[pd.Series, pd.Series]:
     """
@@ -37,53 +79,336 @@ def support_resistance_levels(open: pd.Series, high: pd.Series, low: pd.Series,
         low: pd.Series - Low prices
         close: pd.Series - Close prices
         window: int - Window size for finding pivot points
-        forward_fill_periods: int - Number of periods to forward fill the levels
         
     Returns:
-        support: pd.Series - Support levels
-        resistance: pd.Series - Resistance levels
+        support: pd.Series - Last swing low at every bar
+        resistance: pd.Series - Last swing high at every bar
     """
-    pivots = pivot_points(open, high, low, close, window)
-    
-    support = pd.Series(index=open.index, dtype=float)
-    resistance = pd.Series(index=open.index, dtype=float)
-    
-    # Fill support and resistance from pivot points
-    for idx, row in pivots.iterrows():
-        if row['Type'] == 'Swing_Low':
-            support.loc[idx] = row['Price']
-        elif row['Type'] == 'Swing_High':
-            resistance.loc[idx] = row['Price']
-    
-    # Forward fill the levels for specified number of periods
-    support = support.ffill()
-    resistance = resistance.ffill()
-    
+    swing_high, swing_low = swing_point_masks(open, high, low, window)
+    support = pd.Series(np.where(swing_low, np.asarray(low, dtype=float), np.nan), index=open.index).ffill()
+    resistance = pd.Series(np.where(swing_high, np.asarray(high, dtype=float), np.nan), index=open.index).ffill()
     return support, resistance
 
+class LevelIndex:
+    """
+    Support/resistance levels clustered from pivots, kept sorted by price.
+
+    A pivot within tolerance (percent) of an existing level is a touch: the level moves to the touch-weighted
+    mean price and its touch count goes up, otherwise it starts a new level. Levels not touched for max_age
+    bars are dropped by expire(). Lookups bisect the sorted prices and walk outwards, O(log n + k).
+
+    Works bar by bar (add() each pivot as it is confirmed, then query) or from a finished pivot_points frame.
+    """
+    def __init__(self, tolerance: float = 0.1, max_age: int = None):
+        self.tolerance = tolerance / 100
+        self.max_age = max_age
+        self._sorted = []  # (price, level id)
+        self._levels = {}  # level id -> [price, touches, last_bar, type]
+        self._expiry = []  # min-heap of (last_bar, level id), stale entries skipped
+        self._next_id = 0
+
+    @classmethod
+    def from_pivots(cls, pivots: pd.DataFrame, tolerance: float = 0.1, max_age: int = None) -> "LevelIndex":
+        """Index of every pivot in a pivot_points frame."""
+        index = cls(tolerance, max_age)
+        types = np.where(pivots["Type"].to_numpy() == 'Swing_High', SWING_HIGH, SWING_LOW)
+        for price, bar, kind in zip(pivots["Price"].to_numpy(dtype=float), pivots["Price_Index"].to_numpy(), types):
+            index.add(price, int(bar), int(kind))
+        return index
+
+    def _neighbour(self, price: float) -> int:
+        """Id of the closest level within tolerance of price, or None."""
+        position = bisect.bisect_left(self._sorted, (price, -1))
+        best, best_distance = None, price * self.tolerance
+        for candidate in self._sorted[max(0, position - 1):position + 1]:
+            distance = abs(candidate[0] - price)
+            if distance <= best_distance:
+                best, best_distance = candidate[1], distance
+        return best
+
+    def add(self, price: float, bar: int, kind: int = 0) -> int:
+        """Add a pivot (kind SWING_HIGH/SWING_LOW) confirmed at bar and return the id of its level."""
+        level_id = self._neighbour(price)
+        if level_id is None:
+            level_id = self._next_id
+            self._next_id += 1
+            self._levels[level_id] = [float(price), 1, bar, kind]
+        else:
+            level = self._levels[level_id]
+            self._sorted.pop(bisect.bisect_left(self._sorted, (level[0], level_id)))
+            level[0] = (level[0] * level[1] + price) / (level[1] + 1)
+            level[1] += 1
+            level[2] = bar
+            level[3] = kind if kind == level[3] else 0  # touched from both sides
+        bisect.insort(self._sorted, (self._levels[level_id][0], level_id))
+        if self.max_age is not None:
+            heapq.heappush(self._expiry, (bar, level_id))
+        return level_id
+
+    def expire(self, bar: int) -> list:
+        """Drop levels last touched more than max_age bars before bar and return their ids."""
+        expired = []
+        while self.max_age is not None and self._expiry and self._expiry[0][0] < bar - self.max_age:
+            last_bar, level_id = heapq.heappop(self._expiry)
+            level = self._levels.get(level_id)
+            if level is None or level[2] != last_bar:
+                continue  # touched again since, a newer heap entry covers it
+            self._sorted.pop(bisect.bisect_left(self._sorted, (level[0], level_id)))
+            del self._levels[level_id]
+            expired.append(level_id)
+        return expired
+
+    def nearest(self, price: float, k: int = 3, pct: float = 1.0, side: str = None, min_touches: int = 1) -> list:
+        """
+        Up to k levels within pct percent of price, closest first, as (price, touches, level id).
+
+        side="below" only returns levels <= price (support), side="above" levels >= price (resistance).
+        """
+        if side not in (None, "below", "above"):
+            raise ValueError(f"Unknown side {side}, expected 'below', 'above' or None")
+        max_distance = price * pct / 100
+        right = bisect.bisect_left(self._sorted, (price, -1))
+        left = right - 1
+        if side == "below":
+            right = len(self._sorted)
+            left = bisect.bisect_right(self._sorted, (price, float('inf'))) - 1
+        elif side == "above":
+            left = -1
+
+        result = []
+        while len(result) < k and (left >= 0 or right < len(self._sorted)):
+            below = price - self._sorted[left][0] if left >= 0 else np.inf
+            above = self._sorted[right][0] - price if right < len(self._sorted) else np.inf
+            if min(below, above) > max_distance:
+                break
+            if below <= above:
+                level_price, level_id = self._sorted[left]
+                left -= 1
+            else:
+                level_price, level_id = self._sorted[right]
+                right += 1
+            touches = self._levels[level_id][1]
+            if touches >= min_touches:
+                result.append((level_price, touches, level_id))
+        return result
+
+    def levels(self) -> pd.DataFrame:
+        """All live levels sorted by price."""
+        rows = [(level_id, *self._levels[level_id]) for _, level_id in self._sorted]
+        return pd.DataFrame(rows, columns=["Level_Id", "Price", "Touches", "Last_Bar", "Type"]).set_index("Level_Id")
+
+    def __len__(self) -> int:
+        return len(self._sorted)
+
+def nearest_level_arrays(open: pd.Series, high: pd.Series, low: pd.Series, close: pd.Series, window: int = 10, tolerance: float = 0.1,
+                         max_age: int = None, pct: float = 1.0, min_touches: int = 1) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Nearest clustered support below and resistance above each close, for vectorized strategies.
+
+    Pivots enter the LevelIndex once confirmed (window bars after the swing), so there is no lookahead.
+
+    Returns:
+        support, resistance: float64 level prices, NaN when none is within pct percent
+        support_touches, resistance_touches: int64 touch counts, 0 when there is no level
+    """
+    indices, types, prices = pivot_arrays(open, high, low, window)
+    close = np.asarray(close, dtype=float)
+    n = len(close)
+    support = np.full(n, np.nan)
+    resistance = np.full(n, np.nan)
+    support_touches = np.zeros(n, dtype=np.int64)
+    resistance_touches = np.zeros(n, dtype=np.int64)
+
+    index = LevelIndex(tolerance, max_age)
+    next_pivot = 0
+    for i in range(n):
+        while next_pivot < len(indices) and indices[next_pivot] + window <= i:
+            index.add(prices[next_pivot], i, int(types[next_pivot]))
+            next_pivot += 1
+        index.expire(i)
+        if not len(index) or np.isnan(close[i]):
+            continue
+        below = index.nearest(close[i], 1, pct, "below", min_touches)
+        above = index.nearest(close[i], 1, pct, "above", min_touches)
+        if below:
+            support[i], support_touches[i] = below[0][0], below[0][1]
+        if above:
+            resistance[i], resistance_touches[i] = above[0][0], above[0][1]
+    return support, resistance, support_touches, resistance_touches
+
+BULLISH = 1
+BEARISH = -1
+
+def fvg_arrays(high: pd.Series, low: pd.Series, pct_threshold: float = 0.005) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Fair Value Gaps as compact arrays, same rule as fvg.
+
+    Returns:
+        indices: int64 position of the third candle of each gap, ascending
+        directions: int8, BULLISH (1) or BEARISH (-1)
+        lower, upper: float64 gap bounds
+    """
+    pct_threshold = pct_threshold / 100
+    high = np.asarray(high, dtype=float)
+    low = np.asarray(low, dtype=float)
+    if len(high) < 3:
+        empty = np.array([], dtype=float)
+        return np.array([], dtype=np.int64), np.array([], dtype=np.int8), empty, empty.copy()
+
+    # Bullish FVG: Candle3_low > Candle1_high, bearish FVG: Candle3_high < Candle1_low
+    with np.errstate(divide='ignore', invalid='ignore'):
+        bullish = (low[2:] > high[:-2]) & ((low[2:] - high[:-2]) / high[:-2] >= pct_threshold)
+        bearish = (high[2:] < low[:-2]) & ((low[:-2] - high[2:]) / low[:-2] >= pct_threshold)
+    indices = np.flatnonzero(bullish | bearish) + 2
+    is_bearish = bearish[indices - 2]
+    directions = np.where(is_bearish, BEARISH, BULLISH).astype(np.int8)
+    lower = np.where(is_bearish, high[indices], high[indices - 2])
+    upper = np.where(is_bearish, low[indices - 2], low[indices])
+    return indices.astype(np.int64), directions, lower, upper
+
 def fvg(open: pd.Series, high: pd.Series, low: pd.Series, close: pd.Series, pct_threshold: float = 0.005) -> pd.DataFrame:
     """
     Calculate the Fair Value Gap from open, high, low, and close prices.
+
+    Indexed like open, with Lower_Range/Upper_Range/Direction set on the third candle of each gap and NaN elsewhere.
     """
-    pct_threshold = pct_threshold / 100
-    fvg = pd.DataFrame(index=open.index, columns=["Lower_Range", "Upper_Range", "Direction"])
-    for i in range(2, len(high)):  # need at least 3 candles
-        # Bullish FVG: Candle3_low > Candle1_high
-        if low[i] > high[i-2]:
-            gap_size = low[i] - high[i-2]
-            if gap_size / high[i-2] >= pct_threshold:
-                fvg.loc[i, "Lower_Range"] = high[i-2]
-                fvg.loc[i, "Upper_Range"] = low[i]
-                fvg.loc[i, "Direction"] = "Bullish"
-
-        # Bearish FVG: Candle3_high < Candle1_low
-        if high[i] < low[i-2]:
-            gap_size = low[i-2] - high[i]
-            if gap_size / low[i-2] >= pct_threshold:
-                fvg.loc[i, "Lower_Range"] = high[i]
-                fvg.loc[i, "Upper_Range"] = low[i-2]
-                fvg.loc[i, "Direction"] = "Bearish"
-    return fvg
+    indices, directions, lower, upper = fvg_arrays(high, low, pct_threshold)
+    n = len(open)
+    lower_range = np.full(n, np.nan)
+    upper_range = np.full(n, np.nan)
+    direction = np.full(n, np.nan, dtype=object)
+    lower_range[indices] = lower
+    upper_range[indices] = upper
+    direction[indices] = np.where(directions == BULLISH, "Bullish", "Bearish")
+    return pd.DataFrame({"Lower_Range": lower_range, "Upper_Range": upper_range, "Direction": direction}, index=open.index)
+
+class OpenGapIndex:
+    """
+    Unmitigated Fair Value Gaps, for bar-by-bar strategies.
+
+    Call update() with each new bar before add()ing the gaps that bar forms. With mitigation="fill" a bullish
+    gap closes once a low trades down to its lower bound (bearish: a high up to its upper bound); with "touch"
+    the first trade into the gap closes it. Mitigation pops from a heap per direction, O(log n) per gap.
+
+    containing(price) is a stabbing query on a segment tree over the gap bounds: every open gap is stored
+    in the O(log m) nodes covering its range, so a query walks one leaf-to-root path. The coordinate grid
+    is seeded with the bounds passed to the constructor (e.g. from fvg_arrays for a backtest); adding a gap
+    with new bounds rebuilds it from the open gaps only.
+    """
+    def __init__(self, lower: np.ndarray = (), upper: np.ndarray = (), mitigation: str = "fill"):
+        if mitigation not in ("fill", "touch"):
+            raise ValueError(f"Unknown mitigation {mitigation}, expected 'fill' or 'touch'")
+        self.mitigation = mitigation
+        self.lower, self.upper, self.directions, self.bars = [], [], [], []
+        self.open_ids = set()
+        self._bullish = []  # max-heap of (-mitigation level, id)
+        self._bearish = []  # min-heap of (mitigation level, id)
+        self._build_grid(np.concatenate([np.asarray(lower, dtype=float), np.asarray(upper, dtype=float)]))
+
+    def _build_grid(self, bounds: np.ndarray):
+        self._coords = np.unique(bounds[~np.isnan(bounds)]).tolist()
+        leaves = max(1, 2 * len(self._coords) - 1)  # coordinates and the open spans between them
+        self._size = 1 << (leaves - 1).bit_length()
+        self._nodes = {}
+        for gap_id in self.open_ids:
+            self._cover(gap_id, add=True)
+
+    def _leaf(self, price: float) -> int:
+        """Leaf of price in the grid, or -1 outside it."""
+        k = bisect.bisect_right(self._coords, price) - 1
+        if k < 0 or (k == len(self._coords) - 1 and price > self._coords[k]):
+            return -1
+        return 2 * k if price == self._coords[k] else 2 * k + 1
+
+    def _cover(self, gap_id: int, add: bool):
+        left = self._leaf(self.lower[gap_id]) + self._size
+        right = self._leaf(self.upper[gap_id]) + self._size + 1
+        while left < right:
+            if left & 1:
+                self._mark(left, gap_id, add)
+                left += 1
+            if right & 1:
+                right -= 1
+                self._mark(right, gap_id, add)
+            left >>= 1
+            right >>= 1
+
+    def _mark(self, node: int, gap_id: int, add: bool):
+        if add:
+            self._nodes.setdefault(node, set()).add(gap_id)
+        else:
+            self._nodes[node].discard(gap_id)
+
+    def add(self, lower: float, upper: float, direction: int, bar: int = None) -> int:
+        """Open a gap and return its id (ids count up from 0 in insertion order)."""
+        if not lower <= upper:
+            raise ValueError(f"Gap bounds must satisfy lower <= upper, got {lower} and {upper}")
+        gap_id = len(self.lower)
+        self.lower.append(float(lower))
+        self.upper.append(float(upper))
+        self.directions.append(int(direction))
+        self.bars.append(bar)
+        if self._leaf(lower) % 2 or self._leaf(upper) % 2:
+            # Bounds not on the grid: rebuild it around the gaps that are still open
+            self._build_grid(np.array([self.lower[i] for i in self.open_ids] + [self.upper[i] for i in self.open_ids] + [lower, upper]))
+        self.open_ids.add(gap_id)
+        self._cover(gap_id, add=True)
+        if direction == BULLISH:
+            level = upper if self.mitigation == "touch" else lower
+            heapq.heappush(self._bullish, (-level, gap_id))
+        else:
+            level = lower if self.mitigation == "touch" else upper
+            heapq.heappush(self._bearish, (level, gap_id))
+        return gap_id
+
+    def update(self, high: float, low: float) -> list:
+        """Apply a new bar and return the ids of the gaps it mitigated."""
+        mitigated = []
+        while self._bullish and -self._bullish[0][0] >= low:
+            mitigated.append(heapq.heappop(self._bullish)[1])
+        while self._bearish and self._bearish[0][0] <= high:
+            mitigated.append(heapq.heappop(self._bearish)[1])
+        for gap_id in mitigated:
+            self._cover(gap_id, add=False)
+            self.open_ids.discard(gap_id)
+        return mitigated
+
+    def containing(self, price: float) -> list:
+        """Ids of the open gaps with lower <= price <= upper."""
+        leaf = self._leaf(price)
+        if leaf < 0:
+            return []
+        ids = set()
+        node = leaf + self._size
+        while node:
+            ids.update(self._nodes.get(node, ()))
+            node >>= 1
+        return sorted(ids)
+
+    def gap(self, gap_id: int) -> tuple:
+        """(lower, upper, direction, bar) of a gap."""
+        return self.lower[gap_id], self.upper[gap_id], self.directions[gap_id], self.bars[gap_id]
+
+    def __len__(self) -> int:
+        return len(self.open_ids)
+
+def fvg_mitigations(high: pd.Series, low: pd.Series, pct_threshold: float = 0.005, mitigation: str = "fill") -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    fvg_arrays plus the position of the bar that mitigated each gap (-1 while still open), from one pass of OpenGapIndex.
+    """
+    indices, directions, lower, upper = fvg_arrays(high, low, pct_threshold)
+    mitigated_at = np.full(len(indices), -1, dtype=np.int64)
+    high = np.asarray(high, dtype=float)
+    low = np.asarray(low, dtype=float)
+    index = OpenGapIndex(lower, upper, mitigation)
+    next_gap = 0
+    for i in range(int(indices[0]) if len(indices) else len(high), len(high)):
+        for gap_id in index.update(high[i], low[i]):
+            mitigated_at[gap_id] = i
+        while next_gap < len(indices) and indices[next_gap] == i:
+            index.add(lower[next_gap], upper[next_gap], directions[next_gap], i)
+            next_gap += 1
+    return indices, directions, lower, upper, mitigated_at
 
 if __name__ == "__main__":
     data = mt.fetch_data("BTC-USDT", 1, "5min", 0, kucoin=True, use_cache=True)
@@ -0,0 +1,104 @@
+from dataclasses import dataclass
+import numpy as np
+import pandas as pd
+
+import smc_analysis as smc
+
+BREAK_SOURCES = ("close", "wick")
+
+def _last_index(mask: np.ndarray) -> np.ndarray:
+    """Position of the most recent True at or before every bar, -1 before the first."""
+    return np.maximum.accumulate(np.where(mask, np.arange(len(mask)), -1))
+
+def _confirmed_levels(swing: np.ndarray, prices: np.ndarray, window: int) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Last swing price known at every bar, and a leg id that changes whenever a new swing is confirmed.
+
+    A swing at bar i is only known once the `window` bars after it have printed, so it becomes the active
+    level at i + window (swing_point_masks never marks the last `window` bars).
+    """
+    n = len(prices)
+    confirmed = np.zeros(n, dtype=bool)
+    confirmed[np.flatnonzero(swing) + window] = True
+    last = _last_index(confirmed)
+    levels = np.where(last >= 0, prices[np.maximum(last - window, 0)], np.nan)
+    return levels, np.cumsum(confirmed)
+
+def _first_per_leg(condition: np.ndarray, leg: np.ndarray) -> np.ndarray:
+    """True on the first bar of each leg where condition holds, i.e. the bar that breaks the level."""
+    count = np.cumsum(condition)
+    leg_start = _last_index(np.r_[True, leg[1:] != leg[:-1]])
+    return condition & (count - (count[leg_start] - condition[leg_start]) == 1)
+
+@dataclass
+class MarketStructure:
+    """
+    Per-bar market structure, aligned to the input bars and free of lookahead.
+
+    swing_high/swing_low are the last confirmed swing prices (NaN before the first). bos/choch are +1 on a
+    bullish and -1 on a bearish break, 0 otherwise; trend is the direction of the last break. The dealing
+    range runs from swing_low to swing_high: range_position is 0 at the low and 1 at the high, above
+    equilibrium (0.5) is premium and below it discount.
+    """
+    swing_high: np.ndarray
+    swing_low: np.ndarray
+    bos: np.ndarray
+    choch: np.ndarray
+    trend: np.ndarray
+    equilibrium: np.ndarray
+    range_position: np.ndarray
+
+    def zone(self) -> np.ndarray:
+        """+1 premium, -1 discount, 0 at equilibrium or without a valid range."""
+        return np.sign(np.nan_to_num(self.range_position - 0.5)).astype(np.int8)
+
+    def to_frame(self, index: pd.Index = None) -> pd.DataFrame:
+        return pd.DataFrame({
+            "Swing_High_Level": self.swing_high,
+            "Swing_Low_Level": self.swing_low,
+            "BOS": self.bos,
+            "CHoCH": self.choch,
+            "Trend": self.trend,
+            "Equilibrium": self.equilibrium,
+            "Range_Position": self.range_position,
+            "Zone": self.zone(),
+        }, index=index)
+
+def market_structure(open: pd.Series, high: pd.Series, low: pd.Series, close: pd.Series, window: int = 10, break_on: str = "close") -> MarketStructure:
+    """
+    Swing levels, break of structure / change of character and premium/discount zones in one linear pass.
+
+    Swings come from smc.swing_point_masks and become active once confirmed. A level is broken by the
+    first close (break_on="close") or wick (break_on="wick") beyond it while it is the active level. A break
+    in the direction of the trend (or the first break) is a BOS, one against it a CHoCH, which flips the trend.
+    Everything is cumulative sums and forward fills over arrays, so a year of 1-min bars takes milliseconds.
+    """
+    if break_on not in BREAK_SOURCES:
+        raise ValueError(f"Unknown break_on {break_on}, expected one of {BREAK_SOURCES}")
+    high_values = np.asarray(high, dtype=float)
+    low_values = np.asarray(low, dtype=float)
+    close_values = np.asarray(close, dtype=float)
+
+    swing_high, swing_low = smc.swing_point_masks(open, high, low, window)
+    high_level, high_leg = _confirmed_levels(swing_high, high_values, window)
+    low_level, low_leg = _confirmed_levels(swing_low, low_values, window)
+
+    up_source = close_values if break_on == "close" else high_values
+    down_source = close_values if break_on == "close" else low_values
+    with np.errstate(invalid='ignore'):
+        broke_up = _first_per_leg(up_source > high_level, high_leg)
+        broke_down = _first_per_leg(down_source < low_level, low_leg)
+    events = np.where(broke_up & ~broke_down, 1, np.where(broke_down & ~broke_up, -1, 0)).astype(np.int8)
+
+    last_event = _last_index(events != 0)
+    trend = np.where(last_event >= 0, events[np.maximum(last_event, 0)], 0).astype(np.int8)
+    prior = np.r_[np.int8(0), trend[:-1]]
+    choch = np.where((events != 0) & (prior == -events), events, 0).astype(np.int8)
+    bos = np.where((events != 0) & (choch == 0), events, 0).astype(np.int8)
+
+    span = high_level - low_level
+    with np.errstate(invalid='ignore', divide='ignore'):
+        valid = span > 0
+        range_position = np.where(valid, (close_values - low_level) / span, np.nan)
+    equilibrium = np.where(valid, (high_level + low_level) / 2, np.nan)
+    return MarketStructure(high_level, low_level, bos, choch, trend, equilibrium, range_position)
@@ -0,0 +1,392 @@
+import os
+import numpy as np
+from scipy.special import ndtri
+
+BOUNDS_THRESHOLD = 1e-7  # same bounds handling as sklearn's QuantileTransformer
+NORMAL_CLIP = (ndtri(BOUNDS_THRESHOLD - np.spacing(1)), ndtri(1 - (BOUNDS_THRESHOLD - np.spacing(1))))
+
+class RunningMoments:
+    """
+    Per-column count, mean, variance, min and max, updated block by block.
+
+    Blocks are combined with Chan's parallel formula, so two instances fitted on different chunks
+    can be merged and give the same result as one pass over all rows. NaNs are ignored.
+    """
+    def __init__(self, n_columns: int = None):
+        self.count = self.mean = self.m2 = self.min = self.max = None
+        if n_columns is not None:
+            self._init(n_columns)
+
+    def _init(self, n_columns: int):
+        self.count = np.zeros(n_columns)
+        self.mean = np.zeros(n_columns)
+        self.m2 = np.zeros(n_columns)
+        self.min = np.full(n_columns, np.inf)
+        self.max = np.full(n_columns, -np.inf)
+
+    def _combine(self, count, mean, m2, minimum, maximum):
+        if self.count is None:
+            self._init(len(count))
+        total = self.count + count
+        with np.errstate(divide='ignore', invalid='ignore'):
+            delta = mean - self.mean
+            weight = np.where(total > 0, count / total, 0)
+        self.mean = self.mean + delta * weight
+        self.m2 = self.m2 + m2 + delta ** 2 * self.count * weight
+        self.count = total
+        self.min = np.fmin(self.min, minimum)
+        self.max = np.fmax(self.max, maximum)
+
+    def update(self, X: np.ndarray):
+        X = np.asarray(X, dtype=np.float64).reshape(len(X), -1)
+        valid = ~np.isnan(X)
+        count = valid.sum(axis=0).astype(np.float64)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            mean = np.where(count > 0, np.nansum(X, axis=0) / count, 0)
+        m2 = np.nansum((X - mean) ** 2, axis=0)
+        minimum = np.where(count > 0, np.nanmin(np.where(valid, X, np.inf), axis=0), np.inf)
+        maximum = np.where(count > 0, np.nanmax(np.where(valid, X, -np.inf), axis=0), -np.inf)
+        self._combine(count, mean, m2, minimum, maximum)
+        return self
+
+    def merge(self, other: 'RunningMoments'):
+        self._combine(other.count, other.mean, other.m2, other.min, other.max)
+        return self
+
+    @property
+    def var(self) -> np.ndarray:
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(self.count > 0, self.m2 / self.count, np.nan)
+
+class TDigest:
+    """
+    Merging t-digest for one column.
+
+    Points are kept as weighted centroids; the arcsine scale function keeps centroids small near the
+    tails, so extreme quantiles stay accurate while the digest holds only about `compression`
+    centroids regardless of how many rows were added. Digests fitted on separate chunks can be merged;
+    the result has the same error bounds as one digest fitted on all rows but isn't identical to it,
+    since centroids depend on the order points arrive in. min and max are kept exactly.
+    """
+    def __init__(self, compression: float = 200):
+        self.compression = compression
+        self.means = np.empty(0)
+        self.weights = np.empty(0)
+        self.min = np.inf
+        self.max = -np.inf
+
+    @property
+    def count(self) -> float:
+        return self.weights.sum()
+
+    def update(self, values: np.ndarray):
+        values = np.asarray(values, dtype=np.float64)
+        values = values[np.isfinite(values)]
+        if len(values):
+            self.min = min(self.min, values.min())
+            self.max = max(self.max, values.max())
+            self._compress(values, np.ones(len(values)))
+        return self
+
+    def merge(self, other: 'TDigest'):
+        if len(other.means):
+            self.min = min(self.min, other.min)
+            self.max = max(self.max, other.max)
+            self._compress(other.means, other.weights)
+        return self
+
+    def _compress(self, means: np.ndarray, weights: np.ndarray):
+        means = np.concatenate([self.means, means])
+        weights = np.concatenate([self.weights, weights])
+        order = np.argsort(means, kind='mergesort')
+        means, weights = means[order], weights[order]
+
+        # Points whose midpoint quantile falls in the same unit of k-space become one centroid
+        cumulative = np.cumsum(weights)
+        q = (cumulative - weights / 2) / cumulative[-1]
+        k = np.floor(self.compression / (2 * np.pi) * np.arcsin(2 * q - 1))
+        starts = np.flatnonzero(np.concatenate([[True], k[1:] != k[:-1]]))
+        merged_weights = np.add.reduceat(weights, starts)
+        self.means = np.add.reduceat(means * weights, starts) / merged_weights
+        self.weights = merged_weights
+
+    def _positions(self) -> tuple:
+        cumulative = np.cumsum(self.weights)
+        q = (cumulative - self.weights / 2) / cumulative[-1]
+        return np.concatenate([[0.0], q, [1.0]]), np.concatenate([[self.min], self.means, [self.max]])
+
+    def quantile(self, q) -> np.ndarray:
+        if not len(self.means):
+            return np.full(np.shape(q), np.nan)
+        positions, values = self._positions()
+        return np.interp(q, positions, values)
+
+    def cdf(self, x) -> np.ndarray:
+        if not len(self.means):
+            return np.full(np.shape(x), np.nan)
+        positions, values = self._positions()
+        return np.interp(x, values, positions)
+
+def _as_block(X, copy: bool) -> np.ndarray:
+    """float32 2-D array to transform; X itself when it already is one and copy is False."""
+    X = np.asarray(X)
+    if copy or X.dtype != np.float32 or not X.flags.writeable:
+        X = np.array(X, dtype=np.float32)
+    return X.reshape(len(X), -1)
+
+class StreamingScaler:
+    """
+    Base for scalers fitted chunk by chunk with partial_fit().
+
+    transform(X, copy=False) scales a writable float32 array in place (anything else is copied to
+    float32 first) and returns it.
+    """
+    kind = None
+
+    def partial_fit(self, X):
+        raise NotImplementedError
+
+    def fit(self, X, chunk_rows: int = 100_000):
+        X = np.asarray(X)
+        for start in range(0, len(X), chunk_rows):
+            self.partial_fit(X[start:start + chunk_rows])
+        return self
+
+    def fit_chunks(self, chunks):
+        """Fit from any iterable of row blocks, e.g. FeatureStore.iter_blocks()."""
+        for chunk in chunks:
+            self.partial_fit(chunk)
+        return self
+
+    def fit_transform(self, X):
+        return self.fit(X).transform(X, copy=True)
+
+    def state(self) -> dict:
+        raise NotImplementedError
+
+    @classmethod
+    def from_state(cls, state: dict):
+        raise NotImplementedError
+
+class StreamingStandardScaler(StreamingScaler):
+    """StandardScaler from running moments (population variance, constant columns scaled by 1)."""
+    kind = 'standard'
+
+    def __init__(self):
+        self.moments = RunningMoments()
+
+    def partial_fit(self, X):
+        self.moments.update(X)
+        return self
+
+    def merge(self, other: 'StreamingStandardScaler'):
+        self.moments.merge(other.moments)
+        return self
+
+    @property
+    def mean_(self) -> np.ndarray:
+        return self.moments.mean
+
+    @property
+    def scale_(self) -> np.ndarray:
+        scale = np.sqrt(self.moments.var)
+        return np.where((scale == 0) | np.isnan(scale), 1.0, scale)
+
+    def transform(self, X, copy: bool = False) -> np.ndarray:
+        X = _as_block(X, copy)
+        X -= self.mean_.astype(np.float32)
+        X /= self.scale_.astype(np.float32)
+        return X
+
+    def inverse_transform(self, X, copy: bool = True) -> np.ndarray:
+        X = _as_block(X, copy)
+        X *= self.scale_.astype(np.float32)
+        X += self.mean_.astype(np.float32)
+        return X
+
+    def state(self) -> dict:
+        m = self.moments
+        return {'count': m.count, 'mean': m.mean, 'm2': m.m2, 'min': m.min, 'max': m.max}
+
+    @classmethod
+    def from_state(cls, state: dict):
+        scaler = cls()
+        m = scaler.moments
+        m.count, m.mean, m.m2, m.min, m.max = (np.asarray(state[k], dtype=np.float64) for k in ('count', 'mean', 'm2', 'min', 'max'))
+        return scaler
+
+class StreamingMinMaxScaler(StreamingStandardScaler):
+    """MinMaxScaler from running min/max."""
+    kind = 'minmax'
+
+    def __init__(self, feature_range: tuple = (0, 1)):
+        super().__init__()
+        self.feature_range = feature_range
+
+    @property
+    def scale_(self) -> np.ndarray:
+        data_range = self.moments.max - self.moments.min
+        data_range = np.where(data_range == 0, 1.0, data_range)
+        return (self.feature_range[1] - self.feature_range[0]) / data_range
+
+    @property
+    def min_(self) -> np.ndarray:
+        return self.feature_range[0] - self.moments.min * self.scale_
+
+    def transform(self, X, copy: bool = False) -> np.ndarray:
+        X = _as_block(X, copy)
+        X *= self.scale_.astype(np.float32)
+        X += self.min_.astype(np.float32)
+        return X
+
+    def inverse_transform(self, X, copy: bool = True) -> np.ndarray:
+        X = _as_block(X, copy)
+        X -= self.min_.astype(np.float32)
+        X /= self.scale_.astype(np.float32)
+        return X
+
+    def state(self) -> dict:
+        return {**super().state(), 'feature_range': np.asarray(self.feature_range, dtype=np.float64)}
+
+    @classmethod
+    def from_state(cls, state: dict):
+        scaler = super().from_state(state)
+        scaler.feature_range = tuple(np.asarray(state['feature_range']).tolist())
+        return scaler
+
+class StreamingQuantileScaler(StreamingScaler):
+    """
+    QuantileTransformer backed by one t-digest per column.
+
+    The n_quantiles reference quantiles are read from the digests when transform() is first called
+    after fitting; the mapping then follows sklearn's _transform_col: interpolated both ways to handle
+    repeated quantiles, values at (or, for the normal output, within BOUNDS_THRESHOLD of) the fitted min/max
+    pinned to 0/1, and the normal ppf clipped to about +-5.2. Only the reference quantiles themselves are
+    approximate.
+    """
+    kind = 'quantile'
+
+    def __init__(self, n_quantiles: int = 1000, output_distribution: str = 'normal', compression: float = 200):
+        if output_distribution not in ('normal', 'uniform'):
+            raise ValueError("output_distribution must be 'normal' or 'uniform'")
+        self.n_quantiles = n_quantiles
+        self.output_distribution = output_distribution
+        self.compression = compression
+        self.digests = None
+        self._quantiles = None
+
+    @property
+    def references_(self) -> np.ndarray:
+        return np.linspace(0, 1, self.n_quantiles)
+
+    def partial_fit(self, X):
+        X = np.asarray(X, dtype=np.float64).reshape(len(X), -1)
+        if self.digests is None:
+            self.digests = [TDigest(self.compression) for _ in range(X.shape[1])]
+        for j, digest in enumerate(self.digests):
+            digest.update(X[:, j])
+        self._quantiles = None
+        return self
+
+    def merge(self, other: 'StreamingQuantileScaler'):
+        if self.digests is None:
+            self.digests = [TDigest(self.compression) for _ in other.digests]
+        for digest, other_digest in zip(self.digests, other.digests):
+            digest.merge(other_digest)
+        self._quantiles = None
+        return self
+
+    @property
+    def quantiles_(self) -> np.ndarray:
+        """(n_quantiles, columns) reference values."""
+        if self._quantiles is None:
+            references = self.references_
+            self._quantiles = np.column_stack([digest.quantile(references) for digest in self.digests])
+        return self._quantiles
+
+    def transform(self, X, copy: bool = False) -> np.ndarray:
+        X = _as_block(X, copy)
+        quantiles, references = self.quantiles_, self.references_
+        for j in range(X.shape[1]):
+            column = X[:, j].astype(np.float64)
+            q = quantiles[:, j]
+            with np.errstate(invalid='ignore'):
+                if self.output_distribution == 'normal':
+                    lower_bounds = column - BOUNDS_THRESHOLD < q[0]
+                    upper_bounds = column + BOUNDS_THRESHOLD > q[-1]
+                else:
+                    lower_bounds = column == q[0]
+                    upper_bounds = column == q[-1]
+            u = 0.5 * (np.interp(column, q, references) - np.interp(-column, -q[::-1], -references[::-1]))
+            u[upper_bounds] = 1
+            u[lower_bounds] = 0
+            if self.output_distribution == 'normal':
+                u = np.clip(ndtri(u), NORMAL_CLIP[0], NORMAL_CLIP[1])
+            u[np.isnan(column)] = np.nan
+            X[:, j] = u
+        return X
+
+    def state(self) -> dict:
+        sizes = np.array([len(digest.means) for digest in self.digests])
+        return {
+            'params': np.array([self.n_quantiles, self.compression], dtype=np.float64),
+            'output_distribution': np.array(self.output_distribution),
+            'sizes': sizes,
+            'means': np.concatenate([digest.means for digest in self.digests]),
+            'weights': np.concatenate([digest.weights for digest in self.digests]),
+            'bounds': np.array([[digest.min, digest.max] for digest in self.digests]),
+        }
+
+    @classmethod
+    def from_state(cls, state: dict):
+        n_quantiles, compression = state['params']
+        scaler = cls(int(n_quantiles), str(state['output_distribution']), compression)
+        offsets = np.concatenate([[0], np.cumsum(state['sizes'])])
+        scaler.digests = []
+        for j, (start, end) in enumerate(zip(offsets[:-1], offsets[1:])):
+            digest = TDigest(compression)
+            digest.means, digest.weights = state['means'][start:end], state['weights'][start:end]
+            digest.min, digest.max = state['bounds'][j]
+            scaler.digests.append(digest)
+        return scaler
+
+SCALER_KINDS = {cls.kind: cls for cls in (StreamingStandardScaler, StreamingMinMaxScaler, StreamingQuantileScaler)}
+
+def prepare_data_scalers() -> dict:
+    """Streaming versions of the scalers prepare_data fits."""
+    return {
+        'price': StreamingMinMaxScaler(feature_range=(0, 1)),
+        'volume': StreamingQuantileScaler(output_distribution='normal'),
+        'technical': StreamingStandardScaler(),
+    }
+
+def scaler_path(model_path: str) -> str:
+    """Where the scalers of a model checkpoint are kept: next to it as <name>_scalers.npz."""
+    return f"{os.path.splitext(model_path)[0]}_scalers.npz"
+
+def save_scalers(path: str, scalers: dict, columns: dict = None):
+    """Save named streaming scalers (and optionally the column list each was fitted on) to one .npz."""
+    arrays = {}
+    for name, scaler in scalers.items():
+        arrays[f"{name}/kind"] = np.array(scaler.kind)
+        for key, value in scaler.state().items():
+            arrays[f"{name}/{key}"] = np.asarray(value)
+        if columns and name in columns:
+            arrays[f"{name}/columns"] = np.array(list(columns[name]))
+    tmp_path = f"{path}.tmp.npz"
+    np.savez(tmp_path, **arrays)
+    os.replace(tmp_path, path)
+
+def load_scalers(path: str) -> tuple:
+    """Returns (scalers, columns) as written by save_scalers."""
+    with np.load(path, allow_pickle=False) as archive:
+        states = {}
+        for key in archive.files:
+            name, field = key.split("/", 1)
+            states.setdefault(name, {})[field] = archive[key]
+    scalers, columns = {}, {}
+    for name, state in states.items():
+        scalers[name] = SCALER_KINDS[str(state.pop('kind'))].from_state(state)
+        if 'columns' in state:
+            columns[name] = state.pop('columns').tolist()
+    return scalers, columns
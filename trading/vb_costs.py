@@ -0,0 +1,84 @@
+import numpy as np
+import pandas as pd
+from dataclasses import dataclass
+
+import technical_analysis as ta
+
+def get_turnover(position_multiplier: pd.Series) -> pd.Series:
+    """Absolute change in exposure at each bar. Entering from flat at the first bar counts as turnover."""
+    turnover = position_multiplier.diff().abs()
+    turnover.iloc[:1] = position_multiplier.iloc[:1].abs()
+    return turnover
+
+def get_fee_costs(turnover: pd.Series, fee_rate: float) -> pd.Series:
+    """Per-side fee as a fraction of notional, charged on every unit of turnover."""
+    return turnover * fee_rate
+
+def get_fixed_slippage_costs(turnover: pd.Series, slippage_bps: float) -> pd.Series:
+    """Constant half-spread/slippage in basis points per unit of turnover."""
+    return turnover * (slippage_bps / 10000)
+
+def get_atr_slippage_costs(turnover: pd.Series, high: pd.Series, low: pd.Series, close: pd.Series, atr_multiplier: float = 0.05, timeperiod: int = 14) -> pd.Series:
+    """Slippage proportional to ATR as a fraction of price. Bars without an ATR yet use the bar's own range."""
+    atr_pct = ta.atr(high, low, close, timeperiod=timeperiod) / close
+    atr_pct = atr_pct.fillna((high - low) / close)
+    return turnover * atr_pct * atr_multiplier
+
+def get_volume_slippage_costs(turnover: pd.Series, volume: pd.Series, impact_bps: float = 1.0, timeperiod: int = 20) -> pd.Series:
+    """Slippage that grows as volume dries up, scaled by average volume over volume at the bar."""
+    average_volume = volume.rolling(window=timeperiod, min_periods=1).mean()
+    relative_volume = (volume / average_volume).replace(0, np.nan)
+    impact = (impact_bps / 10000) / np.sqrt(relative_volume)
+    impact = impact.replace([np.inf, -np.inf], np.nan).fillna(impact_bps / 10000)
+    return turnover * impact
+
+def get_funding_costs(position_multiplier: pd.Series, funding_rate: float) -> pd.Series:
+    """Per-bar funding/borrow cost for short exposure held over the bar."""
+    short_exposure = (-position_multiplier.shift(1)).clip(lower=0).fillna(0)
+    return short_exposure * funding_rate
+
+@dataclass
+class CostModel:
+    """
+    Vectorized transaction cost model for VectorizedBacktesting.
+
+    All costs are fractions of notional per bar and are subtracted from strategy returns.
+
+    Args:
+        fee_rate: Per-side fee (0.001 = 0.1% maker/taker)
+        slippage_bps: Constant slippage in basis points per side
+        slippage_model: None, "atr" or "volume" for an additional variable slippage term
+        atr_multiplier: Fraction of ATR paid per side when slippage_model="atr"
+        atr_period: ATR lookback when slippage_model="atr"
+        volume_impact_bps: Slippage in basis points at average volume when slippage_model="volume"
+        volume_period: Average volume lookback when slippage_model="volume"
+        funding_rate: Funding/borrow rate charged per bar on short exposure
+    """
+    fee_rate: float = 0.0
+    slippage_bps: float = 0.0
+    slippage_model: str = None
+    atr_multiplier: float = 0.05
+    atr_period: int = 14
+    volume_impact_bps: float = 1.0
+    volume_period: int = 20
+    funding_rate: float = 0.0
+
+    def get_side_cost_rate(self, data: pd.DataFrame) -> pd.Series:
+        """Cost per unit of turnover at each bar (fees plus slippage)."""
+        unit = pd.Series(1.0, index=data.index)
+        rate = get_fee_costs(unit, self.fee_rate) + get_fixed_slippage_costs(unit, self.slippage_bps)
+        if self.slippage_model == "atr":
+            rate = rate + get_atr_slippage_costs(unit, data['High'], data['Low'], data['Close'], self.atr_multiplier, self.atr_period)
+        elif self.slippage_model == "volume":
+            rate = rate + get_volume_slippage_costs(unit, data['Volume'], self.volume_impact_bps, self.volume_period)
+        elif self.slippage_model is not None:
+            raise ValueError(f"Unknown slippage model: {self.slippage_model}")
+        return rate
+
+    def get_costs(self, data: pd.DataFrame, position_multiplier: pd.Series) -> pd.Series:
+        """Total cost per bar as a fraction of capital."""
+        turnover = get_turnover(position_multiplier)
+        costs = turnover * self.get_side_cost_rate(data)
+        if self.funding_rate:
+            costs = costs + get_funding_costs(position_multiplier, self.funding_rate)
+        return costs
@@ -33,9 +33,8 @@ def get_cumulative_returns(position: pd.Series, close_prices: pd.Series) -> pd.S
 
 def get_total_return(position: pd.Series, close_prices: pd.Series) -> float:
     """Calculate total return from position and close prices."""
-    cumulative_returns = get_cumulative_returns(position, close_prices)
-    result = cumulative_returns.iloc[-1] - 1
-    return result
+    returns = get_returns(position, close_prices)
+    return get_total_return_from_returns(returns)
 
 def get_benchmark_returns(close_prices: pd.Series) -> pd.Series:
     """Calculate benchmark returns. (if you just held the asset)"""
@@ -58,23 +57,7 @@ def get_alpha_beta(position: pd.Series, close_prices: pd.Series, n_days: int = N
     """Calculate Jensen's alpha and beta using regression, annualized and scaled by simulation days."""
     strategy_returns = get_returns(position, close_prices)
     market_returns = close_prices.pct_change()
-
-    # Align time
-    common_index = strategy_returns.dropna().index.intersection(market_returns.dropna().index)
-    strategy_returns = strategy_returns.loc[common_index]
-    market_returns = market_returns.loc[common_index]
-
-    if len(strategy_returns) < 2 or len(market_returns) < 2:
-        return float('nan'), float('nan')
-
-    X = sm.add_constant(market_returns.values)
-    y = strategy_returns.values
-    model = sm.OLS(y, X).fit()
-    alpha = model.params[0]  # Intercept is Jensen's alpha
-    beta = model.params[1]   # Slope is beta
-    if annualize and n_days > 0:
-        alpha = alpha * (365 / n_days)
-    return alpha, beta
+    return get_alpha_beta_from_returns(strategy_returns, market_returns, n_days=n_days, annualize=annualize)
 
 def get_alpha(position: pd.Series, close_prices: pd.Series, n_days: int = None, annualize: bool = True) -> float:
     """Return annualized Jensen's alpha."""
@@ -102,64 +85,64 @@ def get_drawdown(position: pd.Series, close_prices: pd.Series, initial_capital:
 
 def get_max_drawdown(position: pd.Series, close_prices: pd.Series, initial_capital: float) -> float:
     """Calculate maximum drawdown from position, close prices, and initial capital."""
-    drawdown = get_drawdown(position, close_prices, initial_capital)
-    result = drawdown.min()
-    return result
+    returns = get_returns(position, close_prices)
+    return get_max_drawdown_from_returns(returns)
 
 def get_sharpe_ratio(position: pd.Series, close_prices: pd.Series, risk_free_rate: float = 0.00, trading_days: int = 365) -> float:
     """Calculate Sharpe ratio from position, close prices, risk-free rate, and trading days."""
     returns = get_returns(position, close_prices)
-    daily_rf = (1 + risk_free_rate) ** (1/trading_days) - 1
-    excess_returns = returns - daily_rf
-    result = np.sqrt(trading_days) * excess_returns.mean() / excess_returns.std()
-    return result
+    return get_sharpe_ratio_from_returns(returns, risk_free_rate, trading_days)
 
 def get_sortino_ratio(position: pd.Series, close_prices: pd.Series, risk_free_rate: float = 0.00, trading_days: int = 365) -> float:
     """Calculate Sortino ratio from position, close prices, risk-free rate, and trading days."""
     returns = get_returns(position, close_prices)
-    daily_rf = (1 + risk_free_rate) ** (1/trading_days) - 1
-    downside_returns = returns[returns < 0]
-    result = np.sqrt(trading_days) * (returns.mean() - daily_rf) / downside_returns.std()
-    return result
+    return get_sortino_ratio_from_returns(returns, risk_free_rate, trading_days)
+
+def get_trade_ledger(position: pd.Series, close_prices: pd.Series, cost_rate: pd.Series = None, size: pd.Series = None) -> pd.DataFrame:
+    """
+    Build a ledger of closed trades from a stateful position series.
+
+    A trade opens at a position change into long/short and closes at the next position change.
+    cost_rate is the per-side cost as a fraction of price at each bar (see vb_costs.CostModel.get_side_cost_rate)
+    and is charged on both the entry and exit fill. size is the absolute exposure at each bar; a trade's
+    PnL is scaled by the size at its entry bar.
+    """
+    pos = np.asarray(position)
+    prices = np.asarray(close_prices, dtype=float)
+    columns = ['Entry_Index', 'Exit_Index', 'Direction', 'Size', 'Entry_Price', 'Exit_Price', 'Costs', 'PnL']
+    if len(pos) == 0:
+        return pd.DataFrame(columns=columns)
 
-def get_trade_pnls(position: pd.Series, close_prices: pd.Series) -> List[float]:
+    change_idx = np.flatnonzero(np.r_[True, pos[1:] != pos[:-1]])
+    entries = change_idx[:-1]
+    exits = change_idx[1:]
+    is_trade = pos[entries] != 2
+    entries = entries[is_trade]
+    exits = exits[is_trade]
+
+    direction = np.where(pos[entries] == 3, 1, -1)
+    entry_price = prices[entries]
+    exit_price = prices[exits]
+    trade_size = np.asarray(size, dtype=float)[entries] if size is not None else np.ones(len(entries))
+    costs = np.zeros(len(entries))
+    if cost_rate is not None:
+        rate = np.asarray(cost_rate, dtype=float)
+        costs = trade_size * (entry_price * rate[entries] + exit_price * rate[exits])
+
+    return pd.DataFrame({
+        'Entry_Index': position.index[entries],
+        'Exit_Index': position.index[exits],
+        'Direction': direction,
+        'Size': trade_size,
+        'Entry_Price': entry_price,
+        'Exit_Price': exit_price,
+        'Costs': costs,
+        'PnL': trade_size * direction * (exit_price - entry_price) - costs
+    }, columns=columns)
+
+def get_trade_pnls(position: pd.Series, close_prices: pd.Series, cost_rate: pd.Series = None) -> List[float]:
     """Calculate P&L for each trade from position and close prices."""
-    
-    # Vectorized implementation
-    position_changes = position.diff()
-    change_indices = position_changes[position_changes != 0].index
-    
-    if len(change_indices) == 0:
-        return []
-    
-    pnl_list = []
-    active_positions = []  # Stack of (position_type, entry_price, entry_idx)
-    
-    # Process all position changes
-    prev_pos = position.iloc[0] if len(position) > 0 else 2
-    
-    for idx in change_indices:
-        current_pos = position.loc[idx]
-        
-        # Close existing position if switching or going to flat
-        if prev_pos != 2 and prev_pos != current_pos:
-            if active_positions:
-                pos_type, entry_price, _ = active_positions.pop()
-                exit_price = close_prices.loc[idx]
-                if pos_type == 3:  # Long
-                    pnl = exit_price - entry_price
-                else:  # Short (pos_type == 1)
-                    pnl = entry_price - exit_price
-                pnl_list.append(pnl)
-        
-        # Open new position if not going to flat
-        if current_pos != 2:
-            entry_price = close_prices.loc[idx]
-            active_positions.append((current_pos, entry_price, idx))
-        
-        prev_pos = current_pos
-    
-    return pnl_list
+    return get_trade_ledger(position, close_prices, cost_rate=cost_rate)['PnL'].tolist()
 
 def get_win_rate(position: pd.Series, close_prices: pd.Series) -> float:
     """Calculate win rate from position and close prices."""
@@ -198,8 +181,7 @@ def get_pt_ratio(position: pd.Series, close_prices: pd.Series) -> float:
 def get_profit_factor(position: pd.Series, close_prices: pd.Series) -> float:
     """Calculate profit factor from position and close prices."""
     returns = get_returns(position, close_prices)
-    profit_factor = returns[returns > 0].sum() / abs(returns[returns < 0].sum())
-    return profit_factor
+    return get_profit_factor_from_returns(returns)
 
 def get_total_trades(position: pd.Series) -> int:
     """Calculate total number of trades from position."""
@@ -229,4 +211,49 @@ def get_breakeven_rate_from_pnls(pnl_list: List[float]) -> float:
     
     rr_ratio = (avg_win / abs(avg_loss)) if avg_loss < 0 else 0
     result = 1 / (rr_ratio + 1) if rr_ratio > 0 else 0
-    return result
\ No newline at end of file
+    return result
+
+def get_total_return_from_returns(returns: pd.Series) -> float:
+    """Calculate total return from pre-calculated strategy returns."""
+    return (1 + returns).cumprod().iloc[-1] - 1
+
+def get_max_drawdown_from_returns(returns: pd.Series) -> float:
+    """Calculate maximum drawdown from pre-calculated strategy returns."""
+    cumulative_returns = (1 + returns).cumprod()
+    peak = cumulative_returns.cummax()
+    return ((cumulative_returns - peak) / peak).min()
+
+def get_sharpe_ratio_from_returns(returns: pd.Series, risk_free_rate: float = 0.00, trading_days: int = 365) -> float:
+    """Calculate Sharpe ratio from pre-calculated strategy returns."""
+    daily_rf = (1 + risk_free_rate) ** (1/trading_days) - 1
+    excess_returns = returns - daily_rf
+    return np.sqrt(trading_days) * excess_returns.mean() / excess_returns.std()
+
+def get_sortino_ratio_from_returns(returns: pd.Series, risk_free_rate: float = 0.00, trading_days: int = 365) -> float:
+    """Calculate Sortino ratio from pre-calculated strategy returns."""
+    daily_rf = (1 + risk_free_rate) ** (1/trading_days) - 1
+    downside_returns = returns[returns < 0]
+    return np.sqrt(trading_days) * (returns.mean() - daily_rf) / downside_returns.std()
+
+def get_profit_factor_from_returns(returns: pd.Series) -> float:
+    """Calculate profit factor from pre-calculated strategy returns."""
+    return returns[returns > 0].sum() / abs(returns[returns < 0].sum())
+
+def get_alpha_beta_from_returns(strategy_returns: pd.Series, market_returns: pd.Series, n_days: int = None, annualize: bool = True):
+    """Calculate Jensen's alpha and beta from pre-calculated strategy and market returns."""
+    # Align time
+    common_index = strategy_returns.dropna().index.intersection(market_returns.dropna().index)
+    strategy_returns = strategy_returns.loc[common_index]
+    market_returns = market_returns.loc[common_index]
+
+    if len(strategy_returns) < 2 or len(market_returns) < 2:
+        return float('nan'), float('nan')
+
+    X = sm.add_constant(market_returns.values)
+    y = strategy_returns.values
+    model = sm.OLS(y, X).fit()
+    alpha = model.params[0]  # Intercept is Jensen's alpha
+    beta = model.params[1]   # Slope is beta
+    if annualize and n_days:
+        alpha = alpha * (365 / n_days)
+    return alpha, beta
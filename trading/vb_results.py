@@ -0,0 +1,81 @@
+import numpy as np
+import pandas as pd
+
+RESULT_COLUMNS = ['Return', 'Position', 'Exposure', 'Costs', 'Strategy_Returns', 'Cumulative_Returns', 'Portfolio_Value', 'Peak', 'Drawdown']
+DERIVED_COLUMNS = ['Return', 'Cumulative_Returns', 'Portfolio_Value', 'Peak', 'Drawdown']
+
+class BacktestResult:
+    """
+    Compact result of a VectorizedBacktesting run (run_strategy(lean=True)).
+
+    Only the position (int8), exposure, costs and strategy returns (float32) are stored. Market returns,
+    cumulative returns, portfolio value, peak and drawdown are computed on first access, kept as float32 and
+    can be dropped again with discard(). Columns are read like self.data: result['Drawdown'] gives a Series.
+    """
+    def __init__(self, index: pd.Index, close: pd.Series, position, exposure, strategy_returns, costs=None, initial_capital: float = 10000):
+        self.index = index
+        self.initial_capital = initial_capital
+        self._close = close
+        self.position = np.asarray(position, dtype=np.int8)
+        self.exposure = np.asarray(exposure, dtype=np.float32)
+        self.strategy_returns = np.asarray(strategy_returns, dtype=np.float32)
+        self.costs = np.asarray(costs, dtype=np.float32) if costs is not None else None
+        self._derived = {}
+
+    def __len__(self) -> int:
+        return len(self.position)
+
+    def __contains__(self, name: str) -> bool:
+        if name == 'Costs':
+            return self.costs is not None
+        return name in RESULT_COLUMNS
+
+    def _compute(self, name: str) -> np.ndarray:
+        # Compounding is done in float64 so a long float32 series doesn't drift, the result is stored as float32
+        if name == 'Return':
+            return self._close.pct_change().to_numpy(dtype=np.float32)
+        if name == 'Cumulative_Returns':
+            return np.cumprod(1 + np.nan_to_num(self.strategy_returns.astype(np.float64)))
+        if name == 'Portfolio_Value':
+            return self.initial_capital * self.get_array('Cumulative_Returns', dtype=np.float64)
+        if name == 'Peak':
+            return np.maximum.accumulate(self.get_array('Portfolio_Value', dtype=np.float64))
+        if name == 'Drawdown':
+            portfolio_value = self.get_array('Portfolio_Value', dtype=np.float64)
+            peak = self.get_array('Peak', dtype=np.float64)
+            return (portfolio_value - peak) / peak
+        raise KeyError(name)
+
+    def get_array(self, name: str, dtype=None) -> np.ndarray:
+        """Raw array for a result column, computing and caching derived columns on first access."""
+        stored = {'Position': self.position, 'Exposure': self.exposure, 'Strategy_Returns': self.strategy_returns, 'Costs': self.costs}
+        if name in stored:
+            values = stored[name]
+            if values is None:
+                raise KeyError(name)
+        else:
+            if name not in self._derived:
+                self._derived[name] = self._compute(name).astype(np.float32)
+            values = self._derived[name]
+        return values if dtype is None else values.astype(dtype, copy=False)
+
+    def __getitem__(self, name: str) -> pd.Series:
+        return pd.Series(self.get_array(name), index=self.index, name=name, copy=False)
+
+    def get_series(self, name: str, dtype=np.float64) -> pd.Series:
+        """Result column as a Series upcast for metric calculations."""
+        return pd.Series(self.get_array(name, dtype=dtype), index=self.index, name=name, copy=False)
+
+    def discard(self, *names: str):
+        """Drop cached derived columns (all of them if no names are given). They are recomputed on next access."""
+        for name in names or list(self._derived):
+            self._derived.pop(name, None)
+
+    @property
+    def nbytes(self) -> int:
+        arrays = [self.position, self.exposure, self.strategy_returns, self.costs, *self._derived.values()]
+        return sum(a.nbytes for a in arrays if a is not None)
+
+    def to_frame(self) -> pd.DataFrame:
+        """Materialize every result column, matching the columns run_strategy adds in the default mode."""
+        return pd.DataFrame({name: self[name] for name in RESULT_COLUMNS if name in self}, index=self.index)
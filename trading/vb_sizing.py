@@ -0,0 +1,40 @@
+import numpy as np
+import pandas as pd
+
+def get_periods_per_year(data: pd.DataFrame) -> float:
+    """Estimate bars per year from the median bar spacing. Falls back to daily bars without a Datetime column."""
+    if 'Datetime' not in data.columns or len(data) < 2:
+        return 365
+    bar_seconds = data['Datetime'].diff().dt.total_seconds().median()
+    if not bar_seconds or np.isnan(bar_seconds):
+        return 365
+    return 365 * 24 * 3600 / bar_seconds
+
+def fixed_fraction(data: pd.DataFrame, position_multiplier: pd.Series, fraction: float = 0.5) -> pd.Series:
+    """Constant fraction of capital per position."""
+    return pd.Series(fraction, index=data.index)
+
+def volatility_target(data: pd.DataFrame, position_multiplier: pd.Series, target_volatility: float = 0.5, lookback: int = 100, max_leverage: float = 1.0) -> pd.Series:
+    """
+    Scale exposure so the position runs at an annualized target volatility.
+
+    Realized volatility is measured on close-to-close returns up to and including the current bar,
+    so the size chosen at bar t is only applied to the return from t to t+1.
+    """
+    returns = data['Close'].pct_change()
+    realized_volatility = returns.rolling(window=lookback, min_periods=2).std() * np.sqrt(get_periods_per_year(data))
+    size = target_volatility / realized_volatility.replace(0, np.nan)
+    return size.clip(upper=max_leverage).fillna(0)
+
+def kelly_fraction(data: pd.DataFrame, position_multiplier: pd.Series, lookback: int = 500, fraction: float = 0.5, max_leverage: float = 1.0) -> pd.Series:
+    """
+    Fractional Kelly sizing from the rolling mean/variance of the strategy's own unit returns.
+
+    f* = mu / sigma^2 for continuous returns. Only returns realized up to the current bar are used,
+    and the size is applied from the next bar on. Negative edge sizes to zero.
+    """
+    unit_returns = position_multiplier.shift(1) * data['Close'].pct_change()
+    rolling = unit_returns.rolling(window=lookback, min_periods=2)
+    kelly = rolling.mean() / rolling.var().replace(0, np.nan)
+    size = kelly * fraction
+    return size.clip(lower=0, upper=max_leverage).fillna(0)
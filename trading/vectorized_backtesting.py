@@ -1,28 +1,61 @@
 import time
+import inspect
+import dataclasses
 import numpy as np
 import pandas as pd
 import torch
-import torch.nn.functional as F
 import plotly.graph_objects as go
 from rich import print
-from torch.utils.data import TensorDataset, DataLoader
-from tqdm import tqdm
 import sys
 import os
 
 import model_tools as mt
 import technical_analysis as ta
 import smc_analysis as smc
+import smc_structure
 import vb_metrics as metrics
+import downsampling
+from vb_costs import CostModel
+from result_cache import BacktestResultCache, data_fingerprint, function_fingerprint
+from vb_results import BacktestResult, RESULT_COLUMNS
+from feature_store import FeatureSpec, get_feature_store
+
+NN_MODEL_PATH = r"trading\BTC-USDT_1min_5_38features.pth"
+
+# Classifier output index -> stateful position code (3=long, 1=short, anything else flat)
+NN_ACTION_TO_POSITION = np.array([2, 1, 2, 3])
+
+_model_cache = {}
+
+def load_cached_model(model_path: str):
+    """
+    Load a classifier checkpoint once per process and keep it on the inference device in eval mode.
+
+    Keyed by path and modification time, so a checkpoint retrained to the same path is reloaded.
+    """
+    key = (model_path, os.path.getmtime(model_path))
+    if key not in _model_cache:
+        from brains.time_series.single_predictors.classifier_model import load_model
+        model = load_model(model_path)
+        model.to(torch.device("cuda" if torch.cuda.is_available() else "cpu"))
+        model.eval()
+        for stale in [cached for cached in _model_cache if cached[0] == model_path]:
+            del _model_cache[stale]
+        _model_cache[key] = model
+    return _model_cache[key]
 
 class VectorizedBacktesting:
     def __init__(
         self,
         instance_name: str = "default",
         initial_capital: float = 10000.0,
+        cost_model: CostModel = None,
+        result_cache: BacktestResultCache = None,
     ):
         self.instance_name = instance_name
         self.initial_capital = initial_capital
+        self.cost_model = cost_model
+        self.result_cache = result_cache
 
         self.symbol = None
         self.chunks = None
@@ -30,13 +63,26 @@ class VectorizedBacktesting:
         self.age_days = None
         self.n_days = None
         self.data: pd.DataFrame = pd.DataFrame()
+        self.result: BacktestResult = None  # Set by run_strategy(lean=True) instead of adding result columns to self.data
+
+        self._result_key = None
+        self._cached_result = None
 
-    def fetch_data(self, symbol: str, chunks: int, interval: str, age_days: int, kucoin: bool = True):
+    def fetch_data(self, symbol: str, chunks: int, interval: str, age_days: int, kucoin: bool = True, base_interval: str = None):
+        """
+        Fetch OHLCV data. With base_interval (e.g. "1min"), that interval is downloaded/cached once and
+        resampled locally to interval, so sweeping several intervals reuses a single download.
+        """
         self.symbol = symbol
         self.chunks = chunks
         self.interval = interval
         self.age_days = age_days
-        self.data = mt.fetch_data(symbol, chunks, interval, age_days, kucoin=kucoin)
+        if base_interval is not None and base_interval != interval:
+            base = mt.fetch_data(symbol, chunks, base_interval, age_days, kucoin=kucoin)
+            self.data = mt.resample_ohlcv(base, interval)
+        else:
+            self.data = mt.fetch_data(symbol, chunks, interval, age_days, kucoin=kucoin)
+        self.result = None
 
         oldest = self.data['Datetime'].iloc[0]
         newest = self.data['Datetime'].iloc[-1]
@@ -49,144 +95,247 @@ class VectorizedBacktesting:
         position = position.ffill().fillna(2).astype(int) #forward fill hold signals, default to flat at start
         return position
 
-    def run_strategy(self, strategy_func, verbose: bool = False, **kwargs):
-        """Run a trading strategy on the data"""
+    def _has_results(self) -> bool:
+        if self.result is not None:
+            return True
+        return self.data is not None and 'Position' in self.data.columns
+
+    def _result_column(self, name: str) -> pd.Series:
+        """Result column from the lean result if there is one, otherwise from self.data."""
+        if self.result is not None:
+            return self.result.get_series(name)
+        return self.data[name]
+
+    def _get_data_hash(self) -> str:
+        """Fingerprint of the current OHLCV data, hashed on every lookup so in-place edits are never served stale results."""
+        return data_fingerprint(self.data)
+
+    def _get_result_key(self, strategy_func, sizing_func, sizing_kwargs: dict, params: dict) -> str:
+        config = {
+            'initial_capital': self.initial_capital,
+            'n_days': self.n_days,
+            'cost_model': dataclasses.asdict(self.cost_model) if self.cost_model is not None else None,
+            'sizing_func': function_fingerprint(sizing_func),
+            'sizing_kwargs': sizing_kwargs,
+        }
+        # Strategies that load a checkpoint (nn_strategy) must miss the cache when the weights change
+        model_param = inspect.signature(strategy_func).parameters.get('model_path')
+        if model_param is not None:
+            model_path = params.get('model_path', model_param.default)
+            config['model'] = [model_path, os.path.getmtime(model_path) if os.path.exists(model_path) else None]
+        return self.result_cache.make_key(self._get_data_hash(), strategy_func, params, config)
+
+    def run_strategy(self, strategy_func, verbose: bool = False, sizing_func=None, sizing_kwargs: dict = None, lean: bool = False, **kwargs):
+        """
+        Run a trading strategy on the data.
+
+        sizing_func(data, position_multiplier, **sizing_kwargs) returns the absolute size of the position at
+        each bar (see vb_sizing). Exposure = direction * size, so sizing research runs in the same vectorized pass.
+
+        With lean=True nothing is added to self.data; positions and float32 returns are kept in self.result
+        (a BacktestResult) and drawdown/peak/portfolio value are only computed when first read.
+        """
         if self.data is None or self.data.empty:
             raise ValueError("No data available. Call fetch_data() first.")
 
         start_time = time.time()
 
-        raw_signals = strategy_func(self.data, **kwargs)
-        position = self._signals_to_stateful_position(raw_signals)
+        self._result_key = None
+        self._cached_result = None
+        if self.result_cache is not None:
+            self._result_key = self._get_result_key(strategy_func, sizing_func, sizing_kwargs, kwargs)
+            self._cached_result = self.result_cache.get(self._result_key)
+
+        if self._cached_result is not None:
+            position = pd.Series(self._cached_result['position'].astype(int), index=self.data.index)
+        else:
+            raw_signals = strategy_func(self.data, **kwargs)
+            position = self._signals_to_stateful_position(raw_signals)
 
-        self.data['Return'] = self.data['Close'].pct_change()
-        self.data['Position'] = position
+        market_returns = self.data['Close'].pct_change()
         # Temporal alignment: position[t] affects returns from t to t+1
         # return[t] represents price change from (t-1) to t
         # So strategy_return[t] = position[t-1] * return[t]
         # This is correct timing: position taken at t-1 earns return from (t-1) to t
-        self.data['Strategy_Returns'] = metrics.stateful_position_to_multiplier(position).shift(1) * self.data['Return']
-        self.data['Cumulative_Returns'] = (1 + self.data['Strategy_Returns']).cumprod()
-        self.data['Portfolio_Value'] = self.initial_capital * self.data['Cumulative_Returns']
-        self.data['Peak'] = self.data['Portfolio_Value'].cummax()
-        self.data['Drawdown'] = (self.data['Portfolio_Value'] - self.data['Peak']) / self.data['Peak']
+        position_multiplier = metrics.stateful_position_to_multiplier(position)
+        if sizing_func is not None:
+            size = sizing_func(self.data, position_multiplier, **(sizing_kwargs or {}))
+            position_multiplier = position_multiplier * size
+        strategy_returns = position_multiplier.shift(1) * market_returns
+        costs = None
+        if self.cost_model is not None:
+            # Costs are charged on the bar the exposure changes, funding on the bar a short is held over
+            costs = self.cost_model.get_costs(self.data, position_multiplier)
+            strategy_returns = strategy_returns.sub(costs, fill_value=0)
+
+        if lean:
+            self.data.drop(columns=[c for c in RESULT_COLUMNS if c in self.data.columns], inplace=True)
+            self.result = BacktestResult(
+                self.data.index, self.data['Close'], position, position_multiplier, strategy_returns,
+                costs=costs, initial_capital=self.initial_capital
+            )
+        else:
+            self.result = None
+            self.data['Return'] = market_returns
+            self.data['Position'] = position
+            self.data['Exposure'] = position_multiplier
+            if costs is not None:
+                self.data['Costs'] = costs
+            self.data['Strategy_Returns'] = strategy_returns
+            self.data['Cumulative_Returns'] = (1 + self.data['Strategy_Returns']).cumprod()
+            self.data['Portfolio_Value'] = self.initial_capital * self.data['Cumulative_Returns']
+            self.data['Peak'] = self.data['Portfolio_Value'].cummax()
+            self.data['Drawdown'] = (self.data['Portfolio_Value'] - self.data['Peak']) / self.data['Peak']
 
         end_time = time.time()
         if verbose:
-            print(f"[green]Strategy execution time: {end_time - start_time:.2f} seconds[/green]")
+            source = " (cached)" if self._cached_result is not None else ""
+            print(f"[green]Strategy execution time{source}: {end_time - start_time:.2f} seconds[/green]")
+            if lean:
+                print(f"[green]Lean result size: {self.result.nbytes / (1024**2):.2f} MB[/green]")
 
-        return self.data
+        return self.result if lean else self.data
+
+    def get_trade_ledger(self) -> pd.DataFrame:
+        """Closed trades of the last run, with costs deducted when a cost model is set."""
+        if not self._has_results():
+            raise ValueError("No strategy results available. Run a strategy first.")
+        if self._cached_result is not None:
+            return self._cached_result['ledger'].copy()
+        cost_rate = self.cost_model.get_side_cost_rate(self.data) if self.cost_model is not None else None
+        position = self.result['Position'] if self.result is not None else self.data['Position']
+        return metrics.get_trade_ledger(position, self.data['Close'], cost_rate=cost_rate, size=self._result_column('Exposure').abs())
 
     def get_performance_metrics(self):
-        if self.data is None or 'Position' not in self.data.columns:
+        if not self._has_results():
             raise ValueError("No strategy results available. Run a strategy first.")
 
+        if self._cached_result is not None:
+            return dict(self._cached_result['metrics'])
+
         # Calculate expensive operations once
-        position = self.data['Position']
         close_prices = self.data['Close']
-        trade_pnls = metrics.get_trade_pnls(position, close_prices)  # Only calculate once
-        
-        # Calculate returns once  
-        returns = metrics.get_returns(position, close_prices)
-
-        return {
-            'Total_Return': metrics.get_total_return(position, close_prices),
-            'Alpha': metrics.get_alpha(position, close_prices, n_days=self.n_days),
-            'Beta': metrics.get_beta(position, close_prices),
-            'Active_Returns': metrics.get_active_returns(position, close_prices),
-            'Max_Drawdown': metrics.get_max_drawdown(position, close_prices, self.initial_capital),
-            'Sharpe_Ratio': metrics.get_sharpe_ratio(position, close_prices),
-            'Sortino_Ratio': metrics.get_sortino_ratio(position, close_prices),
+        ledger = self.get_trade_ledger()
+        trade_pnls = ledger['PnL'].tolist()  # Only calculate once
+
+        # Strategy returns already include costs, so every metric below is cost-adjusted
+        returns = self._result_column('Strategy_Returns')
+        total_return = metrics.get_total_return_from_returns(returns)
+        alpha, beta = metrics.get_alpha_beta_from_returns(returns, self._result_column('Return'), n_days=self.n_days)
+
+        performance = {
+            'Total_Return': total_return,
+            'Alpha': alpha,
+            'Beta': beta,
+            'Active_Returns': total_return - metrics.get_benchmark_total_return(close_prices),
+            'Max_Drawdown': metrics.get_max_drawdown_from_returns(returns),
+            'Sharpe_Ratio': metrics.get_sharpe_ratio_from_returns(returns),
+            'Sortino_Ratio': metrics.get_sortino_ratio_from_returns(returns),
             'Win_Rate': len([pnl for pnl in trade_pnls if pnl > 0]) / len(trade_pnls) if trade_pnls else 0,
             'Breakeven_Rate': metrics.get_breakeven_rate_from_pnls(trade_pnls),
             'RR_Ratio': metrics.get_rr_ratio_from_pnls(trade_pnls),
             'PT_Ratio': (returns.sum() / len(trade_pnls)) * 100 if trade_pnls else 0,
-            'Profit_Factor': metrics.get_profit_factor(position, close_prices),
+            'Profit_Factor': metrics.get_profit_factor_from_returns(returns),
             'Total_Trades': len(trade_pnls)
         }
 
-    def plot_performance(self, show_graph: bool = True, advanced: bool = False):
-        if self.data is None or 'Portfolio_Value' not in self.data.columns:
+        if self._result_key is not None:
+            position = self._get_position_values()
+            self.result_cache.put(self._result_key, position, performance, ledger)
+            self._cached_result = {'position': position, 'metrics': performance, 'ledger': ledger}
+
+        return performance
+
+    def _get_position_values(self) -> np.ndarray:
+        return self.result.position if self.result is not None else self.data['Position'].values
+
+    def _get_position_markers(self) -> dict:
+        """Bars where the position switches into long, short or flat, found with NumPy masks."""
+        position = self._get_position_values()
+        prev_pos = position[:-1]
+        current_pos = position[1:]
+        changed = current_pos != prev_pos
+        return {
+            'long': np.flatnonzero(changed & (current_pos == 3)) + 1,
+            'short': np.flatnonzero(changed & (current_pos == 1)) + 1,
+            'flat': np.flatnonzero(changed & (current_pos == 2)) + 1,
+        }
+
+    def plot_performance(self, show_graph: bool = True, advanced: bool = False, max_points: int = 5000, downsample: str = "minmax", webgl: bool = True):
+        """
+        Plot the last run.
+
+        Args:
+            max_points: Target point count for per-bar curves (equity, drawdown, rolling Sharpe)
+            downsample: "minmax", "lttb" or None to send every bar
+            webgl: Render line traces with Scattergl instead of SVG Scatter
+        """
+        if not self._has_results():
             raise ValueError("No strategy results available. Run a strategy first.")
 
         summary = self.get_performance_metrics()
+        Scatter = go.Scattergl if webgl else go.Scatter
+        index = self.data.index
+
+        def reduce(y):
+            """Downsample a per-bar series to max_points, returning (x, y)."""
+            y = np.asarray(y)
+            keep = downsampling.downsample_indices(index, y, max_points, downsample)
+            return index[keep], y[keep]
+
+        portfolio_value = self._result_column('Portfolio_Value').values
+        asset_value = self.initial_capital * np.nancumprod(1 + self._result_column('Return').values)
+        markers = self._get_position_markers()
 
         if not advanced:
             fig = go.Figure()
-            
-            portfolio_value = self.data['Portfolio_Value'].values
-            returns = self.data['Return'].values
-            asset_value = self.initial_capital * (1 + self.data['Return']).cumprod()
 
-            fig.add_trace(go.Scatter(
-                x=self.data.index,
-                y=portfolio_value,
+            x, y = reduce(portfolio_value)
+            fig.add_trace(Scatter(
+                x=x,
+                y=y,
                 mode='lines',
                 name='Portfolio',
             ))
-            
-            fig.add_trace(go.Scatter(
-                x=self.data.index,
-                y=asset_value,
+
+            x, y = reduce(asset_value)
+            fig.add_trace(Scatter(
+                x=x,
+                y=y,
                 mode='lines',
                 name='Asset Value'
             ))
 
-            position_changes = np.diff(self.data['Position'].values)
-            
-            # Separate different types of position changes
-            long_entries = []
-            short_entries = []
-            flats = []
-            long_entry_values = []
-            short_entry_values = []
-            flat_values = []
-            
-            for i in range(len(position_changes)):
-                if position_changes[i] != 0:  # Any position change
-                    prev_pos = self.data['Position'].iloc[i]
-                    current_pos = self.data['Position'].iloc[i + 1]
-                    
-                    if current_pos == 3 and prev_pos != 3:  # Entering long from any other position
-                        long_entries.append(self.data.index[i + 1])
-                        long_entry_values.append(asset_value[i + 1])
-                    elif current_pos == 1 and prev_pos != 1:  # Entering short from any other position
-                        short_entries.append(self.data.index[i + 1])
-                        short_entry_values.append(asset_value[i + 1])
-                    elif current_pos == 2 and prev_pos != 2:  # Exiting to flat from any position
-                        flats.append(self.data.index[i + 1])
-                        flat_values.append(asset_value[i + 1])
-
             # Add long entry signals (green triangles up)
-            if long_entries:
-                fig.add_trace(go.Scatter(
-                    x=long_entries,
-                    y=long_entry_values,
+            if len(markers['long']):
+                fig.add_trace(Scatter(
+                    x=index[markers['long']],
+                    y=asset_value[markers['long']],
                     mode='markers',
                     name='Long Entry',
                     marker=dict(color='green', size=10, symbol='triangle-up')
                 ))
 
-            # Add short entry signals (red triangles down) 
-            if short_entries:
-                fig.add_trace(go.Scatter(
-                    x=short_entries,
-                    y=short_entry_values,
+            # Add short entry signals (red triangles down)
+            if len(markers['short']):
+                fig.add_trace(Scatter(
+                    x=index[markers['short']],
+                    y=asset_value[markers['short']],
                     mode='markers',
                     name='Short Entry',
                     marker=dict(color='red', size=10, symbol='triangle-down')
                 ))
 
             # Add flat signals (yellow circles)
-            if flats:
-                fig.add_trace(go.Scatter(
-                    x=flats,
-                    y=flat_values,
+            if len(markers['flat']):
+                fig.add_trace(Scatter(
+                    x=index[markers['flat']],
+                    y=asset_value[markers['flat']],
                     mode='markers',
                     name='Exit to Flat',
                     marker=dict(color='yellow', size=8, symbol='circle')
                 ))
-            
+
             fig.update_layout(
                 title=f'{self.symbol} {self.chunks} days of {self.interval} | {self.age_days}d old | TR: {summary["Total_Return"]*100:.3f}% | Max DD: {summary["Max_Drawdown"]*100:.3f}% | RR: {summary["RR_Ratio"]:.3f} | WR: {summary["Win_Rate"]*100:.3f}% | BE: {summary["Breakeven_Rate"]*100:.3f}% | PT: {summary["PT_Ratio"]*100:.3f}% | PF: {summary["Profit_Factor"]:.3f} | Sharpe: {summary["Sharpe_Ratio"]:.3f} | Sortino: {summary["Sortino_Ratio"]:.3f} | Trades: {summary["Total_Trades"]}',
                 xaxis_title='Date',
@@ -211,32 +360,27 @@ class VectorizedBacktesting:
                     f"Win Rate | BE: {summary['Breakeven_Rate']*100:.2f}%", f"Sharpe: {summary['Sharpe_Ratio']:.3f} | Sortino: {summary['Sortino_Ratio']:.3f}",
                     "Position Distribution", "Cumulative PnL by Trade"
                 ),
-                specs=[
-                    [{"type": "scatter"}, {"type": "scatter"}],
-                    [{"type": "histogram"}, {"type": "scatter"}],
-                    [{"type": "scatter"}, {"type": "scatter"}],
-                    [{"type": "histogram"}, {"type": "scatter"}]
-                ],
                 vertical_spacing=0.1,
                 horizontal_spacing=0.1
             )
 
             # 1. Equity Curve
+            x, y = reduce(portfolio_value)
             fig.add_trace(
-                go.Scatter(
-                    x=self.data.index,
-                    y=self.data['Portfolio_Value'],
+                Scatter(
+                    x=x,
+                    y=y,
                     mode='lines',
                     name='Strategy Portfolio Value'
                 ),
                 row=1, col=1
             )
-            
-            asset_value = self.initial_capital * (1 + self.data['Return']).cumprod()
+
+            x, y = reduce(asset_value)
             fig.add_trace(
-                go.Scatter(
-                    x=self.data.index,
-                    y=asset_value,
+                Scatter(
+                    x=x,
+                    y=y,
                     mode='lines',
                     name='Asset Value',
                     line=dict(dash='dash')
@@ -245,10 +389,11 @@ class VectorizedBacktesting:
             )
 
             # 2. Drawdown Curve
+            x, y = reduce(self._result_column('Drawdown').values * 100)
             fig.add_trace(
-                go.Scatter(
-                    x=self.data.index,
-                    y=self.data['Drawdown'] * 100,
+                Scatter(
+                    x=x,
+                    y=y,
                     mode='lines',
                     name='Drawdown',
                     line=dict(color='red')
@@ -256,29 +401,30 @@ class VectorizedBacktesting:
                 row=1, col=2
             )
 
-            # 3. Profit and Loss Distribution - use metrics function
-            pnl_list = metrics.get_trade_pnls(self.data['Position'], self.data['Close'])
-            pnl_pct_list = [(pnl / self.data['Close'].iloc[0]) * 100 for pnl in pnl_list]  # Convert to percentage
-            
-            fig.add_trace(
-                go.Histogram(
-                    x=pnl_pct_list,
-                    name='Trade Returns (%)',
-                    nbinsx=50
-                ),
-                row=2, col=1
-            )
+            # 3. Profit and Loss Distribution - binned here so only 50 bars go to the browser
+            pnl_arr = self.get_trade_ledger()['PnL'].values / self.data['Close'].iloc[0] * 100  # Convert to percentage
+            if len(pnl_arr):
+                counts, edges = np.histogram(pnl_arr, bins=50)
+                fig.add_trace(
+                    go.Bar(
+                        x=(edges[:-1] + edges[1:]) / 2,
+                        y=counts,
+                        width=np.diff(edges),
+                        name='Trade Returns (%)'
+                    ),
+                    row=2, col=1
+                )
 
             # 4. Average Profit per Trade - use strategy returns
-            pnl_arr = np.array(pnl_pct_list)
             cumulative_pnl = np.cumsum(pnl_arr) if len(pnl_arr) else np.array([0])
             trade_numbers = np.arange(1, len(pnl_arr) + 1) if len(pnl_arr) else np.array([1])
             avg_pnl_per_trade = cumulative_pnl / trade_numbers
-            
+            trade_keep = downsampling.downsample_indices(trade_numbers, avg_pnl_per_trade, max_points, downsample)
+
             fig.add_trace(
-                go.Scatter(
-                    x=trade_numbers,
-                    y=avg_pnl_per_trade,
+                Scatter(
+                    x=trade_numbers[trade_keep],
+                    y=avg_pnl_per_trade[trade_keep],
                     mode='lines',
                     name='Avg PnL per Trade (%)',
                 ),
@@ -288,7 +434,7 @@ class VectorizedBacktesting:
             if len(pnl_arr):
                 mean_pnl = np.mean(pnl_arr)
                 fig.add_trace(
-                    go.Scatter(
+                    Scatter(
                         x=[1, len(pnl_arr)],
                         y=[mean_pnl, mean_pnl],
                         mode='lines',
@@ -302,10 +448,11 @@ class VectorizedBacktesting:
             if len(pnl_arr):
                 cumulative_wins = np.cumsum(pnl_arr > 0)
                 win_rates = cumulative_wins / trade_numbers * 100
+                win_keep = downsampling.downsample_indices(trade_numbers, win_rates, max_points, downsample)
                 fig.add_trace(
-                    go.Scatter(
-                        x=trade_numbers,
-                        y=win_rates,
+                    Scatter(
+                        x=trade_numbers[win_keep],
+                        y=win_rates[win_keep],
                         mode='lines',
                         name='Win Rate (%)'
                     ),
@@ -313,24 +460,25 @@ class VectorizedBacktesting:
                 )
 
             # 6. Sharpe Ratio Over Time
-            rolling_returns = self.data['Strategy_Returns'].rolling(window=30)
-            rolling_sharpe = np.sqrt(365) * rolling_returns.mean() / rolling_returns.std()
-            
+            rolling_returns = self._result_column('Strategy_Returns').rolling(window=30)
+            rolling_sharpe = (np.sqrt(365) * rolling_returns.mean() / rolling_returns.std()).values
+
+            x, y = reduce(rolling_sharpe)
             fig.add_trace(
-                go.Scatter(
-                    x=self.data.index,
-                    y=rolling_sharpe,
+                Scatter(
+                    x=x,
+                    y=y,
                     mode='lines',
                     name='Rolling Sharpe'
                 ),
                 row=3, col=2
             )
-            
-            if not rolling_sharpe.isna().all():
-                mean_sharpe = rolling_sharpe.mean()
+
+            if not np.all(np.isnan(rolling_sharpe)):
+                mean_sharpe = np.nanmean(rolling_sharpe)
                 fig.add_trace(
-                    go.Scatter(
-                        x=[self.data.index[0], self.data.index[-1]],
+                    Scatter(
+                        x=[index[0], index[-1]],
                         y=[mean_sharpe, mean_sharpe],
                         mode='lines',
                         name='Mean Sharpe',
@@ -339,24 +487,26 @@ class VectorizedBacktesting:
                     row=3, col=2
                 )
 
-            # 7. Position Distribution - show actual position states
-            position_counts = self.data['Position'].value_counts().sort_index()
+            # 7. Position Distribution - counted here instead of sending one label per bar
+            position_counts = pd.Series(self._get_position_values()).value_counts().sort_index()
             position_labels = {0: 'Hold', 1: 'Short', 2: 'Flat', 3: 'Long'}
-            
+
             fig.add_trace(
-                go.Histogram(
-                    x=[position_labels.get(pos, f'Unknown({pos})') for pos in self.data['Position']],
+                go.Bar(
+                    x=[position_labels.get(pos, f'Unknown({pos})') for pos in position_counts.index],
+                    y=position_counts.values,
                     name='Position States'
                 ),
                 row=4, col=1
             )
 
             # 8. Cumulative PnL by Trade
-            if pnl_pct_list:
+            if len(pnl_arr):
+                cumulative_keep = downsampling.downsample_indices(trade_numbers, cumulative_pnl, max_points, downsample)
                 fig.add_trace(
-                    go.Scatter(
-                        x=trade_numbers,
-                        y=cumulative_pnl,
+                    Scatter(
+                        x=trade_numbers[cumulative_keep],
+                        y=cumulative_pnl[cumulative_keep],
                         mode='lines+markers',
                         name='Cumulative PnL (%)',
                         marker=dict(size=4)
@@ -380,7 +530,7 @@ class VectorizedBacktesting:
             fig.update_yaxes(title_text="Sharpe Ratio", row=3, col=2)
             fig.update_yaxes(title_text="Frequency", row=4, col=1)
             fig.update_yaxes(title_text="Cumulative PnL (%)", row=4, col=2)
-            
+
             # Update x-axis labels
             fig.update_xaxes(title_text="Time", row=1, col=1)
             fig.update_xaxes(title_text="Time", row=1, col=2)
@@ -421,6 +571,22 @@ class VectorizedBacktesting:
         signals[ema_fast < ema_slow] = 1
         return signals
 
+    def mtf_ema_cross_strategy(self, data: pd.DataFrame, higher_interval: str = "1hour", fast_period: int = 9, slow_period: int = 26, trend_period: int = 50) -> pd.Series:
+        """EMA cross on the base bars, only taken in the direction of the higher-timeframe EMA trend."""
+        higher = mt.align_higher_timeframe(
+            data, higher_interval, columns=['Close', 'EMA'], prefix='HTF',
+            transform=lambda bars: {'EMA': ta.ema(bars['Close'], trend_period)}
+        )
+        uptrend = higher['HTF_Close'] > higher['HTF_EMA']
+        downtrend = higher['HTF_Close'] < higher['HTF_EMA']
+
+        signals = pd.Series(2, index=data.index)
+        ema_fast = ta.ema(data['Close'], fast_period)
+        ema_slow = ta.ema(data['Close'], slow_period)
+        signals[(ema_fast > ema_slow) & uptrend] = 3
+        signals[(ema_fast < ema_slow) & downtrend] = 1
+        return signals
+
     def reversion_strategy(self, data: pd.DataFrame) -> pd.Series:
         signals = pd.Series(2, index=data.index)
         sma50 = ta.sma(data['Close'], 50)
@@ -463,8 +629,25 @@ class VectorizedBacktesting:
         signals[data['Close'] < psar] = 1
         return signals
     
-    def smc_strategy(self, data: pd.DataFrame) -> pd.Series:
-        signals = pd.Series(2, index=data.index)
+    def smc_strategy(self, data: pd.DataFrame, swing_window: int = 10, break_on: str = "close", use_zones: bool = 1, zone_threshold: float = 0.5) -> pd.Series:
+        """
+        Trade the market-structure trend (see smc_structure).
+
+        Without zones the position follows the trend of the last BOS/CHoCH. With use_zones (0 false, 1 true)
+        longs are only entered in discount (range position <= zone_threshold) of a bullish structure and shorts
+        in premium (>= 1 - zone_threshold) of a bearish one; a CHoCH closes the position, otherwise it is held.
+        """
+        structure = smc_structure.market_structure(data['Open'], data['High'], data['Low'], data['Close'], window=swing_window, break_on=break_on)
+        if not bool(use_zones):
+            signals = pd.Series(2, index=data.index)
+            signals[structure.trend == 1] = 3
+            signals[structure.trend == -1] = 1
+            return signals
+
+        signals = pd.Series(0, index=data.index)
+        signals[structure.choch != 0] = 2
+        signals[(structure.trend == 1) & (structure.range_position <= zone_threshold)] = 3
+        signals[(structure.trend == -1) & (structure.range_position >= 1 - zone_threshold)] = 1
         return signals
 
     def scalper_strategy1(self, data: pd.DataFrame, fast_period: int = 9, slow_period: int = 26, adx_threshold: int = 25, momentum_period: int = 10, momentum_threshold: float = 0.75, wick_threshold: float = 0.5) -> pd.Series:
@@ -590,56 +773,43 @@ class VectorizedBacktesting:
                 
         return signals
 
-    def nn_strategy(self, data: pd.DataFrame, batch_size: int = 64, check_consistency: bool = False) -> pd.Series:
-        from brains.time_series.single_predictors.classifier_model import load_model
-        MODEL_PATH = r"trading\BTC-USDT_1min_5_38features.pth"
+    def nn_strategy(self, data: pd.DataFrame, batch_size: int = 8192, check_consistency: bool = False, model_path: str = NN_MODEL_PATH, lagged_length: int = 5, use_feature_store: bool = True) -> pd.Series:
         signals = pd.Series(2, index=data.index)
-        model = load_model(MODEL_PATH)
-        model.to(torch.device("cuda" if torch.cuda.is_available() else "cpu"))
-        model.eval()
+        model = load_cached_model(model_path)
         selected_features = model.selected_features
-        features_df, _ = mt.prepare_data_classifier(data[['Open', 'High', 'Low', 'Close', 'Volume']], lagged_length=5)
-        missing_features = [f for f in selected_features if f not in features_df.columns]
-        if missing_features:
-            print(f"Warning: Missing {len(missing_features)} features: {missing_features[:5]}...")
-            available_features = [f for f in selected_features if f in features_df.columns]
-            features_df = features_df[available_features]
+
+        start_time = time.time()
+        # Only the model's selected features (and the indicators/lags they need) are computed
+        if use_feature_store:
+            spec = FeatureSpec(lagged_length=lagged_length, features=tuple(selected_features) if selected_features is not None else None)
+            features_df = get_feature_store().get(data, spec)
         else:
-            features_df = features_df[selected_features]
-        X = torch.tensor(features_df.values, dtype=torch.float32).to(model.DEVICE)
-        X_seq = X.unsqueeze(1)
-        dataset = TensorDataset(X_seq)
-        dataloader = DataLoader(dataset, batch_size=batch_size, shuffle=False)
-        position_values = np.zeros(len(features_df))
-        with torch.no_grad():
-            idx = 0
-            for batch in tqdm(dataloader, desc="NN Strategy Batching"):
-                batch_x = batch[0]  # (batch, 1, features)
-                outputs = model(batch_x)
-                probs = F.softmax(outputs, dim=2)  # (batch, 1, classes)
-                actions = torch.argmax(probs, dim=2).cpu().numpy().flatten()  # (batch,)
-                for i, action in enumerate(actions):
-                    if action == 3:
-                        position_values[idx + i] = 3
-                    elif action == 1:
-                        position_values[idx + i] = 1
-                    else:
-                        position_values[idx + i] = 2
-                idx += len(actions)
+            features_df, _ = mt.prepare_data_classifier(data[['Open', 'High', 'Low', 'Close', 'Volume']], lagged_length=lagged_length, features=selected_features, create_target=False)
+        if selected_features is not None:
+            missing_features = [f for f in selected_features if f not in features_df.columns]
+            if missing_features:
+                print(f"Warning: Missing {len(missing_features)} features: {missing_features[:5]}...")
+
+        X = torch.from_numpy(features_df.to_numpy(dtype=np.float32)).to(model.DEVICE)
+        actions = np.empty(len(X), dtype=np.int64)
+        with torch.inference_mode():
+            for start in range(0, len(X), batch_size):
+                batch_x = X[start:start + batch_size].unsqueeze(1)  # (batch, 1, features)
+                outputs = model(batch_x)  # (batch, 1, classes)
+                actions[start:start + len(batch_x)] = torch.argmax(outputs, dim=2).flatten().cpu().numpy()
+        position_values = NN_ACTION_TO_POSITION[actions]
+        elapsed = time.time() - start_time
+        print(f"[green]NN Strategy: {len(X)} rows in {elapsed:.2f} seconds ({len(X) / max(elapsed, 1e-9):,.0f} rows/s)[/green]")
+
         signals.iloc[len(data)-len(position_values):] = position_values
         signals = signals.ffill().fillna(2)
-        if check_consistency:
-            with torch.no_grad():
-                single_preds = []
-                for i in range(min(32, len(X))):
-                    x_single = X[i].unsqueeze(0).unsqueeze(0)  # (1, 1, F)
-                    out = model(x_single)
-                    prob = F.softmax(out, dim=2)
-                    act = torch.argmax(prob, dim=2).item()
-                    single_preds.append(act)
-                batch_preds = position_values[:len(single_preds)]
-                if not np.all(batch_preds == np.array([3 if a==3 else 1 if a==1 else 2 for a in single_preds])):
-                    print("[red]WARNING: Batch and single inference results differ![/red]")
+        if check_consistency and len(X):
+            # Rerun a few rows one at a time; batched results must match single-sample inference
+            n_check = min(32, len(X))
+            with torch.inference_mode():
+                check_actions = np.array([torch.argmax(model(X[i:i + 1].unsqueeze(1)), dim=2).item() for i in range(n_check)])
+            if not np.array_equal(NN_ACTION_TO_POSITION[check_actions], position_values[:n_check]):
+                print("[red]WARNING: Batch and single inference results differ![/red]")
         return signals
 
 if __name__ == "__main__":